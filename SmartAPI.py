@@ -1,15 +1,36 @@
 from client import AngelClient
-from config import LOGIN_PAYLOAD, PLACE_ORDER_PAYLOAD, MARKET_DATA_PAYLOAD, HISTORICAL_DATA_PAYLOAD, TOP_GAINERS_LOSERS_PAYLOAD
-from endpoints import PLACE_ORDER, GET_ORDER_BOOK, GET_PROFILE, AUTHENTICATE, GET_MARKET_DATA, GET_GAINERS_LOSERS, GET_HISTORICAL_DATA
+from orders import OrderGateway
+from quotes import QuoteService
+from config import PLACE_ORDER_PAYLOAD, MARKET_DATA_PAYLOAD, HISTORICAL_DATA_PAYLOAD, TOP_GAINERS_LOSERS_PAYLOAD
+import config
+from endpoints import GET_PROFILE, GET_MARKET_DATA, GET_GAINERS_LOSERS, GET_HISTORICAL_DATA
 
 class AngelAPIWrapper:
-    def __init__(self):
-        self.client = AngelClient()
+    def __init__(self, client=None):
+        # Every method goes through the same pooled client
+        self.client = client or AngelClient()
+        self.orders = OrderGateway(self.client)
+        self.quotes = QuoteService(self.client)
+        self.order_state = None
+        self.historical = None
+        self.instruments = None
+
+    async def __aenter__(self):
+        await self.client.get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.order_state:
+            await self.order_state.stop()
+        await self.quotes.close()
+        await self.client.close()
 
     # User APIs
     async def login(self):
-            payload = LOGIN_PAYLOAD
-            data = await self.client.post(AUTHENTICATE, payload)
+            data = await self.client.authenticate(force=True)
             if data:
                 print("Login successful")
             return data
@@ -20,13 +41,44 @@ class AngelAPIWrapper:
 
 
     # Order APIs
-    async def place_order(self):
-        payload = PLACE_ORDER_PAYLOAD
-        return await self.client.post(PLACE_ORDER, payload)
-    
+    async def place_order(self, order=PLACE_ORDER_PAYLOAD):
+        """Places an orders.Order or a raw payload dict; returns the broker's response, None if it was not sent"""
+        result = await self.orders.place(order)
+        if result.response is None:
+            print(f"Error placing order: {result.message}")
+        return result.response
+
+    async def submit_order(self, order):
+        """Places an orders.Order or a raw payload dict; returns an OrderResult with the ack latency"""
+        return await self.orders.place(order)
+
+    async def cancel_order(self, orderid, variety="NORMAL"):
+        return await self.orders.cancel(orderid, variety)
+
+    async def place_basket(self, orders):
+        """Places all orders concurrently under the order rate limit; results in input order"""
+        return await self.orders.place_basket(orders)
+
+    async def cancel_basket(self, orderids):
+        return await self.orders.cancel_basket(orderids)
+
     async def get_order_book(self):
-        payload = LOGIN_PAYLOAD
-        return await self.client.post(GET_ORDER_BOOK, payload)
+        return await self.orders.get_order_book()
+
+    async def get_trade_book(self):
+        return await self.orders.get_trade_book()
+
+    def track_orders(self, on_order=None, on_fill=None):
+        """
+            Starts syncing a local OrderState (orders by id / symbol / status and net positions)
+            in the background; every acknowledged order triggers an early poll. Returns the state
+        """
+        if self.order_state is None:
+            from order_state import OrderStateSync
+            self.order_state = OrderStateSync(self.client, on_order=on_order, on_fill=on_fill)
+            self.orders.on_ack = self.order_state.poke
+        self.order_state.start()
+        return self.order_state.state
     
 
 
@@ -34,16 +86,59 @@ class AngelAPIWrapper:
     async def get_market_data(self):
         payload = MARKET_DATA_PAYLOAD
         return await self.client.post(GET_MARKET_DATA, payload)
+
+    async def get_quotes(self, exchange_tokens, mode="FULL"):
+        """
+            Quotes for any number of tokens, {exchange: [tokens]} or (exchange, token) pairs,
+            fetched in concurrent chunks with coalescing and a short-lived cache.
+            Returns {(exchange, token): quote}
+        """
+        return await self.quotes.get(exchange_tokens, mode)
     
     # Historical Data APIs
-    async def get_historical_data(self):
-        payload = HISTORICAL_DATA_PAYLOAD
+    async def get_historical_data(self, payload=HISTORICAL_DATA_PAYLOAD):
         return await self.client.post(GET_HISTORICAL_DATA, payload)
+
+    async def download_historical_data(self, instruments, interval, fromdate, todate):
+        """
+            Bulk backfill for a list of (exchange, token) pairs, served from the local candle
+            cache and fetching only missing windows. Returns (exchange, token) -> candle array
+        """
+        if self.historical is None:
+            from historical import HistoricalDownloader, CandleStore
+            self.historical = HistoricalDownloader(self.client, CandleStore(config.HISTORICAL_CACHE_DIR))
+        return await self.historical.fetch_many(instruments, interval, fromdate, todate)
     
 
+    # Instrument master
+    async def get_instruments(self, force=False):
+        """
+            Returns the InstrumentMaster, downloading the scrip master at most once a day and
+            memory-mapping the cached array on later starts
+        """
+        if self.instruments is None or force:
+            from instruments import InstrumentLoader
+            loader = InstrumentLoader(config.INSTRUMENTS_CACHE_DIR)
+            self.instruments = await loader.load(await self.client.get_session(), force=force)
+        return self.instruments
+
+    async def option_chain(self, name, expiry=None, exchange="NFO", underlying=None, **options):
+        """
+            Builds an option_chain.OptionChain for an underlying, on the nearest expiry unless
+            one is given. Feed it ticks of chain.tokens_to_subscribe() with chain.update
+        """
+        master = await self.get_instruments()
+        if expiry is None:
+            expiries = master.expiries(name, exchange)
+            if not expiries:
+                raise ValueError(f"No {exchange} expiries listed for {name}")
+            expiry = expiries[0]
+        from option_chain import OptionChain
+        return OptionChain(master, name, expiry, exchange, underlying, **options)
+
+
     # Get Gainers and Losers
-    async def get_gainers_losers(self):
-        payload = TOP_GAINERS_LOSERS_PAYLOAD
+    async def get_gainers_losers(self, payload=TOP_GAINERS_LOSERS_PAYLOAD):
         return await self.client.post(GET_GAINERS_LOSERS, payload)
     
 
@@ -1,144 +1,416 @@
-from client import AngelClient
-from config import SUBSCRIBE_ACTION_PAYLOAD, UNSUBSCRIBE_ACTION_PAYLOAD, get_websocket_headers, generate_tokens
-import websocket
+from client import AngelClient, AuthenticationError
+from config import SUBSCRIBE_ACTION_PAYLOAD, UNSUBSCRIBE_ACTION_PAYLOAD, get_websocket_headers
+from decoder import TickDecoder
+from endpoints import GET_MARKET_DATA, SMART_STREAM_URI
+from metrics import METRICS
+from subscriptions import build_action_payloads
+from tick_queue import TickQueue, BLOCK
+import decoder
 import asyncio
-from threading import Thread
-import time
 import json
+import random
 import struct
+import time
+
+DECODE_SECONDS = METRICS.histogram("angel_feed_decode_seconds", "Time to decode one binary frame")
+LAG_SECONDS = METRICS.histogram("angel_feed_lag_seconds", "Exchange timestamp to local receive time")
+CALLBACK_SECONDS = METRICS.histogram("angel_feed_callback_seconds", "Time spent in on_tick, the queue put or on_batch")
+MALFORMED_FRAMES = METRICS.counter("angel_feed_malformed_frames_total", "Binary frames that could not be decoded")
 
 class SmartWebSockets(object):
-    ROOT_WEBSOCKET_URI = "wss://smartapisocket.angelone.in/smart-stream"
+    ROOT_WEBSOCKET_URI = SMART_STREAM_URI
     HEART_BEAT_MESSAGE = "ping"
     HEART_BEAT_INTERVAL = 30  
+    CONNECT_TIMEOUT = 10
+    RECONNECT_BASE_DELAY = 1
+    RECONNECT_MAX_DELAY = 60
+    BACKFILL_DELAY = 0.5          # Gaps found within this window are backfilled in one quote call
+    BACKFILL_BATCH_SIZE = 50      # Tokens per quote request
     LITTLE_ENDIAN_BYTE_ORDER = "<"
     
     # Constants for binary data parsing
-    QUOTE = 1
-    SNAP_QUOTE = 2
-    DEPTH = 3
-
-    SUBSCRIPTION_MODE_MAP = {
-        QUOTE: "QUOTE",
-        SNAP_QUOTE: "SNAP_QUOTE",
-        DEPTH: "DEPTH"
-    }
+    LTP = decoder.LTP
+    QUOTE = decoder.QUOTE
+    SNAP_QUOTE = decoder.SNAP_QUOTE
+    DEPTH = decoder.DEPTH
+
+    SUBSCRIPTION_MODE_MAP = decoder.SUBSCRIPTION_MODE_MAP
+    EXCHANGE_TYPE_MAP = decoder.EXCHANGE_TYPE_MAP
     
-    def __init__(self):
-        self.client = AngelClient()
+    def __init__(self, client=None, on_tick=None, on_batch=None, batch_size=1024, batch_interval=0.1,
+                 queue_size=10000, overflow_policy=BLOCK, subscription=SUBSCRIBE_ACTION_PAYLOAD,
+                 reconnect=True, max_reconnect_attempts=None, on_gap=None, on_backfill=None, queue=None,
+                 market_state=None, recorder=None):
+        """
+            Ticks go to `on_tick` when given, otherwise into a bounded queue read with
+            `async for tick in ws`. `overflow_policy` decides what happens when consumers
+            fall behind: block the reader (backpressure), drop oldest, drop newest or conflate.
+
+            Dropped connections are retried with exponential backoff and the current
+            subscriptions replayed. `on_gap(exchange_type, token, expected, received)` is called
+            when a token's sequence_number skips; with `on_backfill(quotes)` the affected tokens
+            are also refetched from the REST quote endpoint.
+
+            Pass `subscription=None` to connect without subscribing, and `queue` to share one
+            TickQueue between several connections (see subscriptions.SubscriptionManager).
+
+            With `market_state` (a market_state.MarketState, possibly shared between
+            connections) every tick or batch is applied to it before it is delivered.
+            With `recorder` (a journal.JournalWriter) every raw frame is journaled undecoded
+            on receipt, for replay with journal.JournalReplayer. A writer passed in is only
+            flushed on disconnect and the caller closes it, so one can be shared between
+            connections; pass a directory instead to have this connection open its own writer
+            and close it on disconnect.
+        """
+        # Pass the AngelClient used for REST calls to share its login and feed token
+        self.client = client or AngelClient()
         self.headers = get_websocket_headers()
-        self.wsapp = None
-        self.ws_thread = None
-        self.heartbeat_thread = None
+        self.decoder = TickDecoder()
+        self.on_tick = on_tick
+        self.market_state = market_state
+        self.owns_recorder = isinstance(recorder, str)
+        if self.owns_recorder:
+            from journal import JournalWriter
+            recorder = JournalWriter(recorder)
+        self.recorder = recorder
+        self.batcher = None
+        if on_batch:
+            # Batch mode: raw frames are buffered and decoded into NumPy structured arrays
+            from batch_decoder import FrameBatcher
+            if market_state is not None:
+                on_batch = self._with_market_state(on_batch)
+            on_batch = self._with_sequence_check(on_batch)
+            self.batcher = FrameBatcher(self._timed_batch(on_batch), batch_size=batch_size, flush_interval=batch_interval)
+        self.owns_queue = queue is None
+        self.queue = queue if queue is not None else TickQueue(maxsize=queue_size, policy=overflow_policy)
+        self.subscription = subscription
+        self.subscriptions = {}         # (exchange_type, token) -> mode, replayed on reconnect
+        self.reconnect = reconnect
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnects = 0
+        self.on_gap = on_gap
+        self.on_backfill = on_backfill
+        self.last_sequence = {}         # (exchange_type, token) -> last sequence_number seen
+        self.gaps = 0
+        self.pending_backfill = set()
+        self.backfill_task = None
+        self.ws = None
+        self.reader_task = None
+        self.heartbeat_task = None
+        self.batch_flush_task = None
+        self.reconnect_task = None
+        self.ready = asyncio.Event()
         self.is_connected = False
-        try:
-            token_data = generate_tokens()
-            self.headers['Authorization'] = token_data[0]
-            self.headers['x-feed-token'] = token_data[1]
-        except Exception as e:
-            print("Error generating tokens:", e)
-            
-    def _on_open(self, wsapp):
+        self.running = False
+
+    def __aiter__(self):
+        return self.queue.__aiter__()
+
+    def _with_market_state(self, on_batch):
+        def apply_and_forward(mode, batch):
+            self.market_state.update_batch(mode, batch)
+            on_batch(mode, batch)
+        return apply_and_forward
+
+    def _with_sequence_check(self, on_batch):
+        def check_and_forward(mode, batch):
+            if mode != self.DEPTH and len(batch):
+                self._check_batch_sequence(batch)
+            on_batch(mode, batch)
+        return check_and_forward
+
+    def _timed_batch(self, on_batch):
+        def timed(mode, batch):
+            if not METRICS.enabled:
+                return on_batch(mode, batch)
+            start = time.perf_counter_ns()
+            on_batch(mode, batch)
+            CALLBACK_SECONDS.record(time.perf_counter_ns() - start)
+        return timed
+
+    async def _on_open(self):
         print("Websocket Opened!")
         self.is_connected = True
-        wsapp.send(self.HEART_BEAT_MESSAGE)
-        self.subscribe(wsapp, SUBSCRIBE_ACTION_PAYLOAD)
-        
-    def _on_error(self, wsapp, error):
-        print("Error occurred:", error)
-        self.is_connected = False
-        
-    def _on_close(self, wsapp, close_status_code, close_msg):
-        print("WebSocket connection closed:", close_msg if close_msg else "No message")
+        await self.ws.send_str(self.HEART_BEAT_MESSAGE)
+        if self.subscriptions:
+            for payload in build_action_payloads(self.subscriptions, action=1):
+                await self.subscribe(payload)
+        elif self.subscription:
+            await self.subscribe(self.subscription)
+
+    def _on_close(self):
+        print("WebSocket connection closed:", self.ws.close_code if self.ws else "No message")
         self.is_connected = False
-        self.unsubscribe(wsapp, UNSUBSCRIBE_ACTION_PAYLOAD)
-    
-    def _on_message(self, wsapp, message):
+        self.ready.clear()
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        if self.running and self.reconnect:
+            self.reconnect_task = asyncio.get_running_loop().create_task(self._reconnect_loop())
+
+    async def _on_message(self, message):
+        if self.batcher:
+            if not self.batcher.add(message) and METRICS.enabled:
+                MALFORMED_FRAMES.inc()
+            return
+        if METRICS.enabled:
+            return await self._on_message_timed(message)
+        tick = self.decoder.decode(message)
+        if tick is None:
+            print(f"Could not parse binary packet of length {len(message)}")
+            return
+        if tick.subscription_mode != self.DEPTH:
+            self._check_sequence(tick)
+        if self.market_state is not None:
+            self.market_state.update(tick)
+        if self.on_tick:
+            self.on_tick(tick)
+        else:
+            await self.queue.put(tick)
+
+    async def _on_message_timed(self, message):
+        # Same steps as _on_message, timed; kept apart so the untimed path pays one flag check
+        start = time.perf_counter_ns()
+        tick = self.decoder.decode(message)
+        decoded = time.perf_counter_ns()
+        if tick is None:
+            MALFORMED_FRAMES.inc()
+            print(f"Could not parse binary packet of length {len(message)}")
+            return
+        DECODE_SECONDS.record(decoded - start)
+        LAG_SECONDS.record(time.time_ns() - tick.exchange_timestamp * 1000000)
+        if tick.subscription_mode != self.DEPTH:
+            self._check_sequence(tick)
+        if self.market_state is not None:
+            self.market_state.update(tick)
+        start = time.perf_counter_ns()
+        if self.on_tick:
+            self.on_tick(tick)
+        else:
+            await self.queue.put(tick)
+        CALLBACK_SECONDS.record(time.perf_counter_ns() - start)
+
+    def _on_text(self, message):
+        if message != "pong":
+            print(f"Received text message: {message}")
+
+    def _check_sequence(self, tick):
+        key = (tick.exchange_type, tick.token)
+        last = self.last_sequence.get(key)
+        self.last_sequence[key] = tick.sequence_number
+        if last is None or tick.sequence_number <= last + 1:
+            return
+        self._on_sequence_gap(key, last + 1, tick.sequence_number)
+
+    def _check_batch_sequence(self, batch):
+        """_check_sequence for a batch_decoder array: skips within the batch and since the last one, per token"""
+        import numpy as np
+        order = np.lexsort((batch["sequence_number"], batch["token"], batch["exchange_type"]))
+        exchange_types = batch["exchange_type"][order]
+        tokens = batch["token"][order]
+        numbers = batch["sequence_number"][order]
+        new_key = np.ones(len(order), dtype=bool)
+        new_key[1:] = (exchange_types[1:] != exchange_types[:-1]) | (tokens[1:] != tokens[:-1])
+        starts = np.flatnonzero(new_key).tolist()
+        skips = np.flatnonzero(~new_key[1:] & (np.diff(numbers) > 1)) + 1
+        keys = {}
+        for start, end in zip(starts, starts[1:] + [len(order)]):
+            key = keys[start] = (int(exchange_types[start]), tokens[start].decode("ascii"))
+            last = self.last_sequence.get(key)
+            self.last_sequence[key] = int(numbers[end - 1])
+            if last is not None and numbers[start] > last + 1:
+                self._on_sequence_gap(key, last + 1, int(numbers[start]))
+        for position in skips.tolist():
+            start = starts[np.searchsorted(starts, position, side="right") - 1]
+            self._on_sequence_gap(keys[start], int(numbers[position - 1]) + 1, int(numbers[position]))
+
+    def _on_sequence_gap(self, key, expected, received):
+        self.gaps += 1
+        if self.on_gap:
+            self.on_gap(key[0], key[1], expected, received)
+        if self.on_backfill:
+            self.pending_backfill.add(key)
+            if self.backfill_task is None or self.backfill_task.done():
+                self.backfill_task = asyncio.get_running_loop().create_task(self._backfill())
+
+    async def _backfill(self):
+        """Refetches full quotes for tokens with sequence gaps and hands them to on_backfill"""
+        await asyncio.sleep(self.BACKFILL_DELAY)
+        keys, self.pending_backfill = self.pending_backfill, set()
+        exchange_tokens = {}
+        for exchange_type, token in keys:
+            exchange = self.EXCHANGE_TYPE_MAP.get(exchange_type)
+            if exchange:
+                exchange_tokens.setdefault(exchange, []).append(token)
+        for exchange, tokens in exchange_tokens.items():
+            for i in range(0, len(tokens), self.BACKFILL_BATCH_SIZE):
+                payload = {"mode": "FULL", "exchangeTokens": {exchange: tokens[i:i + self.BACKFILL_BATCH_SIZE]}}
+                try:
+                    data = await self.client.post(GET_MARKET_DATA, payload)
+                    if data and data.get("status"):
+                        self.on_backfill(data["data"].get("fetched", []))
+                    else:
+                        print(f"Error backfilling quotes: {data.get('message') if data else 'no response'}")
+                except Exception as e:
+                    print(f"Error backfilling quotes: {e}")
+
+    async def _read_loop(self):
+        from aiohttp import WSMsgType
         try:
-            if isinstance(message, bytes):
-                parsed_data = self._parse_binary_data(message)
-                if parsed_data:  # Only print if parsing was successful
-                    print(json.dumps(parsed_data, indent=4))
-            else:
-                print(f"Received text message: {message}")
-        except Exception as e:
-            print(f"An unexpected error occurred in on_message: {e}")
+            async for message in self.ws:
+                try:
+                    if message.type == WSMsgType.BINARY:
+                        if self.recorder is not None:
+                            self.recorder.append(message.data)
+                        await self._on_message(message.data)
+                    elif message.type == WSMsgType.TEXT:
+                        self._on_text(message.data)
+                    elif message.type == WSMsgType.ERROR:
+                        print("Error occurred:", self.ws.exception())
+                        break
+                except Exception as e:
+                    print(f"An unexpected error occurred in on_message: {e}")
+        finally:
+            self._on_close()
 
-    def _on_ping(self, wsapp, message):
-        print("Ping received")
-        wsapp.send(self.HEART_BEAT_MESSAGE)
-    
-    def _on_pong(self, wsapp, message):
-        print("Pong received")
-        
-    def _heartbeat_loop(self):
+    async def _heartbeat_loop(self):
         """Send periodic heartbeat messages to keep connection alive"""
         while self.is_connected:
+            await asyncio.sleep(self.HEART_BEAT_INTERVAL)
             try:
-                if self.wsapp and self.is_connected:
-                    print(f"Sending heartbeat: {self.HEART_BEAT_MESSAGE}")
-                    self.wsapp.send(self.HEART_BEAT_MESSAGE)
-                time.sleep(self.HEART_BEAT_INTERVAL)
+                if self.ws and not self.ws.closed:
+                    await self.ws.send_str(self.HEART_BEAT_MESSAGE)
             except Exception as e:
                 print(f"Error sending heartbeat: {e}")
                 break
-        
-    def _run_websocket(self):
-        self.wsapp = websocket.WebSocketApp(
-            self.ROOT_WEBSOCKET_URI,
-            header=self.headers,
-            on_open=self._on_open,
-            on_message=self._on_message,
-            on_error=self._on_error,
-            on_close=self._on_close,
-            on_ping=self._on_ping,
-            on_pong=self._on_pong
+
+    async def _batch_flush_loop(self):
+        """Flush batches that hit the time threshold while the feed is quiet"""
+        while self.running:
+            await asyncio.sleep(self.batcher.flush_interval)
+            try:
+                self.batcher.flush(expired_only=True)
+            except Exception as e:
+                print(f"Error flushing batch: {e}")
+
+    async def _reconnect_loop(self):
+        delay = self.RECONNECT_BASE_DELAY
+        attempt = 0
+        while self.running:
+            attempt += 1
+            if self.max_reconnect_attempts and attempt > self.max_reconnect_attempts:
+                print(f"Giving up after {attempt - 1} reconnect attempts")
+                self.running = False
+                if self.owns_queue:
+                    self.queue.close()
+                return
+            # Full jitter keeps many clients from reconnecting in lockstep
+            wait = random.uniform(delay / 2, delay)
+            print(f"Reconnecting in {wait:.1f}s (attempt {attempt})")
+            await asyncio.sleep(wait)
+            try:
+                await self._open()
+                self.reconnects += 1
+                return
+            except Exception as e:
+                print("Error reconnecting to websocket:", e)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    async def _stop_connection_tasks(self):
+        """Cancels the previous connection's heartbeat and waits for it and its reader to finish"""
+        tasks = [task for task in (self.heartbeat_task, self.reader_task)
+                 if task and task is not asyncio.current_task()]
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.heartbeat_task = self.reader_task = None
+
+    async def _open(self):
+        await self._stop_connection_tasks()
+        # Tokens may have been refreshed since the last connection
+        await self.client.authenticate()
+        if not self.client.token or not self.client.feed_token:
+            raise AuthenticationError("No session or feed token to open the websocket with")
+        self.headers['Authorization'] = self.client.token
+        self.headers['x-feed-token'] = self.client.feed_token
+
+        session = await self.client.get_session()
+        self.ws = await asyncio.wait_for(
+            session.ws_connect(self.ROOT_WEBSOCKET_URI, headers=self.headers, max_msg_size=0),
+            timeout=self.CONNECT_TIMEOUT
         )
-        self.wsapp.run_forever()
+        try:
+            await self._on_open()
+        except BaseException:
+            # Don't leave a half-open socket behind for the next attempt
+            self.is_connected = False
+            await self.ws.close()
+            raise
+
+        loop = asyncio.get_running_loop()
+        self.reader_task = loop.create_task(self._read_loop())
+        self.heartbeat_task = loop.create_task(self._heartbeat_loop())
+        self.ready.set()
 
     async def connect(self):
+        """Opens the socket and subscribes. Returns once the feed is ready to deliver ticks"""
         try:
-            # Start WebSocket connection
-            self.ws_thread = Thread(target=self._run_websocket)
-            self.ws_thread.daemon = True
-            self.ws_thread.start()
-            
-            # Wait for connection to establish
-            await asyncio.sleep(2)
-            
-            # Start heartbeat thread
-            self.heartbeat_thread = Thread(target=self._heartbeat_loop)
-            self.heartbeat_thread.daemon = True
-            self.heartbeat_thread.start()
-            
-            return "WebSocket connection initiated with heartbeat"
+            self.running = True
+            await self._open()
+            if self.batcher:
+                self.batch_flush_task = asyncio.get_running_loop().create_task(self._batch_flush_loop())
+            return "WebSocket connection established with heartbeat"
         except Exception as e:
+            self.running = False
             print("Error connecting to websocket:", e)
             raise e
 
     async def disconnect(self):
+        self.running = False
+        if self.ws and not self.ws.closed:
+            try:
+                await self.unsubscribe(build_action_payloads(self.subscriptions, action=0))
+            except Exception as e:
+                print("Error while Unsubscribing: ", e)
         self.is_connected = False
-        if self.wsapp:
-            self.wsapp.close()
-        if self.ws_thread and self.ws_thread.is_alive():
-            self.ws_thread.join(timeout=1)
-        if self.heartbeat_thread and self.heartbeat_thread.is_alive():
-            self.heartbeat_thread.join(timeout=1)
+        for task in (self.heartbeat_task, self.batch_flush_task, self.reconnect_task, self.backfill_task):
+            if task:
+                task.cancel()
+        if self.ws:
+            await self.ws.close()
+        await self._stop_connection_tasks()
+        if self.batcher:
+            self.batcher.flush()
+        if self.owns_recorder:
+            self.recorder.close()
+        elif self.recorder is not None:
+            self.recorder.flush()
+        if self.owns_queue:
+            self.queue.close()
+
+    def _record_subscription(self, payload):
+        mode = payload["params"]["mode"]
+        for token_list in payload["params"]["tokenList"]:
+            for token in token_list["tokens"]:
+                key = (token_list["exchangeType"], token)
+                if payload["action"] == 1:
+                    self.subscriptions[key] = mode
+                else:
+                    self.subscriptions.pop(key, None)
+                    self.last_sequence.pop(key, None)
             
             
-    def subscribe(self, wsapp, payload):
-        try:
-            wsapp.send(json.dumps(payload))
-            print("Successfully Subscribed")
-        except Exception as e:
-            print("Error while Subscribing: ", e)
+    async def subscribe(self, payload):
+        # A failed send raises, so a reconnect whose replay fails is retried rather than left silent
+        await self.ws.send_str(json.dumps(payload))
+        self._record_subscription(payload)
+        print("Successfully Subscribed")
     
-    def unsubscribe(self, wsapp, payload):
-        try:
-            wsapp.send(json.dumps(payload))
+    async def unsubscribe(self, payload):
+        # Accepts one payload or a list of them; stops at the first send that fails
+        for each_payload in payload if isinstance(payload, list) else [payload]:
+            await self.ws.send_str(json.dumps(each_payload))
+            self._record_subscription(each_payload)
             print("Successfully Unsubscribed")
-        except Exception as e:
-            print("Error while Unsubscribing: ", e)
             
             
     def _parse_binary_data(self, binary_data):
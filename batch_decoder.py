@@ -0,0 +1,141 @@
+from threading import Lock
+import time
+import numpy as np
+import decoder
+
+
+def _struct_dtype(fields, itemsize):
+    """Builds a packed dtype from (name, format, offset) triples"""
+    names, formats, offsets = zip(*fields)
+    return np.dtype({"names": list(names), "formats": list(formats), "offsets": list(offsets), "itemsize": itemsize})
+
+
+# One 20 byte best-5 level and one 10 byte depth-20 level, unaligned as on the wire
+BEST_5_LEVEL_DTYPE = _struct_dtype([
+    ("flag", "<u2", 0), ("quantity", "<i8", 2), ("price", "<i8", 10), ("no_of_orders", "<u2", 18)
+], decoder.BEST_5_LEVEL.size)
+
+DEPTH_20_LEVEL_DTYPE = _struct_dtype([
+    ("quantity", "<i4", 0), ("price", "<i4", 4), ("num_of_orders", "<i2", 8)
+], decoder.DEPTH_20_LEVEL.size)
+
+_HEADER_FIELDS = [
+    ("subscription_mode", "u1", 0),
+    ("exchange_type", "u1", 1),
+    ("token", "S25", 2),
+    ("sequence_number", "<i8", 27),
+    ("exchange_timestamp", "<i8", 35),
+    ("last_traded_price", "<i8", 43),
+]
+
+_QUOTE_FIELDS = _HEADER_FIELDS + [
+    ("last_traded_quantity", "<i8", 51),
+    ("average_traded_price", "<i8", 59),
+    ("volume_trade_for_the_day", "<i8", 67),
+    ("total_buy_quantity", "<f8", 75),
+    ("total_sell_quantity", "<f8", 83),
+    ("open_price_of_the_day", "<i8", 91),
+    ("high_price_of_the_day", "<i8", 99),
+    ("low_price_of_the_day", "<i8", 107),
+    ("closed_price", "<i8", 115),
+]
+
+_SNAP_QUOTE_FIELDS = _QUOTE_FIELDS + [
+    ("last_traded_timestamp", "<i8", 123),
+    ("open_interest", "<i8", 131),
+    ("open_interest_change_percentage", "<i8", 139),
+    ("best_5_data", (BEST_5_LEVEL_DTYPE, 10), decoder.BEST_5_OFFSET),
+    ("upper_circuit_limit", "<i8", 347),
+    ("lower_circuit_limit", "<i8", 355),
+    ("week_52_high_price", "<i8", 363),
+    ("week_52_low_price", "<i8", 371),
+]
+
+_DEPTH_FIELDS = [
+    ("subscription_mode", "u1", 0),
+    ("exchange_type", "u1", 1),
+    ("token", "S25", 2),
+    ("exchange_timestamp", "<i8", 35),
+    ("depth_20_buy_data", (DEPTH_20_LEVEL_DTYPE, 20), decoder.DEPTH_20_OFFSET),
+    ("depth_20_sell_data", (DEPTH_20_LEVEL_DTYPE, 20), decoder.DEPTH_20_OFFSET + 20 * decoder.DEPTH_20_LEVEL.size),
+]
+
+# Record dtypes per subscription mode, mirroring the byte offsets of _parse_binary_data
+MODE_DTYPES = {
+    decoder.LTP: _struct_dtype(_HEADER_FIELDS, decoder.LTP_PACKET_SIZE),
+    decoder.QUOTE: _struct_dtype(_QUOTE_FIELDS, decoder.QUOTE_PACKET_SIZE),
+    decoder.SNAP_QUOTE: _struct_dtype(_SNAP_QUOTE_FIELDS, decoder.SNAP_QUOTE_PACKET_SIZE),
+    decoder.DEPTH: _struct_dtype(_DEPTH_FIELDS, decoder.DEPTH_PACKET_SIZE),
+}
+
+
+def decode_batch(frames, mode):
+    """Decodes a list of same-mode frames into one structured array in a single pass"""
+    dtype = MODE_DTYPES[mode]
+    size = dtype.itemsize
+    return np.frombuffer(b"".join(frame[:size] for frame in frames), dtype=dtype)
+
+
+class FrameBatcher(object):
+    """
+        Buffers raw frames per subscription mode in preallocated byte blocks and hands
+        each block to `on_batch(mode, array)` as a structured array once `batch_size`
+        frames have arrived or the oldest buffered frame is `flush_interval` seconds old.
+    """
+
+    def __init__(self, on_batch, batch_size=1024, flush_interval=0.1):
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = Lock()
+        self.frame_sizes = {mode: dtype.itemsize for mode, dtype in MODE_DTYPES.items()}
+        self.buffers = {mode: bytearray(batch_size * dtype.itemsize) for mode, dtype in MODE_DTYPES.items()}
+        self.views = {mode: memoryview(buffer) for mode, buffer in self.buffers.items()}
+        self.counts = dict.fromkeys(MODE_DTYPES, 0)
+        self.first_frame_time = dict.fromkeys(MODE_DTYPES, 0.0)
+        self.dropped_frames = 0
+
+    def add(self, frame):
+        """Buffers one frame. Returns False if the frame was too short or of an unknown mode"""
+        mode = frame[0] if frame else None
+        size = self.frame_sizes.get(mode)
+        if size is None or len(frame) < size:
+            self.dropped_frames += 1
+            return False
+
+        batch = None
+        now = time.monotonic()
+        with self.lock:
+            count = self.counts[mode]
+            if count == 0:
+                self.first_frame_time[mode] = now
+            start = count * size
+            self.views[mode][start:start + size] = frame if len(frame) == size else memoryview(frame)[:size]
+            self.counts[mode] = count = count + 1
+            if count >= self.batch_size or now - self.first_frame_time[mode] >= self.flush_interval:
+                batch = self._take(mode)
+        if batch is not None:
+            self.on_batch(mode, batch)
+        return True
+
+    def flush(self, mode=None, expired_only=False):
+        """Flushes one mode, or every mode with buffered frames. With expired_only only stale batches go out"""
+        modes = [mode] if mode is not None else list(MODE_DTYPES)
+        now = time.monotonic()
+        batches = []
+        with self.lock:
+            for each_mode in modes:
+                if not self.counts[each_mode]:
+                    continue
+                if expired_only and now - self.first_frame_time[each_mode] < self.flush_interval:
+                    continue
+                batches.append((each_mode, self._take(each_mode)))
+        for each_mode, batch in batches:
+            self.on_batch(each_mode, batch)
+
+    def _take(self, mode):
+        # Copy out so the preallocated block can be reused for the next batch
+        dtype = MODE_DTYPES[mode]
+        batch = np.frombuffer(self.buffers[mode], dtype=dtype, count=self.counts[mode]).copy()
+        self.counts[mode] = 0
+        return batch
@@ -0,0 +1,35 @@
+"""
+    Per-tick cost of batched NumPy structured-array decoding against the per-frame TickDecoder.
+
+    Usage: python benchmarks/bench_batch_decoder.py [batch_size]
+"""
+import sys
+import timeit
+
+from frames import random_frames
+import decoder
+from batch_decoder import FrameBatcher, decode_batch
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    tick_decoder = decoder.TickDecoder()
+    batches = []
+    batcher = FrameBatcher(lambda mode, batch: batches.append(batch), batch_size=batch_size, flush_interval=60)
+
+    print(f"{'mode':<12}{'decoder ns/tick':>17}{'decode_batch':>14}{'FrameBatcher':>14}")
+    for mode, name in decoder.SUBSCRIPTION_MODE_MAP.items():
+        frames = random_frames(batch_size, mode)
+        per_frame = min(timeit.repeat(lambda: [tick_decoder.decode(f) for f in frames], number=1, repeat=5))
+        batched = min(timeit.repeat(lambda: decode_batch(frames, mode), number=1, repeat=5))
+
+        def buffered():
+            for frame in frames:
+                batcher.add(frame)
+        buffered_time = min(timeit.repeat(buffered, number=1, repeat=5))
+        scale = 1e9 / len(frames)
+        print(f"{name:<12}{per_frame * scale:>17.0f}{batched * scale:>14.0f}{buffered_time * scale:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
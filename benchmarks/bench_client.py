@@ -0,0 +1,83 @@
+"""
+    Round-trip cost of a new aiohttp session per request against the pooled AngelClient session.
+
+    Usage: python benchmarks/bench_client.py [requests] [url]
+    Without a url a local aiohttp server is started; pass an https url (e.g. https://apiconnect.angelone.in)
+    to include the TLS handshake and DNS lookup that pooling saves.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MFA_TOKEN", "JBSWY3DPEHPK3PXP")
+
+from client import AngelClient
+
+
+async def fresh_session_get(url):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.read()
+
+
+async def pooled_get(client, url):
+    session = await client.get_session()
+    async with session.get(url) as response:
+        return await response.read()
+
+
+async def timed(call, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e3, samples[int(len(samples) * 0.99) - 1] * 1e3
+
+
+async def ok(request):
+    return web.json_response({"status": True, "data": {}})
+
+
+async def start_local_server():
+    app = web.Application()
+    app.router.add_get("/", ok)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    runner = None
+    if len(sys.argv) > 2:
+        url = sys.argv[2]
+    else:
+        runner, url = await start_local_server()
+
+    client = AngelClient(headers={})
+    try:
+        fresh = await timed(lambda: fresh_session_get(url), count)
+        pooled = await timed(lambda: pooled_get(client, url), count)
+    finally:
+        await client.close()
+        if runner:
+            await runner.cleanup()
+
+    print(f"{url}  ({count} sequential requests)")
+    print(f"{'':<16}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'fresh session':<16}{fresh[0]:>10.2f}{fresh[1]:>10.2f}")
+    print(f"{'pooled session':<16}{pooled[0]:>10.2f}{pooled[1]:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""
+    Per-packet cost of the precompiled TickDecoder against SmartWebSockets._parse_binary_data.
+
+    Usage: python benchmarks/bench_decoder.py [packets_per_mode]
+"""
+import os
+import sys
+import timeit
+
+# SmartWebSockets reads credentials from config.py at import; the benchmark never logs in
+os.environ.setdefault("MFA_TOKEN", "JBSWY3DPEHPK3PXP")
+
+from frames import random_frames
+import decoder
+from SmartWebSockets import SmartWebSockets
+
+
+def bench(parse, frames, repeat=5):
+    best = min(timeit.repeat(lambda: [parse(frame) for frame in frames], number=1, repeat=repeat))
+    return best / len(frames) * 1e9
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy = SmartWebSockets.__new__(SmartWebSockets)
+    tick_decoder = decoder.TickDecoder()
+
+    print(f"{'mode':<12}{'legacy ns/pkt':>16}{'decoder ns/pkt':>16}{'speedup':>10}")
+    for mode, name in decoder.SUBSCRIPTION_MODE_MAP.items():
+        frames = random_frames(count, mode)
+        old = bench(legacy._parse_binary_data, frames)
+        new = bench(tick_decoder.decode, frames)
+        print(f"{name:<12}{old:>16.0f}{new:>16.0f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+    Cost of applying ticks to MarketState (per tick and per batch row) and of a reader snapshot.
+
+    Usage: python benchmarks/bench_market_state.py [count]
+"""
+import sys
+import timeit
+
+from frames import random_frames
+import decoder
+from batch_decoder import decode_batch
+from market_state import MarketState
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"{'mode':<12}{'update ns/tick':>16}{'update_batch':>14}{'get':>8}{'depth':>8}")
+    for mode, name in decoder.SUBSCRIPTION_MODE_MAP.items():
+        frames = random_frames(count, mode)
+        ticks = [decoder.decode(frame) for frame in frames]
+        batch = decode_batch(frames, mode)
+        state = MarketState()
+        state.update_batch(mode, batch)
+        keys = state.tokens
+
+        per_tick = min(timeit.repeat(lambda: [state.update(tick) for tick in ticks], number=1, repeat=5))
+        batched = min(timeit.repeat(lambda: state.update_batch(mode, batch), number=1, repeat=5))
+        get = min(timeit.repeat(lambda: [state.get(*key) for key in keys], number=1, repeat=5))
+        depth = min(timeit.repeat(lambda: [state.depth(*key) for key in keys], number=1, repeat=5))
+        scale = 1e9 / count
+        print(f"{name:<12}{per_tick * scale:>16.0f}{batched * scale:>14.0f}"
+              f"{get * 1e9 / len(keys):>8.0f}{depth * 1e9 / len(keys):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
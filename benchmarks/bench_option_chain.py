@@ -0,0 +1,53 @@
+"""
+    Cost of solving implied volatility and Greeks for a whole option chain in one vectorized
+    pass against solving it strike by strike.
+
+    Usage: python benchmarks/bench_option_chain.py [strikes ...]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from option_chain import black_greeks, black_price, implied_volatility
+
+SPOT = 24000.0
+RATE = 0.065
+YEARS = 5 / 365
+
+
+def chain(strikes):
+    forward = SPOT * np.exp(RATE * YEARS)
+    discount = np.exp(-RATE * YEARS)
+    strike = np.linspace(SPOT * 0.9, SPOT * 1.1, strikes)
+    is_call = np.array([[True], [False]])
+    volatility = 0.12 + 0.6 * (strike / forward - 1) ** 2
+    price = black_price(forward, strike, YEARS, volatility, discount, is_call)
+    return price, forward, np.broadcast_to(strike, price.shape), discount, np.broadcast_to(is_call, price.shape)
+
+
+def vectorized(price, forward, strike, discount, is_call):
+    iv = implied_volatility(price, forward, strike, YEARS, discount, is_call)
+    return black_greeks(SPOT, forward, strike, YEARS, iv, discount, RATE, 0.0, is_call)
+
+
+def strike_by_strike(price, forward, strike, discount, is_call):
+    for index in np.ndindex(price.shape):
+        iv = implied_volatility(price[index], forward, strike[index], YEARS, discount, is_call[index])
+        black_greeks(SPOT, forward, strike[index], YEARS, iv, discount, RATE, 0.0, is_call[index])
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 100, 200]
+    print(f"{'options':>8}{'chain ms':>10}{'per strike ms':>15}{'speedup':>9}")
+    for strikes in sizes:
+        args = chain(strikes)
+        whole = min(timeit.repeat(lambda: vectorized(*args), number=10, repeat=3)) / 10
+        looped = min(timeit.repeat(lambda: strike_by_strike(*args), number=1, repeat=3))
+        print(f"{2 * strikes:>8}{whole * 1e3:>10.2f}{looped * 1e3:>15.1f}{looped / whole:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
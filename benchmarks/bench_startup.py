@@ -0,0 +1,79 @@
+"""
+    Cold import time of the wrapper's entry modules, each in a fresh interpreter, and the
+    wall time of `python -m cli --help`. Fails if an import goes over --budget milliseconds
+    or pulls in a module that should only load on first use.
+
+    Usage: python benchmarks/bench_startup.py [--repeat 5] [--budget 100]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ("SmartAPI", "SmartWebSockets", "client", "cli")
+
+# Must not be imported until a session, login or array is actually needed
+DEFERRED = ("aiohttp", "requests", "numpy", "pyotp", "dotenv")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+
+def measure_import(module, repeat):
+    best, loaded = None, ""
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.split()
+        elapsed = float(output[0])
+        loaded = output[1] if len(output) > 1 else ""
+        best = elapsed if best is None else min(best, elapsed)
+    return best, loaded
+
+
+def measure_process(args, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=100, help="Import budget per module in ms")
+    args = parser.parse_args()
+
+    failures = []
+    baseline = measure_process(["-c", "pass"], args.repeat)
+    print(f"{'import':<18}{'ms':>8}  deferred modules loaded")
+    for module in MODULES:
+        elapsed, loaded = measure_import(module, args.repeat)
+        print(f"{module:<18}{elapsed * 1e3:>8.1f}  {loaded or '-'}")
+        if elapsed * 1e3 > args.budget:
+            failures.append(f"import {module} took {elapsed * 1e3:.1f} ms, budget {args.budget:.0f} ms")
+        if loaded:
+            failures.append(f"import {module} loaded {loaded}")
+    help_time = measure_process(["-m", "cli", "--help"], args.repeat)
+    print(f"{'python -m cli --help':<18}{help_time * 1e3:>8.1f}  (bare interpreter {baseline * 1e3:.1f} ms)")
+
+    if failures:
+        for failure in failures:
+            print("FAIL", failure)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+    End-to-end benchmarks against the local mock server: REST round trips, order throughput,
+    decode throughput and tick-to-callback latency. Needs no credentials or network access.
+
+    Usage: python benchmarks/bench_suite.py [--quick] [--json results.json] [--baseline baseline.json]
+    With --baseline the run exits non-zero if any metric is worse than the baseline by more than
+    --tolerance (default 25%), so CI can flag client regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockAngelServer, free_port, random_frames
+
+# The mock's address must be in the environment before endpoints.py is imported
+SERVER = MockAngelServer(port=free_port(), record_sends=True)
+os.environ.update(SERVER.env())
+for name, value in (("MFA_TOKEN", "JBSWY3DPEHPK3PXP"), ("API_KEY", "mock"), ("CLIENT_ID", "MOCK001")):
+    os.environ.setdefault(name, value)
+
+import decoder
+from batch_decoder import decode_batch
+from client import AngelClient
+from endpoints import GET_PROFILE
+from orders import Order, OrderGateway
+from rate_limiter import RequestScheduler
+from SmartWebSockets import SmartWebSockets
+
+# Direction of each metric for the baseline comparison
+HIGHER_IS_BETTER = ("per_s",)
+
+
+def percentiles(samples, scale=1.0):
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return {
+        "p50": samples[last // 2] * scale,
+        "p99": samples[last * 99 // 100] * scale,
+        "max": samples[last] * scale,
+    }
+
+
+def unlimited_client():
+    # Broker rate limits would dominate every number; measure the client itself
+    return AngelClient(scheduler=RequestScheduler(rate_limits={}, max_in_flight=100), limit_per_host=100)
+
+
+async def bench_rest(count):
+    async with unlimited_client() as client:
+        await client.authenticate()
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            await client.get(GET_PROFILE)
+            samples.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await asyncio.gather(*[client.get(GET_PROFILE) for _ in range(count)])
+        concurrent = count / (time.perf_counter() - start)
+    results = {f"rest_round_trip_ms_{key}": value for key, value in percentiles(samples, 1e3).items()}
+    results["rest_concurrent_requests_per_s"] = concurrent
+    return results
+
+
+async def bench_orders(count):
+    async with unlimited_client() as client:
+        await client.authenticate()
+        gateway = OrderGateway(client)
+        basket = [Order(f"MOCK{i}", str(1000 + i), "NSE", "BUY" if i % 2 else "SELL", 1) for i in range(count)]
+        start = time.perf_counter()
+        placed = await gateway.place_basket(basket)
+        elapsed = time.perf_counter() - start
+    failed = sum(not result.ok for result in placed)
+    if failed:
+        print(f"{failed} of {count} mock orders failed")
+    results = {f"order_ack_ms_{key}": value
+               for key, value in percentiles([result.latency for result in placed], 1e3).items()}
+    results["orders_per_s"] = count / elapsed
+    return results
+
+
+def bench_decode(count):
+    results = {}
+    tick_decoder = decoder.TickDecoder()
+    for mode, name in decoder.SUBSCRIPTION_MODE_MAP.items():
+        frames = random_frames(count, mode)
+        per_frame = min(timeit.repeat(lambda: [tick_decoder.decode(f) for f in frames], number=1, repeat=3))
+        batched = min(timeit.repeat(lambda: decode_batch(frames, mode), number=1, repeat=3))
+        results[f"decode_{name.lower()}_frames_per_s"] = count / per_frame
+        results[f"decode_batch_{name.lower()}_frames_per_s"] = count / batched
+    return results
+
+
+async def bench_feed(tokens, rate, duration):
+    SERVER.rate = rate
+    latencies = []
+    sent_at = SERVER.sent_at
+
+    def on_tick(tick):
+        sent = sent_at.pop((tick.exchange_type, tick.token, tick.sequence_number), None)
+        if sent is not None:
+            latencies.append(time.perf_counter() - sent)
+
+    subscription = {
+        "correlationID": "bench00001",
+        "action": 1,
+        "params": {"mode": decoder.QUOTE, "tokenList": [{"exchangeType": 1, "tokens": [str(10000 + i) for i in range(tokens)]}]},
+    }
+    client = AngelClient()
+    ws = SmartWebSockets(client=client, on_tick=on_tick, subscription=subscription, reconnect=False)
+    await ws.connect()
+    await asyncio.sleep(duration)
+    await ws.disconnect()
+    await client.close()
+    results = {f"tick_to_callback_us_{key}": value for key, value in percentiles(latencies or [0.0], 1e6).items()}
+    results["ticks_per_s"] = len(latencies) / duration
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        higher_is_better = name.endswith(HIGHER_IS_BETTER)
+        change = (previous - value) / previous if higher_is_better else (value - previous) / previous
+        if change > tolerance:
+            regressions.append(f"{name}: {previous:.1f} -> {value:.1f} ({change:+.0%} worse)")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Smaller sample sizes")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Fail when worse than the results in this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    scale = 0.2 if args.quick else 1.0
+
+    await SERVER.start()
+    results = {}
+    try:
+        results.update(await bench_rest(int(500 * scale)))
+        results.update(await bench_orders(int(500 * scale)))
+        results.update(bench_decode(int(20000 * scale)))
+        results.update(await bench_feed(tokens=200, rate=50, duration=5 * scale))
+    finally:
+        await SERVER.stop()
+
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f"{name:<{width}}  {value:>14.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against", args.baseline)
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,7 @@
+"""Synthetic smart-stream frames in the exact binary layouts the feed sends (built by mock_server)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import ltp_frame, quote_frame, snap_quote_frame, depth_frame, FRAME_BUILDERS, random_frames
@@ -0,0 +1,317 @@
+from collections import deque
+import asyncio
+import time
+import numpy as np
+from decoder import DEPTH, EXCHANGE_TYPE_MAP
+from historical import CANDLE_DTYPE
+
+# Bar length in seconds for every interval the candle API serves
+INTERVAL_SECONDS = {
+    "ONE_MINUTE": 60,
+    "THREE_MINUTE": 180,
+    "FIVE_MINUTE": 300,
+    "TEN_MINUTE": 600,
+    "FIFTEEN_MINUTE": 900,
+    "THIRTY_MINUTE": 1800,
+    "ONE_HOUR": 3600,
+    "ONE_DAY": 86400,
+}
+
+IST_OFFSET = 19800
+# Intraday bars are aligned to the 09:15 IST session open like the candle API's
+# (09:15, 10:15, ... for ONE_HOUR); daily bars start at IST midnight
+SESSION_ORIGIN = 9 * 3600 + 15 * 60 - IST_OFFSET
+DAY_ORIGIN = -IST_OFFSET
+
+
+def bucket_start(timestamp, seconds):
+    """Open time (unix seconds) of the bar of length `seconds` containing `timestamp`"""
+    origin = DAY_ORIGIN if seconds >= 86400 else SESSION_ORIGIN
+    return timestamp - (timestamp - origin) % seconds
+
+
+class CandleSeries(object):
+    """
+        Forming bar, recent closed bars and bar-close indicators (EMA of close, Wilder ATR)
+        for one token and interval. Every update is O(1).
+    """
+    __slots__ = (
+        "exchange_type", "token", "interval", "seconds", "start", "open", "high", "low", "close",
+        "volume", "closed", "ema", "ema_alpha", "atr", "atr_period", "true_ranges", "previous_close",
+    )
+
+    def __init__(self, exchange_type, token, interval, max_bars=500, ema_period=20, atr_period=14):
+        self.exchange_type = exchange_type
+        self.token = token
+        self.interval = interval
+        self.seconds = INTERVAL_SECONDS[interval]
+        self.start = None
+        self.open = self.high = self.low = self.close = 0.0
+        self.volume = 0
+        self.closed = deque(maxlen=max_bars)
+        self.ema_alpha = 2.0 / (ema_period + 1)
+        self.atr_period = atr_period
+        self._reset_indicators()
+
+    def _reset_indicators(self):
+        self.ema = None
+        self.atr = None
+        self.true_ranges = 0
+        self.previous_close = None
+
+    def open_bar(self, start, price, quantity):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = quantity
+
+    def add(self, price, quantity):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += quantity
+
+    def close_bar(self):
+        """Moves the forming bar to the closed bars and returns it as a tuple"""
+        bar = (self.start, self.open, self.high, self.low, self.close, self.volume)
+        self.closed.append(bar)
+        self._apply_indicators(bar)
+        self.start = None
+        return bar
+
+    def _apply_indicators(self, bar):
+        _, _, high, low, close, _ = bar
+        self.ema = close if self.ema is None else self.ema + self.ema_alpha * (close - self.ema)
+        if self.previous_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high, self.previous_close) - min(low, self.previous_close)
+        self.previous_close = close
+        # Wilder smoothing; the first `atr_period` bars are a plain average
+        if self.true_ranges < self.atr_period:
+            self.true_ranges += 1
+            self.atr = true_range if self.atr is None else self.atr + (true_range - self.atr) / self.true_ranges
+        else:
+            self.atr += (true_range - self.atr) / self.atr_period
+
+    def seed(self, candles, now=None):
+        """
+            Merges historical CANDLE_DTYPE rows in front of the live bars. Live data wins for
+            bars it fully covers; a historical bar overlapping the first live bar contributes its
+            open, range and volume. Indicators are replayed over the merged history.
+        """
+        rows = [tuple(row) for row in np.asarray(candles).tolist()]
+        first_live = self.closed[0][0] if self.closed else self.start
+        if first_live is None:
+            # No ticks yet: an unfinished historical bar becomes the forming bar
+            now = time.time() if now is None else now
+            if rows and rows[-1][0] + self.seconds > now:
+                start, self.open, self.high, self.low, self.close, self.volume = rows.pop()
+                self.start = int(start)
+            history = rows
+        else:
+            history = [row for row in rows if row[0] < first_live]
+            for row in rows:
+                if row[0] == first_live:
+                    self._merge_first(row)
+
+        closed = history + list(self.closed)
+        self.closed = deque(closed, maxlen=self.closed.maxlen)
+        self._reset_indicators()
+        for bar in closed:
+            self._apply_indicators(bar)
+
+    def _merge_first(self, row):
+        _, open_, high, low, _, volume = row
+        if self.closed:
+            start, _, live_high, live_low, close, live_volume = self.closed[0]
+            self.closed[0] = (start, open_, max(high, live_high), min(low, live_low), close, max(volume, live_volume))
+        else:
+            self.open = open_
+            self.high = max(self.high, high)
+            self.low = min(self.low, low)
+            self.volume = max(self.volume, volume)
+
+    def bars(self, include_forming=False):
+        rows = list(self.closed)
+        if include_forming and self.start is not None:
+            rows.append((self.start, self.open, self.high, self.low, self.close, self.volume))
+        return np.array(rows, dtype=CANDLE_DTYPE)
+
+
+class _Instrument(object):
+    __slots__ = ("series", "day", "cumulative_volume", "vwap_value", "vwap_volume")
+
+    def __init__(self, series):
+        self.series = series
+        self.day = None
+        self.cumulative_volume = None
+        self.vwap_value = 0.0
+        self.vwap_volume = 0
+
+
+class CandleAggregator(object):
+    """
+        Builds OHLCV bars for several intervals per token straight from feed ticks, with session
+        VWAP updated per trade and EMA / ATR updated per closed bar. Bars close on the first tick
+        of the next interval or, for quiet tokens, from `run()` as soon as the interval ends, and
+        `on_bar(exchange_type, token, interval, bar)` is called with the closed bar. Historical
+        candles are merged in with `seed()` or `backfill()`.
+
+        Prices are converted from paise to rupees to match the candle API. Traded volume is the
+        change in volume_trade_for_the_day between ticks, since repeated quotes of one trade
+        would count last_traded_quantity more than once; LTP mode ticks carry no volume.
+    """
+    CLOSE_GRACE = 0.25      # Seconds past the interval end to wait for in-flight ticks
+
+    def __init__(self, intervals=("ONE_MINUTE",), on_bar=None, max_bars=500, ema_period=20,
+                 atr_period=14, price_divisor=100, close_grace=CLOSE_GRACE):
+        unknown = [interval for interval in intervals if interval not in INTERVAL_SECONDS]
+        if unknown:
+            raise ValueError(f"Unknown intervals {unknown}, expected some of {list(INTERVAL_SECONDS)}")
+        self.intervals = tuple(intervals)
+        self.on_bar = on_bar
+        self.max_bars = max_bars
+        self.ema_period = ema_period
+        self.atr_period = atr_period
+        self.price_divisor = price_divisor
+        self.close_grace = close_grace
+        self.instruments = {}   # (exchange_type, token) -> _Instrument
+        self.forming = {interval: set() for interval in self.intervals}
+        self.late_ticks = 0
+        self.task = None
+
+    def _instrument(self, exchange_type, token):
+        key = (exchange_type, token)
+        instrument = self.instruments.get(key)
+        if instrument is None:
+            instrument = _Instrument([
+                CandleSeries(exchange_type, token, interval, self.max_bars, self.ema_period, self.atr_period)
+                for interval in self.intervals
+            ])
+            self.instruments[key] = instrument
+        return instrument
+
+    def series(self, exchange_type, token, interval):
+        return self._instrument(exchange_type, token).series[self.intervals.index(interval)]
+
+    def update(self, tick):
+        """Applies one tick record; usable directly as SmartWebSockets' on_tick"""
+        if tick.subscription_mode == DEPTH:
+            return
+        instrument = self.instruments.get((tick.exchange_type, tick.token))
+        if instrument is None:
+            instrument = self._instrument(tick.exchange_type, tick.token)
+        timestamp = tick.exchange_timestamp // 1000
+        price = tick.last_traded_price / self.price_divisor
+
+        quantity = 0
+        if len(tick) > 6:
+            volume = tick.volume_trade_for_the_day
+            previous = instrument.cumulative_volume
+            if previous is not None:
+                quantity = volume - previous if volume >= previous else volume
+            instrument.cumulative_volume = volume
+
+        day = (timestamp + IST_OFFSET) // 86400
+        if day != instrument.day:
+            instrument.day = day
+            instrument.vwap_value = 0.0
+            instrument.vwap_volume = 0
+        if quantity:
+            instrument.vwap_value += price * quantity
+            instrument.vwap_volume += quantity
+
+        for series in instrument.series:
+            start = series.start
+            if start is not None and start <= timestamp < start + series.seconds:
+                series.add(price, quantity)
+                continue
+            if start is not None and timestamp < start:
+                self.late_ticks += 1
+                continue
+            if start is not None:
+                self._emit(series.close_bar(), series)
+            elif series.closed and timestamp < series.closed[-1][0] + series.seconds:
+                # Tick for a bar already closed by run()
+                self.late_ticks += 1
+                continue
+            series.open_bar(bucket_start(timestamp, series.seconds), price, quantity)
+            self.forming[series.interval].add(series)
+
+    def _emit(self, bar, series):
+        if self.on_bar:
+            self.on_bar(series.exchange_type, series.token, series.interval, bar)
+
+    def close_expired(self, now=None):
+        """Closes every forming bar whose interval ended by `now`; returns how many were closed"""
+        now = time.time() if now is None else now
+        closed = 0
+        for forming in self.forming.values():
+            expired = [series for series in forming if series.start + series.seconds <= now]
+            for series in expired:
+                forming.discard(series)
+                self._emit(series.close_bar(), series)
+            closed += len(expired)
+        return closed
+
+    def next_close(self, now=None):
+        """Unix time at which the next interval ends"""
+        now = time.time() if now is None else now
+        return min(
+            bucket_start(int(now), INTERVAL_SECONDS[interval]) + INTERVAL_SECONDS[interval]
+            for interval in self.intervals
+        )
+
+    def start(self):
+        """Schedules the bar closing loop on the running event loop"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.next_close() + self.close_grace - time.time()))
+            self.close_expired()
+
+    def seed(self, exchange_type, token, interval, candles, now=None):
+        """Merges historical candles (CANDLE_DTYPE) for one token and interval"""
+        series = self.series(exchange_type, token, interval)
+        series.seed(candles, now)
+        if series.start is not None:
+            self.forming[interval].add(series)
+
+    async def backfill(self, downloader, instruments, fromdate, todate=None):
+        """
+            Fetches candles for (exchange_type, token) pairs through a historical.HistoricalDownloader
+            and seeds every interval with them
+        """
+        todate = todate or int(time.time())
+        for interval in self.intervals:
+            pairs = [(EXCHANGE_TYPE_MAP[exchange_type], str(token)) for exchange_type, token in instruments]
+            candles = await downloader.fetch_many(pairs, interval, fromdate, todate)
+            for (exchange_type, token), pair in zip(instruments, pairs):
+                self.seed(exchange_type, str(token), interval, candles[pair])
+
+    def bars(self, exchange_type, token, interval, include_forming=False):
+        """Closed bars (historical and live) as a CANDLE_DTYPE array, oldest first"""
+        return self.series(exchange_type, token, interval).bars(include_forming)
+
+    def indicators(self, exchange_type, token, interval):
+        """Session VWAP and the latest bar-close EMA and ATR, None until available"""
+        instrument = self._instrument(exchange_type, token)
+        series = instrument.series[self.intervals.index(interval)]
+        return {
+            "vwap": instrument.vwap_value / instrument.vwap_volume if instrument.vwap_volume else None,
+            "ema": series.ema,
+            "atr": series.atr,
+        }
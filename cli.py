@@ -0,0 +1,216 @@
+"""
+    Command line access to the wrapper for scripts and cron jobs. Responses are printed as JSON.
+
+    Usage: python -m cli <command> [options]; python -m cli <command> --help for the options.
+
+    Only argparse and json are imported up front. The client, aiohttp, NumPy and the credentials load when a
+    command runs, so --help and argument errors return immediately.
+"""
+import argparse
+import json
+import sys
+
+QUOTE_MODES = ("LTP", "OHLC", "FULL")
+STREAM_MODES = {"LTP": 1, "QUOTE": 2, "SNAP_QUOTE": 3, "DEPTH": 4}     # decoder modes
+
+
+def exchange_token(value):
+    """EXCHANGE:TOKEN, e.g. NSE:3045"""
+    exchange, separator, token = value.partition(":")
+    if not separator or not exchange or not token:
+        raise argparse.ArgumentTypeError(f"Expected EXCHANGE:TOKEN, got {value!r}")
+    return exchange.upper(), token
+
+
+def _jsonable(value):
+    if hasattr(value, "_asdict"):
+        return {key: _jsonable(each) for key, each in value._asdict().items()}
+    if isinstance(value, dict):
+        return {(":".join(key) if isinstance(key, tuple) else key): _jsonable(each) for key, each in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(each) for each in value]
+    if hasattr(value, "tolist"):
+        return _jsonable(value.tolist())
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def output(value):
+    print(json.dumps(_jsonable(value), indent=2, default=str))
+
+
+async def profile(api, args):
+    return await api.get_profile()
+
+
+async def quote(api, args):
+    return await api.get_quotes(args.tokens, args.mode)
+
+
+async def historical(api, args):
+    exchange, token = args.token
+    return await api.get_historical_data({
+        "exchange": exchange, "symboltoken": token, "interval": args.interval,
+        "fromdate": args.fromdate, "todate": args.todate,
+    })
+
+
+async def gainers(api, args):
+    return await api.get_gainers_losers({"datatype": args.datatype, "expirytype": args.expirytype})
+
+
+async def orders(api, args):
+    return await api.get_order_book()
+
+
+async def trades(api, args):
+    return await api.get_trade_book()
+
+
+async def place(api, args):
+    from orders import Order
+    exchange, token = args.token
+    order = Order(args.symbol, token, exchange, args.side, args.quantity, args.type, args.product,
+                  args.variety, args.duration, args.price, args.trigger)
+    return await api.place_order(order)
+
+
+async def cancel(api, args):
+    return await api.cancel_basket([(orderid, args.variety) for orderid in args.orderids])
+
+
+async def cancel_all(api, args):
+    from order_state import OPEN_STATUSES
+    book = await api.get_order_book()
+    if not book or not book.get("status"):
+        return book
+    working = [(row["orderid"], row.get("variety") or "NORMAL") for row in book.get("data") or []
+               if (row.get("status") or "").lower() in OPEN_STATUSES]
+    return await api.cancel_basket(working) if working else []
+
+
+async def instrument(api, args):
+    master = await api.get_instruments()
+    row = master.find(args.exchange.upper(), args.symbol)
+    return None if row is None else dict(zip(row.dtype.names, row.tolist()))
+
+
+async def expiries(api, args):
+    master = await api.get_instruments()
+    return [str(expiry) for expiry in master.expiries(args.name, args.exchange.upper())]
+
+
+async def stream(api, args):
+    import asyncio
+    import decoder
+    from SmartWebSockets import SmartWebSockets
+    from subscriptions import build_action_payloads
+    exchange_types = {name: exchange_type for exchange_type, name in decoder.EXCHANGE_TYPE_MAP.items()}
+    entries = {(exchange_types[exchange], token): STREAM_MODES[args.mode] for exchange, token in args.tokens}
+    ws = SmartWebSockets(client=api.client, subscription=None, reconnect=False)
+    await ws.connect()
+    for payload in build_action_payloads(entries, action=1):
+        await ws.subscribe(payload)
+    received = 0
+
+    async def read():
+        nonlocal received
+        async for tick in ws:
+            print(json.dumps(_jsonable(tick)), flush=True)
+            received += 1
+            if args.count and received >= args.count:
+                return
+
+    try:
+        await asyncio.wait_for(read(), args.seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await ws.disconnect()
+    return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("profile", help="User profile").set_defaults(run=profile)
+
+    command = commands.add_parser("quote", help="Market quotes for EXCHANGE:TOKEN pairs")
+    command.add_argument("tokens", nargs="+", type=exchange_token)
+    command.add_argument("--mode", choices=QUOTE_MODES, default="FULL")
+    command.set_defaults(run=quote)
+
+    command = commands.add_parser("historical", help="Candles for one EXCHANGE:TOKEN")
+    command.add_argument("token", type=exchange_token)
+    command.add_argument("--interval", default="ONE_HOUR")
+    command.add_argument("--from", dest="fromdate", required=True, help="YYYY-MM-DD HH:MM")
+    command.add_argument("--to", dest="todate", required=True, help="YYYY-MM-DD HH:MM")
+    command.set_defaults(run=historical)
+
+    command = commands.add_parser("gainers", help="Top gainers / losers")
+    command.add_argument("--datatype", default="PercOIGainers",
+                         help="PercOIGainers, PercOILosers, PercPriceGainers or PercPriceLosers")
+    command.add_argument("--expirytype", default="NEAR", choices=("NEAR", "NEXT", "FAR"))
+    command.set_defaults(run=gainers)
+
+    commands.add_parser("orders", help="Order book").set_defaults(run=orders)
+    commands.add_parser("trades", help="Trade book").set_defaults(run=trades)
+
+    command = commands.add_parser("place", help="Place one order")
+    command.add_argument("symbol", help="Trading symbol, e.g. SBIN-EQ")
+    command.add_argument("token", type=exchange_token)
+    command.add_argument("side", choices=("BUY", "SELL"))
+    command.add_argument("quantity", type=int)
+    command.add_argument("--type", default="MARKET", help="MARKET, LIMIT, STOPLOSS_LIMIT or STOPLOSS_MARKET")
+    command.add_argument("--product", default="INTRADAY")
+    command.add_argument("--variety", default="NORMAL")
+    command.add_argument("--duration", default="DAY")
+    command.add_argument("--price", type=float, default=0)
+    command.add_argument("--trigger", type=float, default=0)
+    command.set_defaults(run=place)
+
+    command = commands.add_parser("cancel", help="Cancel orders by id")
+    command.add_argument("orderids", nargs="+")
+    command.add_argument("--variety", default="NORMAL")
+    command.set_defaults(run=cancel)
+
+    commands.add_parser("cancel-all", help="Cancel every working order in the order book").set_defaults(run=cancel_all)
+
+    command = commands.add_parser("instrument", help="Look up an instrument in the scrip master")
+    command.add_argument("exchange")
+    command.add_argument("symbol")
+    command.set_defaults(run=instrument)
+
+    command = commands.add_parser("expiries", help="Expiries listed for an underlying")
+    command.add_argument("name", help="e.g. NIFTY")
+    command.add_argument("--exchange", default="NFO")
+    command.set_defaults(run=expiries)
+
+    command = commands.add_parser("stream", help="Print live ticks as JSON lines")
+    command.add_argument("tokens", nargs="+", type=exchange_token)
+    command.add_argument("--mode", choices=tuple(STREAM_MODES), default="LTP")
+    command.add_argument("--seconds", type=float, default=10)
+    command.add_argument("--count", type=int, default=0, help="Stop after this many ticks")
+    command.set_defaults(run=stream)
+    return parser
+
+
+async def run(args):
+    from SmartAPI import AngelAPIWrapper
+    async with AngelAPIWrapper() as api:
+        return await args.run(api, args)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    import asyncio
+    result = asyncio.run(run(args))
+    if result is not None:
+        output(result)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,159 @@
-import aiohttp
-from config import get_headers, generate_token
+import asyncio
+from config import get_headers_async, get_login_payload
+from endpoints import AUTHENTICATE, GENERATE_TOKEN
+from token_manager import TokenManager
+from rate_limiter import RequestScheduler
+from metrics import METRICS, endpoint_label
+import time
+
+class AuthenticationError(Exception):
+    """Login failed; raised instead of sending requests without a session token"""
+
 
 class AngelClient:
-    def __init__(self):
-        self.headers = get_headers()
-        self.token = generate_token()
-        self.headers["Authorization"] = f"Bearer {self.token}"
-        
-    
-    async def get(self, url, params=None):
-        async with aiohttp.ClientSession() as session:
+    # Connection pool defaults, shared by every request made through this client
+    POOL_LIMIT = 100
+    POOL_LIMIT_PER_HOST = 20
+    KEEPALIVE_TIMEOUT = 60
+    DNS_CACHE_TTL = 300
+    REQUEST_TIMEOUT = 10
+
+    def __init__(self, headers=None, limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=DNS_CACHE_TTL, timeout=REQUEST_TIMEOUT,
+                 scheduler=None):
+        # Headers and tokens are filled in by authenticate() on first use, unless given
+        self.headers = headers
+        self.token = None
+        self.refresh_token = None
+        self.feed_token = None
+        self.login_lock = asyncio.Lock()
+        self.token_manager = TokenManager(self)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = timeout
+        self.session = None
+        # Requests beyond the per-endpoint rate limits or the pool size queue here by priority
+        self.scheduler = scheduler or RequestScheduler(max_in_flight=limit_per_host)
+
+    async def __aenter__(self):
+        await self.get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def get_session(self):
+        """Returns the long-lived session, opening it on first use inside the running loop"""
+        if self.session is None or self.session.closed:
+            # Imported here: aiohttp is the largest import and a process may never make a request
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+                use_dns_cache=True
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def authenticate(self, force=False):
+        """
+            Logs in once with a single round trip and keeps the jwtToken for REST and the
+            feedToken for the websocket. Concurrent callers wait on the same login.
+            Raises AuthenticationError when the login is rejected or fails.
+        """
+        if self.headers is not None and not force:
+            return None
+        async with self.login_lock:
+            if self.headers is not None and not force:
+                return None
+            session = await self.get_session()
+            headers = await get_headers_async(session)
+            try:
+                async with self.scheduler.slot(AUTHENTICATE):
+                    async with session.post(AUTHENTICATE, headers=headers, json=get_login_payload()) as response:
+                        data = await response.json()
+            except Exception as e:
+                raise AuthenticationError(f"Error Generating Token: {str(e)}") from e
+            if not isinstance(data, dict) or not data.get("status") or not (data.get("data") or {}).get("jwtToken"):
+                message = data.get("message") if isinstance(data, dict) else None
+                raise AuthenticationError(f"Error Generating Token: {message or 'login rejected'}")
+            self._set_tokens(data["data"], headers)
+            self.token_manager.start()
+            return data
+
+    async def refresh(self):
+        """Renews the session through GENERATE_TOKEN with the refresh token. Returns True on success"""
+        if not self.refresh_token:
+            return False
+        session = await self.get_session()
+        try:
+            async with self.scheduler.slot(GENERATE_TOKEN):
+                async with session.post(GENERATE_TOKEN, headers=self.headers, json={"refreshToken": self.refresh_token}) as response:
+                    data = await response.json()
+            self._set_tokens(data["data"], self.headers)
+        except Exception as e:
+            print(f"Error Refreshing Token: {str(e)}")
+            return False
+        return True
+
+    def _set_tokens(self, tokens, headers):
+        # Swap in a new headers dict so requests in flight keep the one they started with
+        token = tokens["jwtToken"]
+        headers = dict(headers)
+        headers["Authorization"] = token if token.startswith("Bearer ") else f"Bearer {token}"
+        self.token = token
+        self.refresh_token = tokens.get("refreshToken") or self.refresh_token
+        self.feed_token = tokens.get("feedToken") or self.feed_token
+        self.headers = headers
+        self.token_manager.update(self.token, self.feed_token)
+
+    async def close(self):
+        await self.token_manager.stop()
+        await self.scheduler.close()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def get(self, url, params=None, priority=None):
+        if self.headers is None:
+            await self.authenticate()
+        session = await self.get_session()
+        async with self.scheduler.slot(url, priority) as wait:
+            if METRICS.enabled:
+                return await self._timed(url, wait, session.get(url, headers=self.headers, params=params))
             async with session.get(url, headers=self.headers, params=params) as response:
                 return await response.json()
-    
 
-    async def post(self, url, payload):
-        async with aiohttp.ClientSession() as session:
+
+    async def post(self, url, payload, priority=None):
+        if self.headers is None:
+            await self.authenticate()
+        session = await self.get_session()
+        async with self.scheduler.slot(url, priority) as wait:
+            if METRICS.enabled:
+                return await self._timed(url, wait, session.post(url, headers=self.headers, json=payload))
             async with session.post(url, headers=self.headers, json=payload) as response:
-                return await response.json()
\ No newline at end of file
+                return await response.json()
+
+    async def _timed(self, url, wait, request):
+        # Queue wait comes from the scheduler; latency covers the round trip and the JSON body
+        endpoint = endpoint_label(url)
+        METRICS.histogram("angel_request_queue_wait_seconds", "Time queued for a rate token and pool slot",
+                          endpoint=endpoint).record(int(wait * 1e9))
+        start = time.perf_counter_ns()
+        try:
+            async with request as response:
+                return await response.json()
+        except Exception:
+            METRICS.counter("angel_request_errors_total", "Requests that raised", endpoint=endpoint).inc()
+            raise
+        finally:
+            METRICS.histogram("angel_request_seconds", "REST round trip latency",
+                              endpoint=endpoint).record(time.perf_counter_ns() - start)
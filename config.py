@@ -1,29 +1,59 @@
-from dotenv import load_dotenv
 import os
-import uuid
-import socket
-import requests
-import pyotp
-from endpoints import AUTHENTICATE
+from functools import lru_cache
+from endpoints import AUTHENTICATE, PUBLIC_IP_ENDPOINT
+
+# Credentials and settings are read from the environment (and .env) on first use, not at
+# import, so importing the wrapper stays cheap. `config.API_KEY` etc. still work as before.
+CREDENTIALS = ("API_KEY", "SECRET_KEY", "CLIENT_ID", "PASSWORD", "MFA_TOKEN")
+
+SETTINGS = {
+    # Local cache for downloaded historical candles
+    "HISTORICAL_CACHE_DIR": os.path.join(".cache", "historical"),
+    # Daily instrument master cache
+    "INSTRUMENTS_CACHE_DIR": os.path.join(".cache", "instruments"),
+}
 
-load_dotenv()
+_ENV_LOADED = []
 
-API_KEY = os.environ.get("API_KEY")
-SECRET_KEY = os.environ.get("SECRET_KEY")
-CLIENT_ID = os.environ.get("CLIENT_ID")
-PASSWORD = os.environ.get("PASSWORD")
-MFA_TOKEN = os.environ.get("MFA_TOKEN")
 
+def load_environment():
+    """Loads .env into os.environ once per process"""
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _ENV_LOADED.append(True)
 
-TOTP = pyotp.TOTP(MFA_TOKEN).now()
 
-# Payloads for POST APIs
-LOGIN_PAYLOAD = {
-    "clientcode": CLIENT_ID,
-    "password": PASSWORD,
-    "totp": TOTP,
-}
+def credential(name):
+    load_environment()
+    return os.environ.get(name)
+
+
+def setting(name):
+    load_environment()
+    return os.environ.get(name, SETTINGS[name])
+
+
+def get_totp():
+    """Current TOTP for MFA_TOKEN, generated fresh for every login"""
+    import pyotp
+    return pyotp.TOTP(credential("MFA_TOKEN")).now()
+
 
+def __getattr__(name):
+    # Lazy module attributes: credentials, settings, and the TOTP / LOGIN_PAYLOAD of the moment
+    if name in CREDENTIALS:
+        return credential(name)
+    if name in SETTINGS:
+        return setting(name)
+    if name == "TOTP":
+        return get_totp()
+    if name == "LOGIN_PAYLOAD":
+        return get_login_payload()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Payloads for POST APIs (the login payload is built per login by get_login_payload)
 PLACE_ORDER_PAYLOAD = {
     "variety": "NORMAL",
     "tradingsymbol": "INFY",          
@@ -104,25 +134,46 @@ UNSUBSCRIBE_ACTION_PAYLOAD = {
 }
 
 
+# Host identity sent with every request; resolved once per process
+_PUBLIC_IP = {}
+
+@lru_cache(maxsize=None)
 def get_local_ip():
     """Get local IP address"""
+    import socket
     hostname = socket.gethostname()
     return socket.gethostbyname(hostname)
 
 def get_public_ip():
     """Get public IP address using external service"""
-    try:
-        return requests.get("https://api64.ipify.org?format=json").json()["ip"]
-    except Exception:
-        return None
-
+    if "ip" not in _PUBLIC_IP:
+        try:
+            import requests
+            _PUBLIC_IP["ip"] = requests.get(PUBLIC_IP_ENDPOINT).json()["ip"]
+        except Exception:
+            return None
+    return _PUBLIC_IP["ip"]
+
+async def get_public_ip_async(session):
+    """Get public IP address on the given aiohttp session without blocking the event loop"""
+    if "ip" not in _PUBLIC_IP:
+        try:
+            async with session.get(PUBLIC_IP_ENDPOINT) as response:
+                _PUBLIC_IP["ip"] = (await response.json())["ip"]
+        except Exception:
+            return None
+    return _PUBLIC_IP["ip"]
+
+@lru_cache(maxsize=None)
 def get_mac_address():
     """Get system MAC address"""
+    import uuid
     mac = uuid.getnode()
     return ':'.join(['{:02x}'.format((mac >> i) & 0xff) for i in range(40, -1, -8)])
 
 
 def generate_token():
+    import requests
     try:
         payload = get_login_payload()
         data = requests.post(AUTHENTICATE, json=payload, headers=get_headers()).json()
@@ -132,6 +183,7 @@ def generate_token():
         print(f"Error Generating Token: {str(e)}")
         
 def generate_tokens():
+    import requests
     try:
         payload = get_login_payload()
         data = requests.post(AUTHENTICATE, json=payload, headers=get_headers()).json()
@@ -143,29 +195,32 @@ def generate_tokens():
 
 def get_login_payload():
     return {
-        "clientcode": CLIENT_ID,
-        "password": PASSWORD,
-        "totp": TOTP
+        "clientcode": credential("CLIENT_ID"),
+        "password": credential("PASSWORD"),
+        "totp": get_totp()
     }
 
 
-def get_headers():
+def get_headers(public_ip=None):
     return {
         "Content-Type": "application/json",
         "Accept": "application/json",
         "X-ClientLocalIP": get_local_ip(),
-        "X-ClientPublicIP": get_public_ip(),
+        "X-ClientPublicIP": get_public_ip() if public_ip is None else public_ip,
         "X-MACAddress": get_mac_address(),
-        "X-PrivateKey": API_KEY,
+        "X-PrivateKey": credential("API_KEY"),
         "X-UserType": "USER",
         "X-SourceID": "WEB",
         "Authorization": ""
     }
 
+async def get_headers_async(session):
+    return get_headers(public_ip=await get_public_ip_async(session) or "")
+
 def get_websocket_headers():
     return {
         "Authorization": "",
-        "x-api-key": API_KEY,
-        "x-client-code": CLIENT_ID,
+        "x-api-key": credential("API_KEY"),
+        "x-client-code": credential("CLIENT_ID"),
         "x-feed-token": ""
     }
@@ -0,0 +1,135 @@
+from collections import namedtuple
+import struct
+
+# Subscription modes as sent in the first byte of every binary frame
+LTP = 1
+QUOTE = 2
+SNAP_QUOTE = 3
+DEPTH = 4
+
+SUBSCRIPTION_MODE_MAP = {
+    LTP: "LTP",
+    QUOTE: "QUOTE",
+    SNAP_QUOTE: "SNAP_QUOTE",
+    DEPTH: "DEPTH"
+}
+
+# Exchange type byte of a frame / subscription and the exchange name the REST APIs use
+EXCHANGE_TYPE_MAP = {
+    1: "NSE",
+    2: "NFO",
+    3: "BSE",
+    4: "BFO",
+    5: "MCX",
+    7: "NCX",
+    13: "CDS"
+}
+
+# Precompiled little-endian layouts, one per subscription mode.
+# Offsets match SmartWebSockets._parse_binary_data byte for byte.
+LTP_LAYOUT = struct.Struct("<BB25sqqq")                          # 0:51
+QUOTE_LAYOUT = struct.Struct("<BB25sqqqqqqddqqqq")               # 0:123
+SNAP_QUOTE_LAYOUT = struct.Struct("<BB25sqqqqqqddqqqqqqq200xqqqq")  # 0:379, best 5 at 147:347
+DEPTH_LAYOUT = struct.Struct("<BB25s8xq")                        # 0:43, depth 20 at 43:443
+BEST_5_LEVEL = struct.Struct("<HqqH")                            # 20 bytes per level
+DEPTH_20_LEVEL = struct.Struct("<iih")                           # 10 bytes per level
+
+LTP_PACKET_SIZE = LTP_LAYOUT.size
+QUOTE_PACKET_SIZE = QUOTE_LAYOUT.size
+SNAP_QUOTE_PACKET_SIZE = SNAP_QUOTE_LAYOUT.size
+DEPTH_PACKET_SIZE = DEPTH_LAYOUT.size + 40 * DEPTH_20_LEVEL.size
+
+BEST_5_OFFSET = 147
+DEPTH_20_OFFSET = 43
+
+
+LtpTick = namedtuple("LtpTick", [
+    "subscription_mode", "exchange_type", "token", "sequence_number",
+    "exchange_timestamp", "last_traded_price"
+])
+
+QuoteTick = namedtuple("QuoteTick", LtpTick._fields + (
+    "last_traded_quantity", "average_traded_price", "volume_trade_for_the_day",
+    "total_buy_quantity", "total_sell_quantity", "open_price_of_the_day",
+    "high_price_of_the_day", "low_price_of_the_day", "closed_price"
+))
+
+SnapQuoteTick = namedtuple("SnapQuoteTick", QuoteTick._fields + (
+    "last_traded_timestamp", "open_interest", "open_interest_change_percentage",
+    "upper_circuit_limit", "lower_circuit_limit", "week_52_high_price", "week_52_low_price",
+    "best_5_buy_data", "best_5_sell_data"
+))
+
+DepthTick = namedtuple("DepthTick", [
+    "subscription_mode", "exchange_type", "token", "exchange_timestamp",
+    "depth_20_buy_data", "depth_20_sell_data"
+])
+
+BestFiveLevel = namedtuple("BestFiveLevel", ["flag", "quantity", "price", "no_of_orders"])
+DepthLevel = namedtuple("DepthLevel", ["quantity", "price", "num_of_orders"])
+
+
+def parse_token(raw):
+    """Decode the NUL padded 25 byte token field"""
+    return raw.partition(b"\x00")[0].decode("ascii")
+
+
+class TickDecoder(object):
+    """
+        Decodes binary frames from the smart-stream feed into namedtuple tick records.
+        Every field is read with Struct.unpack_from on a memoryview of the frame, so the
+        packet is never sliced or copied.
+    """
+
+    def decode(self, binary_data):
+        """Returns a tick record for the frame, or None if the frame is truncated or unknown"""
+        view = memoryview(binary_data)
+        size = len(view)
+        if size < LTP_PACKET_SIZE:
+            return None
+
+        mode = view[0]
+        if mode == SNAP_QUOTE and size >= SNAP_QUOTE_PACKET_SIZE:
+            return self._decode_snap_quote(view)
+        if mode in (QUOTE, SNAP_QUOTE) and size >= QUOTE_PACKET_SIZE:
+            return self._decode_quote(view)
+        if mode == DEPTH:
+            if size >= DEPTH_PACKET_SIZE:
+                return self._decode_depth(view)
+            return None
+        if mode == LTP:
+            return self._decode_ltp(view)
+        return None
+
+    def _decode_ltp(self, view):
+        fields = LTP_LAYOUT.unpack_from(view)
+        return LtpTick(fields[0], fields[1], parse_token(fields[2]), *fields[3:])
+
+    def _decode_quote(self, view):
+        fields = QUOTE_LAYOUT.unpack_from(view)
+        return QuoteTick(fields[0], fields[1], parse_token(fields[2]), *fields[3:])
+
+    def _decode_snap_quote(self, view):
+        fields = SNAP_QUOTE_LAYOUT.unpack_from(view)
+        best_5_buy_data = []
+        best_5_sell_data = []
+        for level in BEST_5_LEVEL.iter_unpack(view[BEST_5_OFFSET:BEST_5_OFFSET + 10 * BEST_5_LEVEL.size]):
+            # Same orientation as _parse_best_5_buy_and_sell_data: flag 0 rows are the sell side
+            if level[0] == 0:
+                best_5_sell_data.append(BestFiveLevel._make(level))
+            else:
+                best_5_buy_data.append(BestFiveLevel._make(level))
+        return SnapQuoteTick(
+            fields[0], fields[1], parse_token(fields[2]), *fields[3:],
+            tuple(best_5_buy_data), tuple(best_5_sell_data)
+        )
+
+    def _decode_depth(self, view):
+        mode, exchange_type, token, exchange_timestamp = DEPTH_LAYOUT.unpack_from(view)
+        levels = DEPTH_20_LEVEL.iter_unpack(view[DEPTH_20_OFFSET:DEPTH_PACKET_SIZE])
+        depth = tuple(map(DepthLevel._make, levels))
+        return DepthTick(mode, exchange_type, parse_token(token), exchange_timestamp, depth[:20], depth[20:])
+
+
+_default_decoder = TickDecoder()
+decode = _default_decoder.decode
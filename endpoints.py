@@ -1,4 +1,7 @@
-ROOT_API_ENDPOINT = "https://apiconnect.angelone.in"
+import os
+
+# Every host can be overridden from the environment, e.g. to point the client at mock_server.py
+ROOT_API_ENDPOINT = os.environ.get("ANGEL_API_ROOT", "https://apiconnect.angelone.in")
 
 # User APIs
 AUTHENTICATE = ROOT_API_ENDPOINT + "/rest/auth/angelbroking/user/v1/loginByPassword"
@@ -21,4 +24,39 @@ GET_GAINERS_LOSERS = ROOT_API_ENDPOINT + "/rest/secure/angelbroking/marketData/v
 GET_HISTORICAL_DATA = ROOT_API_ENDPOINT + "/rest/secure/angelbroking/historical/v1/getCandleData"
 
 # All Instruments JSON
-GET_ALL_INSTRUMENTS_JSON = "https://margincalculator.angelone.in/OpenAPI_File/files/OpenAPIScripMaster.json"
+GET_ALL_INSTRUMENTS_JSON = os.environ.get(
+    "ANGEL_INSTRUMENTS_URL", "https://margincalculator.angelone.in/OpenAPI_File/files/OpenAPIScripMaster.json"
+)
+
+# Smart stream websocket
+SMART_STREAM_URI = os.environ.get("ANGEL_WEBSOCKET_URI", "wss://smartapisocket.angelone.in/smart-stream")
+
+# Public IP lookup used for the X-ClientPublicIP header
+PUBLIC_IP_ENDPOINT = os.environ.get("ANGEL_PUBLIC_IP_URL", "https://api64.ipify.org?format=json")
+
+# Per-endpoint rate limits as (requests per second, burst), applied client side by AngelClient
+RATE_LIMITS = {
+    AUTHENTICATE: (1, 1),
+    GENERATE_TOKEN: (1, 1),
+    GET_PROFILE: (3, 3),
+    PLACE_ORDER: (20, 20),
+    CANCEL_ORDER: (20, 20),
+    GET_ORDER_BOOK: (1, 1),
+    GET_TRADE_BOOK: (1, 1),
+    GET_MARKET_DATA: (10, 10),
+    GET_GAINERS_LOSERS: (1, 1),
+    GET_HISTORICAL_DATA: (3, 3),
+}
+
+# Scheduling priority when requests queue, lower goes first. Unlisted endpoints use DEFAULT_PRIORITY
+ORDER_PRIORITY = 0
+DEFAULT_PRIORITY = 1
+BULK_PRIORITY = 2
+
+REQUEST_PRIORITIES = {
+    PLACE_ORDER: ORDER_PRIORITY,
+    CANCEL_ORDER: ORDER_PRIORITY,
+    GET_MARKET_DATA: BULK_PRIORITY,
+    GET_HISTORICAL_DATA: BULK_PRIORITY,
+    GET_GAINERS_LOSERS: BULK_PRIORITY,
+}
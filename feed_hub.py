@@ -0,0 +1,229 @@
+from multiprocessing import shared_memory
+import asyncio
+import numpy as np
+import decoder
+from market_state import QUOTE_FIELDS, COLUMN, write_book, write_book_batch
+
+DEFAULT_NAME = "angel-feed"
+
+# Shared memory header: magic, capacity, depth levels and the count of records published so far
+HEADER_DTYPE = np.dtype([("magic", "<u8"), ("capacity", "<u8"), ("depth_levels", "<u8"), ("cursor", "<u8")])
+HEADER_SIZE = 64
+MAGIC = 0x414E47454C484231      # "ANGELHB1"
+
+_VALUES_OFFSET = 40
+_DEPTH_LEVELS = COLUMN["depth_levels"]
+_TIMESTAMP = COLUMN["exchange_timestamp"]
+_ZEROS = (0,) * len(QUOTE_FIELDS)
+
+
+def hub_dtype(depth_levels):
+    """
+        Ring record: `seq` (1-based record number, 0 while being written), the token and the
+        market_state.QUOTE_FIELDS as int64 columns, then book[side, level, (quantity, price, orders)]
+    """
+    names = ["seq", "token"] + list(QUOTE_FIELDS) + ["book"]
+    formats = ["<u8", "S25"] + ["<i8"] * len(QUOTE_FIELDS) + [("<i8", (2, depth_levels, 3))]
+    offsets = [0, 8] + [_VALUES_OFFSET + 8 * i for i in range(len(QUOTE_FIELDS))]
+    offsets.append(_VALUES_OFFSET + 8 * len(QUOTE_FIELDS))
+    itemsize = offsets[-1] + 8 * 2 * depth_levels * 3
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": itemsize})
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 an attaching process registers the segment with the resource
+        # tracker, which unlinks it from under the hub when that process exits
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class _Ring(object):
+    def _map(self, capacity, depth_levels):
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.capacity = capacity
+        self.depth_levels = depth_levels
+        self.dtype = hub_dtype(depth_levels)
+        self.records = np.ndarray((capacity,), dtype=self.dtype, buffer=self.shm.buf, offset=HEADER_SIZE)
+
+
+class FeedHub(_Ring):
+    """
+        Single-writer ring buffer of decoded ticks in shared memory. The process that owns the
+        websocket publishes every tick once, e.g. `SmartWebSockets(on_tick=hub.publish)` or
+        `on_batch=hub.publish_batch`, and any number of FeedReader processes on the host read
+        them without their own connection or decoding. Slow readers are lapped, never waited on.
+    """
+    CAPACITY = 1 << 16
+    DEPTH_LEVELS = 5
+
+    def __init__(self, name=DEFAULT_NAME, capacity=CAPACITY, depth_levels=DEPTH_LEVELS):
+        size = HEADER_SIZE + capacity * hub_dtype(depth_levels).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self._map(capacity, depth_levels)
+        self.header["capacity"] = capacity
+        self.header["depth_levels"] = depth_levels
+        self.header["cursor"] = 0
+        self.header["magic"] = MAGIC
+        # Plain ndarray views of the record fields: int64 columns written as one row
+        self.seq = self.records["seq"]
+        self.tokens = self.records["token"]
+        self.values = np.ndarray(
+            (capacity, len(QUOTE_FIELDS)), dtype=np.int64, buffer=self.shm.buf,
+            offset=HEADER_SIZE + _VALUES_OFFSET, strides=(self.dtype.itemsize, 8)
+        )
+        self.book = self.records["book"]
+        self.cursor = 0
+
+    def publish(self, tick):
+        """Writes one decoded tick record"""
+        slot = self.cursor % self.capacity
+        self.seq[slot] = 0
+        self.tokens[slot] = tick.token.encode()
+        mode = tick.subscription_mode
+        if mode == decoder.DEPTH:
+            row = list(_ZEROS)
+            row[0], row[1], row[_TIMESTAMP] = tick.exchange_type, mode, tick.exchange_timestamp
+            row[_DEPTH_LEVELS] = write_book(self.book[slot], tick.depth_20_buy_data, tick.depth_20_sell_data)
+            self.values[slot] = row
+        elif type(tick) is decoder.SnapQuoteTick:
+            levels = write_book(self.book[slot], [level[1:] for level in tick.best_5_buy_data],
+                                [level[1:] for level in tick.best_5_sell_data])
+            self.values[slot] = (tick.exchange_type, mode) + tick[3:22] + (levels,)
+        else:
+            fields = (tick.exchange_type, mode) + tick[3:]
+            self.values[slot] = fields + _ZEROS[len(fields):]
+        self.cursor += 1
+        self.seq[slot] = self.cursor
+        self.header["cursor"] = self.cursor
+
+    def publish_batch(self, mode, ticks):
+        """Writes a batch_decoder structured array with vectorized column writes"""
+        count = len(ticks)
+        if not count:
+            return
+        if count > self.capacity:
+            ticks = ticks[-self.capacity:]
+            self.cursor += count - self.capacity
+            count = self.capacity
+        numbers = np.arange(self.cursor, self.cursor + count, dtype=np.uint64)
+        # Every tick gets its own ring record: count <= capacity, so no slot repeats in `index`
+        index = (numbers % self.capacity).astype(np.int64)
+        self.seq[index] = 0
+        self.tokens[index] = ticks["token"]
+        self.values[index] = 0
+        self.values[index, COLUMN["subscription_mode"]] = mode
+        for field in ticks.dtype.names:
+            column = COLUMN.get(field)
+            if column is not None:
+                self.values[index, column] = ticks[field]
+        if mode in (decoder.SNAP_QUOTE, decoder.DEPTH):
+            self.values[index, _DEPTH_LEVELS] = write_book_batch(self.book, index, mode, ticks)
+        self.cursor += count
+        self.seq[index] = numbers + 1
+        self.header["cursor"] = self.cursor
+
+    def close(self, unlink=True):
+        self.records = self.seq = self.tokens = self.values = self.book = self.header = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class FeedReader(_Ring):
+    """
+        Attaches to a FeedHub by name. `read()` returns new records as a structured array
+        (hub_dtype fields, prices in paise) copied out of shared memory, so a batch stays valid
+        however long it is kept. Records the hub overwrote before or while they were copied are
+        dropped and counted in `lost`. `read_view()` skips the copy and hands out the live ring
+        slice, to be checked with `validate()` once processed.
+    """
+    POLL_INTERVAL = 0.001
+
+    def __init__(self, name=DEFAULT_NAME, tokens=None, from_start=False, poll_interval=POLL_INTERVAL):
+        self.shm = _attach(name)
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if int(header["magic"]) != MAGIC:
+            self.shm.close()
+            raise ValueError(f"Shared memory {name!r} is not a feed hub")
+        self._map(int(header["capacity"]), int(header["depth_levels"]))
+        self.poll_interval = poll_interval
+        self.filters = None
+        if tokens:
+            self.filters = {}
+            for exchange_type, token in tokens:
+                self.filters.setdefault(exchange_type, []).append(str(token).encode())
+        cursor = int(self.header["cursor"])
+        self.next = max(0, cursor - self.capacity) if from_start else cursor
+        self.lost = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            batch = self.read()
+            if len(batch):
+                return batch
+            await asyncio.sleep(self.poll_interval)
+
+    def pending(self):
+        return int(self.header["cursor"]) - self.next
+
+    def _claim(self, max_records):
+        """Ring position, length and first record number of the next batch; skips what was lapped"""
+        cursor = int(self.header["cursor"])
+        if cursor - self.next > self.capacity:
+            self.lost += cursor - self.capacity - self.next
+            self.next = cursor - self.capacity
+        start = self.next % self.capacity
+        count = min(cursor - self.next, self.capacity - start)
+        if max_records is not None:
+            count = min(count, max_records)
+        first = self.next + 1
+        self.next += count
+        return start, count, first
+
+    def read(self, max_records=None):
+        """Records published since the last read, oldest first, copied out; empty when there are none"""
+        start, count, first = self._claim(max_records)
+        batch = self.records[start:start + count].copy()
+        expected = np.arange(first, first + count, dtype=np.uint64)
+        # A record the hub rewrote mid-copy no longer carries its number in the copy or in the ring
+        valid = (batch["seq"] == expected) & (self.records["seq"][start:start + count] == expected)
+        if not valid.all():
+            self.lost += count - int(np.count_nonzero(valid))
+            batch = batch[valid]
+        if self.filters is not None and len(batch):
+            mask = np.zeros(len(batch), dtype=bool)
+            for exchange_type, tokens in self.filters.items():
+                mask |= (batch["exchange_type"] == exchange_type) & np.isin(batch["token"], tokens)
+            batch = batch[mask]
+        return batch
+
+    def read_view(self, max_records=None):
+        """
+            Zero-copy variant of read(): returns (view, first) where view is the live slice of the
+            ring, unfiltered, and first the record number of its first row. The hub may overwrite
+            rows while they are used, so check the results with validate(view, first) afterwards
+        """
+        start, count, first = self._claim(max_records)
+        return self.records[start:start + count], first
+
+    def validate(self, view, first):
+        """Mask of the rows of a read_view() slice the hub has not overwritten yet; others count as lost"""
+        valid = view["seq"] == np.arange(first, first + len(view), dtype=np.uint64)
+        self.lost += len(view) - int(np.count_nonzero(valid))
+        return valid
+
+    def close(self):
+        self.records = self.header = None
+        self.shm.close()
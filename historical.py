@@ -0,0 +1,250 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from endpoints import GET_HISTORICAL_DATA
+
+IST = timezone(timedelta(hours=5, minutes=30))
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+# Longest window in days the candle API serves in one request, per interval
+MAX_DAYS_PER_REQUEST = {
+    "ONE_MINUTE": 30,
+    "THREE_MINUTE": 60,
+    "FIVE_MINUTE": 100,
+    "TEN_MINUTE": 100,
+    "FIFTEEN_MINUTE": 200,
+    "THIRTY_MINUTE": 200,
+    "ONE_HOUR": 400,
+    "ONE_DAY": 2000,
+}
+
+CANDLE_DTYPE = np.dtype([
+    ("timestamp", "<i8"),   # Candle open time, unix seconds
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<i8"),
+])
+
+
+def to_epoch(value):
+    """Accepts unix seconds, a datetime (naive is taken as IST) or a 'YYYY-MM-DD HH:MM' string"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.strptime(value, DATE_FORMAT)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=IST)
+    return int(value.timestamp())
+
+
+def to_api_date(epoch):
+    return datetime.fromtimestamp(epoch, IST).strftime(DATE_FORMAT)
+
+
+def split_range(start, end, interval):
+    """Splits [start, end] (unix seconds) into the largest windows the API allows for `interval`"""
+    step = MAX_DAYS_PER_REQUEST[interval] * 86400
+    windows = []
+    while start < end:
+        windows.append((start, min(start + step, end)))
+        start += step
+    return windows
+
+
+def missing_ranges(coverage, start, end):
+    """Parts of [start, end] not covered by the sorted, merged `coverage` ranges"""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in coverage:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _number(codes, first, last):
+    """Decimal number spelled by character columns first..last of a code point matrix"""
+    value = codes[:, first] - 48
+    for column in range(first + 1, last + 1):
+        value = value * 10 + codes[:, column] - 48
+    return value
+
+
+def parse_timestamps(stamps):
+    """
+        Unix seconds for ISO timestamps. The API's 'YYYY-MM-DDTHH:MM:SS+05:30' form is parsed
+        column-wise from the code points; anything else falls back to datetime.fromisoformat
+    """
+    stamps = np.asarray(stamps, dtype="U")
+    if len(stamps) and stamps.dtype.itemsize == 100 and np.all(np.char.str_len(stamps) == 25):
+        codes = stamps.view(np.uint32).reshape(len(stamps), 25).astype(np.int64)
+        sign = codes[:, 19]
+        digits = codes[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 20, 21, 23, 24]]
+        if (np.all((sign == ord("+")) | (sign == ord("-"))) and np.all((digits >= 48) & (digits <= 57))
+                and np.all(codes[:, [4, 7, 10, 13, 16, 22]] == [ord(c) for c in "--T:::"])):
+            # Days since the epoch from the civil date (proleptic Gregorian), as in datetime
+            year, month, day = _number(codes, 0, 3), _number(codes, 5, 6), _number(codes, 8, 9)
+            year = year - (month <= 2)
+            era = year // 400
+            year_of_era = year - era * 400
+            day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+            day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+            days = era * 146097 + day_of_era - 719468
+            seconds = days * 86400 + _number(codes, 11, 12) * 3600 + _number(codes, 14, 15) * 60 + _number(codes, 17, 18)
+            offsets = _number(codes, 20, 21) * 3600 + _number(codes, 23, 24) * 60
+            return seconds - np.where(sign == ord("-"), -offsets, offsets)
+    return np.array([int(datetime.fromisoformat(stamp).timestamp()) for stamp in stamps.tolist()], dtype=np.int64)
+
+
+def parse_candles(rows):
+    """Converts the API's [timestamp, open, high, low, close, volume] rows to a CANDLE_DTYPE array"""
+    candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    if not len(rows):
+        return candles
+    stamps, *prices, volumes = zip(*rows)
+    candles["timestamp"] = parse_timestamps(stamps)
+    for field, column in zip(("open", "high", "low", "close"), prices):
+        candles[field] = np.array(column, dtype=np.float64)
+    candles["volume"] = np.array(volumes, dtype=np.float64)
+    return candles
+
+
+class CandleStore(object):
+    """
+        On-disk columnar candle cache partitioned as <root>/<interval>/<exchange>_<token>.npy, with
+        the time ranges already fetched kept next to it in a .json file. Reads are memory-mapped.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, exchange, token, interval):
+        return os.path.join(self.root, interval, f"{exchange}_{token}")
+
+    def coverage(self, exchange, token, interval):
+        try:
+            with open(self._path(exchange, token, interval) + ".json") as f:
+                return [tuple(each) for each in json.load(f)["coverage"]]
+        except FileNotFoundError:
+            return []
+
+    def load(self, exchange, token, interval, start=None, end=None):
+        """Memory-mapped candles for one token, optionally restricted to [start, end]"""
+        try:
+            candles = np.load(self._path(exchange, token, interval) + ".npy", mmap_mode="r")
+        except FileNotFoundError:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        if start is None and end is None:
+            return candles
+        timestamps = candles["timestamp"]
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side="left")
+        hi = len(candles) if end is None else np.searchsorted(timestamps, end, side="right")
+        return candles[lo:hi]
+
+    def save(self, exchange, token, interval, candles, fetched_ranges):
+        """Merges new candles and fetched ranges into the partition, replacing the files atomically"""
+        path = self._path(exchange, token, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        existing = np.array(self.load(exchange, token, interval))
+        merged = np.concatenate([existing, candles]) if len(existing) else candles
+        # Keep one row per timestamp, newest fetch wins, sorted by time
+        order = np.argsort(merged["timestamp"][::-1], kind="stable")
+        merged = merged[::-1][order]
+        _, first = np.unique(merged["timestamp"], return_index=True)
+        merged = merged[first]
+
+        with open(path + ".tmp.npy", "wb") as f:
+            np.save(f, merged)
+        os.replace(path + ".tmp.npy", path + ".npy")
+
+        coverage = merge_ranges(self.coverage(exchange, token, interval) + list(fetched_ranges))
+        with open(path + ".tmp.json", "w") as f:
+            json.dump({"coverage": coverage}, f)
+        os.replace(path + ".tmp.json", path + ".json")
+
+
+class HistoricalDownloader(object):
+    """
+        Bulk candle backfill over GET_HISTORICAL_DATA. Long ranges are split into the largest
+        windows each interval allows, only gaps missing from the CandleStore are requested, and
+        many tokens download concurrently under the client's rate limiter.
+    """
+
+    def __init__(self, client, store, max_concurrency=10):
+        self.client = client
+        self.store = store
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.locks = {}
+
+    async def _fetch_window(self, exchange, token, interval, start, end):
+        payload = {
+            "exchange": exchange,
+            "symboltoken": token,
+            "interval": interval,
+            "fromdate": to_api_date(start),
+            "todate": to_api_date(end),
+        }
+        async with self.semaphore:
+            data = await self.client.post(GET_HISTORICAL_DATA, payload)
+        if not data or not data.get("status"):
+            print(f"Error fetching candles for {exchange}:{token} {payload['fromdate']} - {payload['todate']}: "
+                  f"{data.get('message') if data else 'no response'}")
+            return None
+        return parse_candles(data.get("data") or [])
+
+    async def fetch(self, exchange, token, interval, fromdate, todate):
+        """Returns candles for one token over the range, downloading only what the cache lacks"""
+        start, end = to_epoch(fromdate), to_epoch(todate)
+        key = (exchange, token, interval)
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        loop = asyncio.get_running_loop()
+        async with lock:
+            # Ranges reaching into the future stay open so later calls pick up new candles
+            covered_until = min(end, int(time.time()))
+            coverage = await loop.run_in_executor(None, self.store.coverage, exchange, token, interval)
+            gaps = missing_ranges(coverage, start, end)
+            windows = [window for gap in gaps for window in split_range(gap[0], gap[1], interval)]
+            if windows:
+                results = await asyncio.gather(*[
+                    self._fetch_window(exchange, token, interval, window_start, window_end)
+                    for window_start, window_end in windows
+                ])
+                fetched = [(s, min(e, covered_until)) for (s, e), result in zip(windows, results)
+                           if result is not None and s < covered_until]
+                candles = [result for result in results if result is not None]
+                if candles or fetched:
+                    merged = np.concatenate(candles) if candles else np.empty(0, dtype=CANDLE_DTYPE)
+                    # File I/O runs on the default executor so bulk backfills don't stall the loop
+                    await loop.run_in_executor(None, self.store.save, exchange, token, interval, merged, fetched)
+        return await loop.run_in_executor(None, self.store.load, exchange, token, interval, start, end)
+
+    async def fetch_many(self, instruments, interval, fromdate, todate):
+        """
+            Backfills many (exchange, token) pairs concurrently.
+            Returns a dict of (exchange, token) -> candle array
+        """
+        results = await asyncio.gather(*[
+            self.fetch(exchange, token, interval, fromdate, todate) for exchange, token in instruments
+        ])
+        return dict(zip(instruments, results))
@@ -0,0 +1,230 @@
+from datetime import datetime
+import asyncio
+import glob
+import json
+import os
+import numpy as np
+from endpoints import GET_ALL_INSTRUMENTS_JSON
+from historical import IST
+
+INSTRUMENT_DTYPE = np.dtype([
+    ("token", "S16"),
+    ("symbol", "S48"),
+    ("name", "S32"),
+    ("exch_seg", "S8"),
+    ("instrumenttype", "S8"),
+    ("option_type", "S2"),          # CE / PE for options, empty otherwise
+    ("expiry", "datetime64[D]"),    # NaT when the instrument does not expire
+    ("strike", "<f8"),              # Rupees; the scrip master quotes strikes x100
+    ("lotsize", "<i4"),
+    ("tick_size", "<f8"),             # Paise, as quoted in the scrip master
+])
+
+
+def iter_json_array(f, chunk_size=1 << 20):
+    """Yields the objects of a top level JSON array one at a time without loading the whole document"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+                break
+            yield item
+        buffer = buffer[position:]
+        chunk = f.read(chunk_size)
+        if not chunk:
+            if eof or not buffer.strip():
+                return
+            eof = True
+        buffer += chunk
+
+
+def _text(value, size):
+    """UTF-8 bytes for an S`size` column, cut at a character boundary so names outside ASCII survive"""
+    data = value.encode("utf-8", "replace")
+    if len(data) > size:
+        data = data[:size].decode("utf-8", "ignore").encode("utf-8")
+    return data
+
+
+def _parse_expiry(value):
+    if not value:
+        return np.datetime64("NaT", "D")
+    return np.datetime64(datetime.strptime(value, "%d%b%Y").date(), "D")
+
+
+def build_instruments(items):
+    """Packs scrip master entries into an INSTRUMENT_DTYPE array sorted by exchange, name, expiry and strike"""
+    rows = []
+    for item in items:
+        symbol = item.get("symbol", "")
+        option_type = symbol[-2:] if item.get("instrumenttype", "").startswith("OPT") else ""
+        strike = float(item.get("strike") or -1)
+        rows.append((
+            _text(item.get("token", ""), 16),
+            _text(symbol, 48),
+            _text(item.get("name", ""), 32),
+            _text(item.get("exch_seg", ""), 8),
+            _text(item.get("instrumenttype", ""), 8),
+            _text(option_type, 2),
+            _parse_expiry(item.get("expiry")),
+            strike / 100 if strike > 0 else strike,
+            int(float(item.get("lotsize") or 0)),
+            float(item.get("tick_size") or 0),
+        ))
+    instruments = np.array(rows, dtype=INSTRUMENT_DTYPE)
+    order = np.lexsort((
+        instruments["option_type"], instruments["strike"], instruments["expiry"],
+        instruments["name"], instruments["exch_seg"]
+    ))
+    return instruments[order]
+
+
+class InstrumentMaster(object):
+    """
+        Array-backed view of the OpenAPIScripMaster. The array lives in a memory-mapped .npy file
+        sorted by (exchange, name, expiry, strike), so an option chain is one contiguous slice.
+        Token and symbol indexes are built on first use and give O(1) lookups.
+    """
+
+    def __init__(self, instruments):
+        self.instruments = instruments
+        self._token_index = None
+        self._symbol_index = None
+        self._group_index = None
+
+    def __len__(self):
+        return len(self.instruments)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(np.load(path, mmap_mode="r"))
+
+    def _build_indexes(self):
+        exchanges = self.instruments["exch_seg"].tolist()
+        self._token_index = {}
+        for row, (exchange, token) in enumerate(zip(exchanges, self.instruments["token"].tolist())):
+            self._token_index.setdefault(token, row)
+            self._token_index[(exchange, token)] = row
+        self._symbol_index = dict(zip(zip(exchanges, self.instruments["symbol"].tolist()), range(len(self.instruments))))
+
+    def _build_group_index(self):
+        # Start and end row of every (exchange, name, expiry) run in the sorted array
+        keys = list(zip(
+            self.instruments["exch_seg"].tolist(), self.instruments["name"].tolist(),
+            self.instruments["expiry"].astype("i8").tolist()
+        ))
+        self._group_index = {}
+        for row, key in enumerate(keys):
+            if key in self._group_index:
+                self._group_index[key][1] = row + 1
+            else:
+                self._group_index[key] = [row, row + 1]
+
+    def get(self, token, exchange=None):
+        """Instrument row for a symbol token, or None"""
+        if self._token_index is None:
+            self._build_indexes()
+        key = str(token).encode()
+        row = self._token_index.get((exchange.encode(), key) if exchange else key)
+        return None if row is None else self.instruments[row]
+
+    def find(self, exchange, tradingsymbol):
+        """Instrument row for an (exchange, tradingsymbol) pair, or None"""
+        if self._symbol_index is None:
+            self._build_indexes()
+        row = self._symbol_index.get((exchange.encode(), tradingsymbol.encode()))
+        return None if row is None else self.instruments[row]
+
+    def expiries(self, name, exchange="NFO"):
+        """Sorted expiries listed for an underlying"""
+        if self._group_index is None:
+            self._build_group_index()
+        exchange, name = exchange.encode(), name.encode()
+        return sorted(
+            np.datetime64(expiry, "D") for each_exchange, each_name, expiry in self._group_index
+            if each_exchange == exchange and each_name == name and expiry != np.iinfo("i8").min
+        )
+
+    def options(self, name, expiry, exchange="NFO", option_type=None):
+        """Every option for an underlying and expiry, sorted by strike then CE/PE"""
+        if self._group_index is None:
+            self._build_group_index()
+        key = (exchange.encode(), name.encode(), int(np.datetime64(expiry, "D").astype("i8")))
+        bounds = self._group_index.get(key)
+        if bounds is None:
+            return self.instruments[:0]
+        chain = self.instruments[bounds[0]:bounds[1]]
+        if option_type:
+            return chain[chain["option_type"] == option_type.encode()]
+        return chain[chain["option_type"] != b""]
+
+
+class InstrumentLoader(object):
+    """
+        Downloads the scrip master at most once a day, streams it into an InstrumentMaster
+        array and caches that as <cache_dir>/instruments-YYYYMMDD.npy for later starts.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, day):
+        return os.path.join(self.cache_dir, f"instruments-{day}.npy")
+
+    def cached(self):
+        """Today's cached master, or None"""
+        path = self._path(datetime.now(IST).strftime("%Y%m%d"))
+        return InstrumentMaster.from_file(path) if os.path.exists(path) else None
+
+    async def load(self, session, force=False):
+        master = None if force else self.cached()
+        if master is not None:
+            return master
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        day = datetime.now(IST).strftime("%Y%m%d")
+        raw_path = os.path.join(self.cache_dir, "OpenAPIScripMaster.json")
+        loop = asyncio.get_running_loop()
+        # File writes and parsing go to the default executor, keeping the event loop free
+        async with session.get(GET_ALL_INSTRUMENTS_JSON) as response:
+            response.raise_for_status()
+            f = await loop.run_in_executor(None, open, raw_path + ".tmp", "wb")
+            try:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    await loop.run_in_executor(None, f.write, chunk)
+            finally:
+                await loop.run_in_executor(None, f.close)
+        os.replace(raw_path + ".tmp", raw_path)
+
+        # Parsing takes a few seconds once a day
+        path = self._path(day)
+        await loop.run_in_executor(None, self._build, raw_path, path)
+        for old in glob.glob(os.path.join(self.cache_dir, "instruments-*.npy")):
+            if old != path:
+                os.remove(old)
+        return InstrumentMaster.from_file(path)
+
+    def _build(self, raw_path, path):
+        with open(raw_path, encoding="utf-8") as f:
+            instruments = build_instruments(iter_json_array(f))
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, instruments)
+        os.replace(path + ".tmp", path)
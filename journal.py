@@ -0,0 +1,257 @@
+from array import array
+import asyncio
+import glob
+import heapq
+import inspect
+import json
+import mmap
+import os
+import struct
+import time
+from decoder import parse_token
+
+# Every record is a header followed by the raw frame: receive time in ns since the epoch, frame length
+RECORD_HEADER = struct.Struct("<qI")
+TOKEN_SLICE = slice(1, 27)      # exchange type byte + 25 byte token of a binary frame
+INDEX_VERSION = 2               # Sidecar indexes list every record offset per token
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, f"journal-{number:06d}.bin")
+
+
+def _token_key(exchange_type, token):
+    return f"{exchange_type}:{token}"
+
+
+class JournalWriter(object):
+    """
+        Append-only journal of raw feed frames with their receive time. Frames are copied into
+        preallocated memory-mapped segments of `segment_size` bytes with no decoding; each segment
+        gets a sidecar .json index of the offset of every record per token and of offsets by time.
+        A writer never reopens old segments, so an existing journal directory is extended.
+    """
+    SEGMENT_SIZE = 64 << 20
+    INDEX_INTERVAL = 1.0    # Seconds between time index entries
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, index_interval=INDEX_INTERVAL):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.index_interval_ns = int(index_interval * 1e9)
+        os.makedirs(directory, exist_ok=True)
+        existing = sorted(glob.glob(os.path.join(directory, "journal-*.bin")))
+        self.segment_number = int(os.path.basename(existing[-1])[8:14]) + 1 if existing else 0
+        self.file = None
+        self.buffer = None
+        self.position = 0
+        self.records = 0
+        self.dropped = 0
+
+    def _open_segment(self):
+        self.file = open(_segment_path(self.directory, self.segment_number), "w+b")
+        self.file.truncate(self.segment_size)
+        self.buffer = mmap.mmap(self.file.fileno(), self.segment_size)
+        self.position = 0
+        self.tokens = {}        # (exchange_type, raw token) -> array of record offsets
+        self.times = []         # [received_ns, offset] every index_interval
+        self.first_ns = None
+        self.last_ns = None
+        self.next_time_entry = 0
+
+    def append(self, frame, received_ns=None):
+        """Records one raw frame; cheap enough to call for every frame in the read loop"""
+        if received_ns is None:
+            received_ns = time.time_ns()
+        size = RECORD_HEADER.size + len(frame)
+        if self.buffer is None or self.position + size > self.segment_size:
+            if size > self.segment_size:
+                self.dropped += 1
+                return
+            self._close_segment()
+            self._open_segment()
+        position = self.position
+        RECORD_HEADER.pack_into(self.buffer, position, received_ns, len(frame))
+        self.buffer[position + RECORD_HEADER.size:position + size] = frame
+        self.position = position + size
+        self.records += 1
+
+        key = frame[TOKEN_SLICE]
+        offsets = self.tokens.get(key)
+        if offsets is None:
+            offsets = self.tokens[key] = array("q")
+        offsets.append(position)
+        if received_ns >= self.next_time_entry:
+            self.times.append([received_ns, position])
+            self.next_time_entry = received_ns + self.index_interval_ns
+            if self.first_ns is None:
+                self.first_ns = received_ns
+        self.last_ns = received_ns
+
+    def flush(self):
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def _close_segment(self):
+        if self.buffer is None:
+            return
+        self.buffer.flush()
+        self.buffer.close()
+        self.file.truncate(self.position)
+        self.file.close()
+        index = {
+            "version": INDEX_VERSION,
+            "records": sum(len(offsets) for offsets in self.tokens.values()),
+            "first_ns": self.first_ns,
+            "last_ns": self.last_ns,
+            "tokens": {
+                _token_key(key[0], parse_token(key[1:])): offsets.tolist()
+                for key, offsets in self.tokens.items() if len(key) == 26
+            },
+            "times": self.times,
+        }
+        path = _segment_path(self.directory, self.segment_number)[:-4] + ".json"
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+        self.buffer = None
+        self.file = None
+        self.segment_number += 1
+
+    def close(self):
+        self._close_segment()
+
+
+class JournalReader(object):
+    """Reads frames back from a journal directory in recording order, using the segment indexes to seek"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "journal-*.bin")))
+
+    def index(self, segment):
+        """The segment's index, or None for a segment whose writer did not close it or an older index format"""
+        try:
+            with open(segment[:-4] + ".json") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        return index if index.get("version") == INDEX_VERSION else None
+
+    def _start_offset(self, index, start_ns):
+        offset = 0
+        if start_ns is not None:
+            if index["last_ns"] is not None and index["last_ns"] < start_ns:
+                return None
+            for received_ns, position in index["times"]:
+                if received_ns > start_ns:
+                    break
+                offset = max(offset, position)
+        return offset
+
+    def frames(self, tokens=None, start=None, end=None):
+        """
+            Yields (received_ns, frame) in recording order. `tokens` limits replay to (exchange_type, token)
+            pairs, `start` / `end` to a receive time window in unix seconds
+        """
+        keys = None if tokens is None else {_token_key(exchange_type, token) for exchange_type, token in tokens}
+        raw_keys = None if tokens is None else {
+            bytes([exchange_type]) + str(token).encode().ljust(25, b"\x00") for exchange_type, token in tokens
+        }
+        start_ns = None if start is None else int(start * 1e9)
+        end_ns = None if end is None else int(end * 1e9)
+
+        for segment in self.segments():
+            index = self.index(segment)
+            offset = 0
+            positions = None        # Record offsets of the selected tokens, None to scan every record
+            if index is not None:
+                offset = self._start_offset(index, start_ns)
+                if offset is None:
+                    continue
+                if keys is not None:
+                    selected = [index["tokens"][key] for key in keys if key in index["tokens"]]
+                    if not selected:
+                        continue
+                    positions = heapq.merge(*selected) if len(selected) > 1 else iter(selected[0])
+            with open(segment, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    if positions is None:
+                        records = self._scan(buffer, size, offset)
+                    else:
+                        records = self._seek(buffer, positions, offset)
+                    for received_ns, frame_start, frame_end in records:
+                        if end_ns is not None and received_ns > end_ns:
+                            return
+                        if start_ns is not None and received_ns < start_ns:
+                            continue
+                        if raw_keys is not None and buffer[frame_start + 1:frame_start + 27] not in raw_keys:
+                            continue
+                        yield received_ns, buffer[frame_start:frame_end]
+
+    @staticmethod
+    def _scan(buffer, size, offset):
+        while offset + RECORD_HEADER.size <= size:
+            received_ns, length = RECORD_HEADER.unpack_from(buffer, offset)
+            if not length:
+                break   # Zero filled tail of a segment that was never closed
+            frame_start = offset + RECORD_HEADER.size
+            offset = frame_start + length
+            yield received_ns, frame_start, offset
+
+    @staticmethod
+    def _seek(buffer, positions, offset):
+        # Jumps straight to the indexed records of the selected tokens
+        for position in positions:
+            if position < offset:
+                continue
+            received_ns, length = RECORD_HEADER.unpack_from(buffer, position)
+            frame_start = position + RECORD_HEADER.size
+            yield received_ns, frame_start, frame_start + length
+
+
+class JournalReplayer(object):
+    """
+        Feeds a journal back into a consumer with the recorded inter-frame timing scaled by `speed`
+        (1 is original speed, 10 is ten times faster), or as fast as possible with speed=None.
+        The consumer is a SmartWebSockets instance, which receives every frame through the same
+        path as live data (on_tick, queue, batches, market state), or any callable taking the raw
+        frame, e.g. `ws._parse_binary_data`; coroutine functions are awaited.
+    """
+    YIELD_EVERY = 1000      # Frames between event loop yields when replaying flat out
+
+    def __init__(self, directory, speed=1.0, tokens=None, start=None, end=None):
+        self.reader = JournalReader(directory)
+        self.speed = speed
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+
+    async def run(self, consumer):
+        """Replays every selected frame; returns the number of frames delivered"""
+        if hasattr(consumer, "_on_message"):
+            consumer = consumer._on_message
+        is_async = inspect.iscoroutinefunction(consumer)
+        loop = asyncio.get_running_loop()
+        first_ns = None
+        started = loop.time()
+        count = 0
+        for received_ns, frame in self.reader.frames(self.tokens, self.start, self.end):
+            if self.speed:
+                if first_ns is None:
+                    first_ns = received_ns
+                delay = started + (received_ns - first_ns) / 1e9 / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif count % self.YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+            if is_async:
+                await consumer(frame)
+            else:
+                consumer(frame)
+            count += 1
+        return count
@@ -1,6 +1,5 @@
 from SmartAPI import AngelAPIWrapper
 from SmartWebSockets import SmartWebSockets
-from config import CLIENT_ID, PASSWORD, TOTP
 import asyncio
 
 
@@ -16,6 +15,8 @@ async def main():
         print("Profile:", profile)
     except Exception as e:
         print(f"Error occurred: {e}")
+    finally:
+        await api.close()
     
     # api = SmartWebSockets()
     
@@ -23,8 +24,8 @@ async def main():
     #     result = await api.connect()
     #     print(result)
         
-    #     while True:
-    #         await asyncio.sleep(1)
+    #     async for tick in api:
+    #         print(tick)
             
     # except Exception as e:
     #     print("Something went wrong:", e)
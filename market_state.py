@@ -0,0 +1,222 @@
+from collections import namedtuple
+from itertools import chain
+import numpy as np
+import decoder
+
+# Columns of the latest-quote matrix. Prices are in paise as sent by the feed and the
+# total buy / sell quantities are stored as whole numbers.
+QUOTE_FIELDS = (
+    "exchange_type", "subscription_mode", "sequence_number", "exchange_timestamp",
+    "last_traded_price", "last_traded_quantity", "average_traded_price", "volume_trade_for_the_day",
+    "total_buy_quantity", "total_sell_quantity", "open_price_of_the_day", "high_price_of_the_day",
+    "low_price_of_the_day", "closed_price", "last_traded_timestamp", "open_interest",
+    "open_interest_change_percentage", "upper_circuit_limit", "lower_circuit_limit",
+    "week_52_high_price", "week_52_low_price", "depth_levels",
+)
+COLUMN = {field: index for index, field in enumerate(QUOTE_FIELDS)}
+
+QuoteState = namedtuple("QuoteState", ("token",) + QUOTE_FIELDS)
+
+# Order book layout: book[slot, side, level, column]
+BID, ASK = 0, 1
+QUANTITY, PRICE, ORDERS = 0, 1, 2
+
+_MODE = COLUMN["subscription_mode"]
+_LTP_END = COLUMN["last_traded_price"] + 1
+_QUOTE_END = COLUMN["closed_price"] + 1
+_SNAP_END = COLUMN["week_52_low_price"] + 1
+_DEPTH_LEVELS = COLUMN["depth_levels"]
+_TIMESTAMP = COLUMN["exchange_timestamp"]
+
+
+def write_book(book, bids, asks):
+    """
+        Writes (quantity, price, orders) rows, best first, into one instrument's
+        book[side, level, column] block. Returns the number of levels written
+    """
+    levels = min(max(len(bids), len(asks)), book.shape[1])
+    book[:, :levels] = 0
+    for side, rows in ((BID, bids), (ASK, asks)):
+        count = min(len(rows), levels)
+        if count:
+            # One flat write per side is far cheaper than converting nested tuples
+            book[side, :count].reshape(-1)[:] = np.fromiter(
+                chain.from_iterable(rows[:count]), dtype=np.int64, count=count * 3
+            )
+    return levels
+
+
+def write_book_batch(book, index, mode, ticks):
+    """
+        Vectorized write of the book levels of a batch_decoder SNAP_QUOTE or DEPTH array into
+        book[index]. `index` must not repeat (see last_per_slot). Returns the number of levels
+        written per row
+    """
+    depth_levels = book.shape[2]
+    if mode == decoder.DEPTH:
+        levels = min(20, depth_levels)
+        for side, field in ((BID, "depth_20_buy_data"), (ASK, "depth_20_sell_data")):
+            data = ticks[field][:, :levels]
+            book[index, side, :levels, QUANTITY] = data["quantity"]
+            book[index, side, :levels, PRICE] = data["price"]
+            book[index, side, :levels, ORDERS] = data["num_of_orders"]
+        return levels
+
+    # Stable sort puts each row's buy levels (non-zero flag, as in the tick decoder) first
+    data = ticks["best_5_data"]
+    is_sell = data["flag"] == 0
+    ordered = np.take_along_axis(data, np.argsort(is_sell, axis=1, kind="stable"), axis=1)
+    buys = (~is_sell).sum(axis=1)
+    sells = is_sell.sum(axis=1)
+    width = min(5, depth_levels)
+    positions = np.arange(width)
+    for side, start, count in ((BID, np.zeros_like(buys), buys), (ASK, buys, sells)):
+        rows = np.take_along_axis(ordered, np.minimum(start[:, None] + positions, data.shape[1] - 1), axis=1)
+        valid = positions < count[:, None]
+        book[index, side, :width, QUANTITY] = np.where(valid, rows["quantity"], 0)
+        book[index, side, :width, PRICE] = np.where(valid, rows["price"], 0)
+        book[index, side, :width, ORDERS] = np.where(valid, rows["no_of_orders"], 0)
+    return width
+
+
+def last_per_slot(index):
+    """
+        Positions of the last occurrence of every distinct value of `index`, in slot order.
+        NumPy leaves it unspecified which row wins an advanced assignment with repeated
+        indices, so batches are reduced to the newest tick per slot before writing
+    """
+    _, first_from_end = np.unique(index[::-1], return_index=True)
+    return len(index) - 1 - first_from_end
+
+
+class MarketState(object):
+    """
+        Shared latest-quote and order-book cache keyed by (exchange_type, token), updated in
+        place from decoded ticks into preallocated NumPy arrays. Lookups are O(1) through a
+        slot index. Each row carries a version counter that is odd while a write is in
+        progress, so readers on other threads take seqlock-style consistent snapshots
+        without locking the feed.
+    """
+
+    def __init__(self, capacity=4096, depth_levels=20):
+        self.depth_levels = depth_levels
+        self.slots = {}
+        self.tokens = []
+        self.versions = []
+        self.values = np.zeros((capacity, len(QUOTE_FIELDS)), dtype=np.int64)
+        self.book = np.zeros((capacity, 2, depth_levels, 3), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def slot(self, exchange_type, token):
+        """Row index for an instrument, allocating one on first sight"""
+        key = (exchange_type, token)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.tokens)
+            if slot >= len(self.values):
+                # Double the preallocated arrays; existing slots keep their index
+                self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+                self.book = np.concatenate([self.book, np.zeros_like(self.book)])
+            self.values[slot, 0] = exchange_type
+            self.tokens.append(key)
+            self.versions.append(0)
+            self.slots[key] = slot
+        return slot
+
+    def update(self, tick):
+        """Applies one decoded tick record in place"""
+        slot = self.slots.get((tick.exchange_type, tick.token))
+        if slot is None:
+            slot = self.slot(tick.exchange_type, tick.token)
+        mode = tick.subscription_mode
+        values = self.values
+        self.versions[slot] += 1
+        try:
+            if mode == decoder.DEPTH:
+                values[slot, _MODE] = mode
+                values[slot, _TIMESTAMP] = tick.exchange_timestamp
+                self._write_book(slot, tick.depth_20_buy_data, tick.depth_20_sell_data)
+            elif type(tick) is decoder.SnapQuoteTick:
+                values[slot, _MODE:_SNAP_END] = (mode,) + tick[3:22]
+                # Best five levels carry a leading flag; the book keeps (quantity, price, orders)
+                self._write_book(slot, [level[1:] for level in tick.best_5_buy_data],
+                                 [level[1:] for level in tick.best_5_sell_data])
+            elif type(tick) is decoder.QuoteTick:
+                values[slot, _MODE:_QUOTE_END] = (mode,) + tick[3:]
+            else:
+                values[slot, _MODE:_LTP_END] = (mode,) + tick[3:]
+        finally:
+            self.versions[slot] += 1
+
+    def _write_book(self, slot, bids, asks):
+        self.values[slot, _DEPTH_LEVELS] = write_book(self.book[slot], bids, asks)
+
+    def update_batch(self, mode, ticks):
+        """Applies a structured array from batch_decoder with one vectorized write per column"""
+        if not len(ticks):
+            return
+        exchange_types = ticks["exchange_type"].tolist()
+        tokens = [token.decode("ascii") for token in ticks["token"].tolist()]
+        slots = [self.slots.get(key) for key in zip(exchange_types, tokens)]
+        if None in slots:
+            slots = [self.slot(exchange_type, token) for exchange_type, token in zip(exchange_types, tokens)]
+        index = np.array(slots, dtype=np.int64)
+        if len(set(slots)) < len(slots):
+            keep = last_per_slot(index)
+            index = index[keep]
+            ticks = ticks[keep]
+            slots = index.tolist()
+        versions = self.versions
+        for slot in slots:
+            versions[slot] += 1
+        values = self.values
+        try:
+            values[index, _MODE] = mode
+            for field in ticks.dtype.names:
+                column = COLUMN.get(field)
+                if column is not None and column > _MODE:
+                    values[index, column] = ticks[field]
+            if mode in (decoder.SNAP_QUOTE, decoder.DEPTH):
+                values[index, _DEPTH_LEVELS] = write_book_batch(self.book, index, mode, ticks)
+        finally:
+            for slot in slots:
+                versions[slot] += 1
+
+    def ltp(self, exchange_type, token):
+        """Last traded price in paise, or None if the instrument has not ticked"""
+        slot = self.slots.get((exchange_type, token))
+        return None if slot is None else int(self.values[slot, COLUMN["last_traded_price"]])
+
+    def get(self, exchange_type, token):
+        """Consistent QuoteState snapshot of the latest quote, or None"""
+        slot = self.slots.get((exchange_type, token))
+        if slot is None:
+            return None
+        versions = self.versions
+        while True:
+            version = versions[slot]
+            row = self.values[slot].tolist()
+            if version % 2 == 0 and versions[slot] == version:
+                return QuoteState(token, *row)
+
+    def depth(self, exchange_type, token):
+        """
+            Consistent copy of the book as (bids, asks), each an array of (quantity, price, orders)
+            rows, best level first. Returns None if the instrument has not ticked
+        """
+        slot = self.slots.get((exchange_type, token))
+        if slot is None:
+            return None
+        versions = self.versions
+        while True:
+            version = versions[slot]
+            levels = int(self.values[slot, _DEPTH_LEVELS])
+            bids = self.book[slot, BID, :levels].copy()
+            asks = self.book[slot, ASK, :levels].copy()
+            if version % 2 == 0 and versions[slot] == version:
+                return bids, asks
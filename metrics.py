@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+SUB_BUCKET_BITS = 4                     # 16 sub-buckets per power of two: values kept within ~6%
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_LINEAR_LIMIT = 2 * _SUB_BUCKETS
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(value):
+    """Log-linear bucket of a non-negative integer, as in HdrHistogram"""
+    if value < _LINEAR_LIMIT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * _SUB_BUCKETS + (value >> shift)
+
+
+def bucket_upper_bound(index):
+    """Largest value that falls into bucket `index`"""
+    if index < _LINEAR_LIMIT:
+        return index
+    shift = index // _SUB_BUCKETS - 1
+    return ((index - shift * _SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram(object):
+    """
+        Fixed-precision histogram of durations in nanoseconds. Recording is one bucket
+        increment, memory is bounded by the largest value, and quantiles are read back to
+        within the bucket width.
+    """
+    __slots__ = ("name", "labels", "counts", "count", "total", "max")
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.counts = [0] * 512
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, nanoseconds):
+        if nanoseconds < 0:
+            nanoseconds = 0
+        index = bucket_index(nanoseconds)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    def quantile(self, q):
+        """Value at quantile `q` in nanoseconds"""
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = self.total = self.max = 0
+
+
+class Counter(object):
+    __slots__ = ("name", "labels", "value")
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+def _label_text(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def endpoint_label(url):
+    """Last path segment of an endpoint URL, e.g. placeOrder"""
+    return url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+
+
+class Metrics(object):
+    """
+        Registry of histograms and counters for the hot paths. Instrumented code checks
+        `METRICS.enabled` before taking any timestamp, so switched off it costs one attribute
+        read per call site. Exported as Prometheus text (`render()` or `serve()`) and as JSON
+        lines (`log_loop()`).
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}    # (name, labels) -> Histogram
+        self.counters = {}      # (name, labels) -> Counter
+        self.help = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def histogram(self, name, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(name, key[1])
+            self.help.setdefault(name, help)
+        return histogram
+
+    def counter(self, name, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = Counter(name, key[1])
+            self.help.setdefault(name, help)
+        return counter
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        for counter in self.counters.values():
+            counter.value = 0
+
+    def render(self):
+        """Prometheus text exposition: histograms as summaries in seconds, counters as totals"""
+        lines = []
+        described = set()
+        for histogram in sorted(self.histograms.values(), key=lambda each: (each.name, each.labels)):
+            name = histogram.name
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} summary")
+            for q in QUANTILES:
+                lines.append(f"{name}{_label_text(histogram.labels, [('quantile', q)])} {histogram.quantile(q) / 1e9:.9f}")
+            lines.append(f"{name}_sum{_label_text(histogram.labels)} {histogram.total / 1e9:.9f}")
+            lines.append(f"{name}_count{_label_text(histogram.labels)} {histogram.count}")
+        for counter in sorted(self.counters.values(), key=lambda each: (each.name, each.labels)):
+            name = counter.name
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_label_text(counter.labels)} {counter.value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Plain dict of every metric: latency quantiles in milliseconds, counters as values"""
+        snapshot = {}
+        for histogram in self.histograms.values():
+            key = histogram.name + _label_text(histogram.labels)
+            snapshot[key] = {
+                "count": histogram.count,
+                **{f"p{q * 100:g}_ms": histogram.quantile(q) / 1e6 for q in QUANTILES},
+                "max_ms": histogram.max / 1e6,
+            }
+        for counter in self.counters.values():
+            snapshot[counter.name + _label_text(counter.labels)] = counter.value
+        return snapshot
+
+    async def serve(self, host="127.0.0.1", port=9464):
+        """Serves `render()` at http://host:port/metrics; returns the aiohttp runner to clean up"""
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def log_loop(self, interval=60, stream=None):
+        """Writes a JSON line with a timestamp and `snapshot()` every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps({"ts": time.time(), "metrics": self.snapshot()}), file=stream or sys.stdout, flush=True)
+
+
+# Process-wide registry used by AngelClient, SmartWebSockets and TickQueue; ANGEL_METRICS=1 turns it on
+METRICS = Metrics(enabled=os.environ.get("ANGEL_METRICS") == "1")
@@ -0,0 +1,448 @@
+"""
+    Local stand-in for the Angel One REST APIs and smart-stream websocket, for development,
+    tests and benchmarks without credentials or network access.
+
+    Usage: python mock_server.py [--port 8765] [--latency 0.002] [--rate 10]
+    then export the printed ANGEL_* variables before starting the client.
+"""
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import socket
+import time
+from aiohttp import web
+import aiohttp
+import decoder
+
+# endpoints.py is imported only when the app is built, so a process can start the mock and
+# export its env() before anything reads the ANGEL_* overrides
+IST = timezone(timedelta(hours=5, minutes=30))
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+INSTRUMENTS_PATH = "/OpenAPI_File/files/OpenAPIScripMaster.json"
+PUBLIC_IP_PATH = "/ip"
+SMART_STREAM_PATH = "/smart-stream"
+
+
+# Binary frames in the exact layouts of the smart-stream feed
+def _token(token):
+    return token.encode("ascii").ljust(25, b"\x00")
+
+
+def ltp_frame(token="10626", exchange_type=1, sequence_number=1, exchange_timestamp=0, ltp=125000):
+    return decoder.LTP_LAYOUT.pack(
+        decoder.LTP, exchange_type, _token(token), sequence_number, exchange_timestamp, ltp
+    )
+
+
+def quote_frame(token="10626", exchange_type=1, sequence_number=1, exchange_timestamp=0, ltp=125000):
+    return decoder.QUOTE_LAYOUT.pack(
+        decoder.QUOTE, exchange_type, _token(token), sequence_number, exchange_timestamp, ltp,
+        25, 124900, 1000000, 5000.0, 7000.0, 124000, 126000, 123500, 124500
+    )
+
+
+def snap_quote_frame(token="10626", exchange_type=1, sequence_number=1, exchange_timestamp=0, ltp=125000):
+    frame = bytearray(decoder.SNAP_QUOTE_LAYOUT.pack(
+        decoder.SNAP_QUOTE, exchange_type, _token(token), sequence_number, exchange_timestamp, ltp,
+        25, 124900, 1000000, 5000.0, 7000.0, 124000, 126000, 123500, 124500,
+        exchange_timestamp, 150000, 3, 137000, 112000, 140000, 90000
+    ))
+    for i in range(10):
+        flag = 1 if i < 5 else 0
+        price = ltp - (i + 1) * 5 if flag else ltp + (i - 4) * 5
+        decoder.BEST_5_LEVEL.pack_into(
+            frame, decoder.BEST_5_OFFSET + i * decoder.BEST_5_LEVEL.size, flag, 100 + i, price, 3
+        )
+    return bytes(frame)
+
+
+def depth_frame(token="10626", exchange_type=1, exchange_timestamp=0, ltp=125000):
+    frame = bytearray(decoder.DEPTH_PACKET_SIZE)
+    decoder.DEPTH_LAYOUT.pack_into(frame, 0, decoder.DEPTH, exchange_type, _token(token), exchange_timestamp)
+    for i in range(40):
+        price = ltp - (i + 1) * 5 if i < 20 else ltp + (i - 19) * 5
+        decoder.DEPTH_20_LEVEL.pack_into(
+            frame, decoder.DEPTH_20_OFFSET + i * decoder.DEPTH_20_LEVEL.size, 100 + i, price, 2
+        )
+    return bytes(frame)
+
+
+FRAME_BUILDERS = {
+    decoder.LTP: ltp_frame,
+    decoder.QUOTE: quote_frame,
+    decoder.SNAP_QUOTE: snap_quote_frame,
+    decoder.DEPTH: depth_frame,
+}
+
+
+def build_frame(mode, token, exchange_type, sequence_number, exchange_timestamp, ltp):
+    if mode == decoder.DEPTH:
+        return depth_frame(token, exchange_type, exchange_timestamp, ltp)
+    return FRAME_BUILDERS[mode](token, exchange_type, sequence_number, exchange_timestamp, ltp)
+
+
+def random_frames(count, mode, tokens=None, seed=0):
+    """Build `count` frames in one mode spread over `tokens`, with random walk prices"""
+    rng = random.Random(seed)
+    tokens = tokens or [str(10000 + i) for i in range(500)]
+    prices = {token: rng.randint(10000, 500000) for token in tokens}
+    sequence = {token: 0 for token in tokens}
+    frames = []
+    for i in range(count):
+        token = tokens[rng.randrange(len(tokens))]
+        prices[token] += rng.randint(-50, 50)
+        sequence[token] += 1
+        frames.append(build_frame(mode, token, 1, sequence[token], i, prices[token]))
+    return frames
+
+
+def free_port(host="127.0.0.1"):
+    """A port that is free right now, to fix the mock's address before it is started"""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def _jwt(ttl):
+    def encode(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+    return ".".join((encode({"alg": "HS512"}), encode({"exp": int(time.time() + ttl)}), "mock"))
+
+
+def _path(url):
+    return urlsplit(url).path
+
+
+def _ok(data=None):
+    return web.json_response({"status": True, "message": "SUCCESS", "errorcode": "", "data": data})
+
+
+def _error(message, errorcode="AB1000"):
+    return web.json_response({"status": False, "message": message, "errorcode": errorcode, "data": None})
+
+
+class MockAngelServer(object):
+    """
+        aiohttp application serving every endpoint in endpoints.py plus the smart-stream websocket.
+        Orders fill immediately at market or rest open as limit orders; quotes, candles and the
+        scrip master are synthetic but shaped like the real responses. Websocket subscribers get
+        frames for their tokens `rate` times a second each. With `record_sends` the send time
+        of every (token, sequence_number) is kept in `sent_at` for latency measurements.
+    """
+    TOKEN_TTL = 6 * 3600
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, rate=10, record_sends=False, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate = rate
+        self.record_sends = record_sends
+        self.sent_at = {}
+        self.rng = random.Random(seed)
+        self.prices = {}
+        self.orders = {}
+        self.trades = []
+        self.order_ids = itertools.count(1)
+        self.requests = 0
+        self.hits = {}                  # path -> requests served
+        self.frames_sent = 0
+        self.sockets = set()
+        self.runner = None
+        self.reject_login = False       # Answer logins with an error, as for a wrong TOTP
+        self.logins = 0
+        self.refreshes = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def env(self):
+        """Environment variables that point endpoints.py at this server"""
+        return {
+            "ANGEL_API_ROOT": self.url,
+            "ANGEL_WEBSOCKET_URI": f"ws://{self.host}:{self.port}{SMART_STREAM_PATH}",
+            "ANGEL_INSTRUMENTS_URL": self.url + INSTRUMENTS_PATH,
+            "ANGEL_PUBLIC_IP_URL": self.url + PUBLIC_IP_PATH,
+        }
+
+    def app(self):
+        import endpoints
+        app = web.Application(middlewares=[self._latency_middleware])
+        routes = [
+            ("POST", endpoints.AUTHENTICATE, self.login),
+            ("POST", endpoints.GENERATE_TOKEN, self.generate_tokens),
+            ("GET", endpoints.GET_PROFILE, self.profile),
+            ("POST", endpoints.PLACE_ORDER, self.place_order),
+            ("POST", endpoints.CANCEL_ORDER, self.cancel_order),
+            ("GET", endpoints.GET_ORDER_BOOK, self.order_book),
+            ("GET", endpoints.GET_TRADE_BOOK, self.trade_book),
+            ("POST", endpoints.GET_MARKET_DATA, self.quote),
+            ("POST", endpoints.GET_GAINERS_LOSERS, self.gainers_losers),
+            ("POST", endpoints.GET_HISTORICAL_DATA, self.candles),
+        ]
+        for method, url, handler in routes:
+            app.router.add_route(method, _path(url), handler)
+        app.router.add_get(INSTRUMENTS_PATH, self.instruments)
+        app.router.add_get(PUBLIC_IP_PATH, self.public_ip)
+        app.router.add_get(SMART_STREAM_PATH, self.smart_stream)
+        return app
+
+    @web.middleware
+    async def _latency_middleware(self, request, handler):
+        self.requests += 1
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        for ws in list(self.sockets):
+            await ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+        self.runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def price(self, exchange, token):
+        """Random walk last traded price in paise"""
+        key = (exchange, str(token))
+        price = self.prices.get(key)
+        if price is None:
+            price = self.rng.randint(10000, 500000)
+        price = max(5, price + self.rng.randint(-50, 50))
+        self.prices[key] = price
+        return price
+
+    # REST handlers
+    def _tokens(self):
+        return _ok({"jwtToken": "Bearer " + _jwt(self.TOKEN_TTL), "refreshToken": _jwt(self.TOKEN_TTL),
+                    "feedToken": _jwt(self.TOKEN_TTL)})
+
+    async def login(self, request):
+        self.logins += 1
+        if self.reject_login:
+            return _error("Invalid totp", "AB1050")
+        return self._tokens()
+
+    async def generate_tokens(self, request):
+        self.refreshes += 1
+        return self._tokens()
+
+    async def public_ip(self, request):
+        return web.json_response({"ip": "127.0.0.1"})
+
+    async def profile(self, request):
+        return _ok({"clientcode": "MOCK001", "name": "Mock User", "exchanges": ["NSE", "NFO", "BSE"],
+                    "products": ["DELIVERY", "INTRADAY", "MARGIN"]})
+
+    async def place_order(self, request):
+        order = await request.json()
+        try:
+            quantity = int(order["quantity"])
+            exchange, token = order["exchange"], order["symboltoken"]
+        except (KeyError, ValueError):
+            return _error("Invalid order", "AB1008")
+        orderid = f"{next(self.order_ids):015d}"
+        market = order.get("ordertype", "MARKET") == "MARKET"
+        price = self.price(exchange, token) / 100
+        row = dict(order)
+        row.update({
+            "orderid": orderid,
+            "uniqueorderid": f"mock-{orderid}",
+            "status": "complete" if market else "open",
+            "orderstatus": "complete" if market else "open",
+            "filledshares": str(quantity if market else 0),
+            "unfilledshares": str(0 if market else quantity),
+            "averageprice": price if market else 0,
+            "updatetime": datetime.now(IST).strftime("%d-%b-%Y %H:%M:%S"),
+        })
+        self.orders[orderid] = row
+        if market:
+            self.trades.append({
+                "exchange": exchange, "producttype": order.get("producttype", "INTRADAY"),
+                "tradingsymbol": order.get("tradingsymbol"), "symboltoken": token,
+                "transactiontype": order.get("transactiontype"), "fillprice": price,
+                "fillsize": str(quantity), "orderid": orderid, "fillid": f"F{orderid}",
+                "filltime": row["updatetime"].split(" ")[1],
+            })
+        return _ok({"script": order.get("tradingsymbol"), "orderid": orderid, "uniqueorderid": row["uniqueorderid"]})
+
+    async def cancel_order(self, request):
+        body = await request.json()
+        row = self.orders.get(body.get("orderid"))
+        if row is None or row["status"] != "open":
+            return _error("Order not found or not open", "AB2001")
+        row = dict(row, status="cancelled", orderstatus="cancelled")
+        self.orders[row["orderid"]] = row
+        return _ok({"orderid": row["orderid"], "uniqueorderid": row["uniqueorderid"]})
+
+    async def order_book(self, request):
+        return _ok(list(self.orders.values()) or None)
+
+    async def trade_book(self, request):
+        return _ok(list(self.trades) or None)
+
+    async def quote(self, request):
+        body = await request.json()
+        mode = body.get("mode", "FULL")
+        fetched = []
+        for exchange, tokens in (body.get("exchangeTokens") or {}).items():
+            for token in tokens:
+                ltp = self.price(exchange, token) / 100
+                quote = {"exchange": exchange, "tradingSymbol": f"MOCK{token}", "symbolToken": str(token), "ltp": ltp}
+                if mode in ("OHLC", "FULL"):
+                    quote.update({"open": ltp * 0.99, "high": ltp * 1.01, "low": ltp * 0.98, "close": ltp * 0.995})
+                if mode == "FULL":
+                    quote.update({
+                        "lastTradeQty": 25, "exchFeedTime": datetime.now(IST).strftime("%d-%b-%Y %H:%M:%S"),
+                        "netChange": round(ltp * 0.005, 2), "percentChange": 0.5, "avgPrice": ltp,
+                        "tradeVolume": 1000000, "opnInterest": 0, "totBuyQuan": 5000, "totSellQuan": 7000,
+                        "52WeekLow": ltp * 0.7, "52WeekHigh": ltp * 1.3,
+                        "depth": {
+                            "buy": [{"price": round(ltp - 0.05 * (i + 1), 2), "quantity": 100, "orders": 3} for i in range(5)],
+                            "sell": [{"price": round(ltp + 0.05 * (i + 1), 2), "quantity": 100, "orders": 3} for i in range(5)],
+                        },
+                    })
+                fetched.append(quote)
+        return _ok({"fetched": fetched, "unfetched": []})
+
+    async def gainers_losers(self, request):
+        return _ok([
+            {"tradingSymbol": f"MOCK{i}", "percentChange": round(10 - i * 0.5, 2), "symbolToken": str(1000 + i),
+             "opnInterest": 100000 * (i + 1), "netChangeOpnInterest": 5000 * (i + 1)}
+            for i in range(10)
+        ])
+
+    async def candles(self, request):
+        from candles import INTERVAL_SECONDS
+        body = await request.json()
+        step = INTERVAL_SECONDS.get(body.get("interval"))
+        if step is None:
+            return _error("Invalid interval", "AB13000")
+        start = datetime.strptime(body["fromdate"], DATE_FORMAT).replace(tzinfo=IST)
+        end = datetime.strptime(body["todate"], DATE_FORMAT).replace(tzinfo=IST)
+        rows = []
+        price = self.price(body.get("exchange"), body.get("symboltoken")) / 100
+        moment = start
+        while moment <= end and len(rows) < 20000:
+            close = round(price * (1 + self.rng.uniform(-0.002, 0.002)), 2)
+            rows.append([moment.isoformat(), price, max(price, close) * 1.001, min(price, close) * 0.999, close,
+                         self.rng.randint(100, 10000)])
+            price = close
+            moment += timedelta(seconds=step)
+        return _ok(rows)
+
+    async def instruments(self, request):
+        today = datetime.now(IST).date()
+        expiries = [today + timedelta(days=(3 - today.weekday()) % 7 + 7 * i) for i in range(2)]
+        items = [
+            {"token": "3045", "symbol": "SBIN-EQ", "name": "SBIN", "expiry": "", "strike": "-1.000000",
+             "lotsize": "1", "instrumenttype": "", "exch_seg": "NSE", "tick_size": "5.000000"},
+            {"token": "99926000", "symbol": "Nifty 50", "name": "NIFTY", "expiry": "", "strike": "0.000000",
+             "lotsize": "1", "instrumenttype": "AMXIDX", "exch_seg": "NSE", "tick_size": "0.000000"},
+        ]
+        token = itertools.count(40000)
+        for expiry in expiries:
+            label = expiry.strftime("%d%b%Y").upper()
+            for strike in range(23000, 25001, 100):
+                for option_type in ("CE", "PE"):
+                    items.append({
+                        "token": str(next(token)), "symbol": f"NIFTY{expiry.strftime('%d%b%y').upper()}{strike}{option_type}",
+                        "name": "NIFTY", "expiry": label, "strike": f"{strike * 100:.6f}", "lotsize": "75",
+                        "instrumenttype": "OPTIDX", "exch_seg": "NFO", "tick_size": "5.000000",
+                    })
+        return web.json_response(items)
+
+    # Websocket
+    async def smart_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        subscriptions = {}      # (exchange_type, token) -> mode
+        sender = asyncio.get_running_loop().create_task(self._stream(ws, subscriptions))
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                if message.data == "ping":
+                    await ws.send_str("pong")
+                    continue
+                try:
+                    action = json.loads(message.data)
+                    params = action["params"]
+                except (ValueError, KeyError):
+                    await ws.send_str(json.dumps({"errorCode": "E1002", "errorMessage": "Invalid request"}))
+                    continue
+                for token_list in params.get("tokenList", []):
+                    for token in token_list.get("tokens", []):
+                        key = (token_list["exchangeType"], str(token))
+                        if action.get("action") == 1:
+                            subscriptions[key] = params.get("mode", decoder.LTP)
+                        else:
+                            subscriptions.pop(key, None)
+        finally:
+            sender.cancel()
+            self.sockets.discard(ws)
+        return ws
+
+    async def _stream(self, ws, subscriptions):
+        sequence = {}
+        interval = 1.0 / self.rate
+        next_send = time.monotonic()
+        while not ws.closed:
+            next_send += interval
+            for (exchange_type, token), mode in list(subscriptions.items()):
+                sequence_number = sequence.get((exchange_type, token), 0) + 1
+                sequence[(exchange_type, token)] = sequence_number
+                frame = build_frame(mode, token, exchange_type, sequence_number, int(time.time() * 1000),
+                                    self.price(exchange_type, token))
+                if self.record_sends:
+                    self.sent_at[(exchange_type, token, sequence_number)] = time.perf_counter()
+                try:
+                    await ws.send_bytes(frame)
+                except ConnectionError:
+                    return
+                self.frames_sent += 1
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+
+async def _serve(args):
+    server = await MockAngelServer(args.host, args.port, args.latency, args.rate).start()
+    for name, value in server.env().items():
+        print(f"export {name}={value}")
+    print(f"Mock Angel One server on {server.url}, Ctrl+C to stop")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the Angel One REST APIs and smart-stream websocket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every REST response")
+    parser.add_argument("--rate", type=float, default=10, help="Frames per second per subscribed token")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,353 @@
+from datetime import datetime, time as clock_time
+import asyncio
+import time
+import numpy as np
+import decoder
+from historical import IST
+
+CALL, PUT = 0, 1
+OPTION_TYPES = (b"CE", b"PE")
+EXPIRY_TIME = clock_time(15, 30)        # Index options settle at the 15:30 IST close
+YEAR_SECONDS = 365 * 86400
+MIN_VOLATILITY = 1e-4
+MAX_VOLATILITY = 5.0
+
+_SQRT_2PI = np.sqrt(2 * np.pi)
+_EXCHANGE_TYPES = {name: exchange_type for exchange_type, name in decoder.EXCHANGE_TYPE_MAP.items()}
+_IS_CALL = np.array([[True], [False]])
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def norm_cdf(x):
+    """Standard normal CDF, Abramowitz and Stegun 26.2.17 (absolute error below 7.5e-8)"""
+    t = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = norm_pdf(x) * poly
+    return np.where(x >= 0, 1.0 - upper, upper)
+
+
+def _d1_d2(forward, strike, years, volatility):
+    root = volatility * np.sqrt(years)
+    d1 = (np.log(forward / strike) + 0.5 * root * root) / root
+    return d1, d1 - root
+
+
+def _black(forward, strike, years, volatility, discount, is_call):
+    d1, d2 = _d1_d2(forward, strike, years, volatility)
+    call = discount * (forward * norm_cdf(d1) - strike * norm_cdf(d2))
+    # Puts from put-call parity: two CDF evaluations per option instead of four
+    return np.where(is_call, call, call - discount * (forward - strike)), d1
+
+
+def black_price(forward, strike, years, volatility, discount, is_call):
+    """Black-76 premium of calls (is_call True) and puts, broadcast over every argument"""
+    return _black(forward, strike, years, volatility, discount, is_call)[0]
+
+
+def implied_volatility(price, forward, strike, years, discount, is_call, tolerance=1e-4, iterations=50):
+    """
+        Vectorized implied volatility: Newton steps kept inside a per-option bisection bracket,
+        so every element converges in a few passes over the whole array. Prices outside the
+        no-arbitrage bounds, or not finite, give NaN
+    """
+    price, forward, strike, years, discount, is_call = np.broadcast_arrays(
+        np.asarray(price, dtype=float), forward, strike, years, discount, is_call
+    )
+    intrinsic = discount * np.where(is_call, np.maximum(forward - strike, 0), np.maximum(strike - forward, 0))
+    ceiling = discount * np.where(is_call, forward, strike)
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(price) & (price > intrinsic) & (price < ceiling) & (years > 0)
+    low = np.full(price.shape, MIN_VOLATILITY)
+    high = np.full(price.shape, MAX_VOLATILITY)
+    # Brenner-Subrahmanyam at-the-money estimate as the starting point
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = np.clip(_SQRT_2PI / np.sqrt(years) * price / (discount * forward), 0.05, 1.0)
+    volatility = np.where(valid, volatility, 0.2)
+    converged = ~valid
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for _ in range(iterations):
+            model, d1 = _black(forward, strike, years, volatility, discount, is_call)
+            error = model - price
+            converged |= np.abs(error) < tolerance
+            if converged.all():
+                break
+            high = np.where(error > 0, volatility, high)
+            low = np.where(error < 0, volatility, low)
+            vega = discount * forward * norm_pdf(d1) * np.sqrt(years)
+            newton = volatility - error / vega
+            step = np.where((newton > low) & (newton < high), newton, 0.5 * (low + high))
+            volatility = np.where(converged, volatility, step)
+    return np.where(valid & converged, volatility, np.nan)
+
+
+def black_greeks(spot, forward, strike, years, volatility, discount, rate, dividend_yield, is_call):
+    """
+        Spot delta, gamma, theta per calendar day and vega per volatility point for options on
+        `spot` with forward = spot * exp((rate - dividend_yield) * years)
+    """
+    d1, d2 = _d1_d2(forward, strike, years, volatility)
+    density = norm_pdf(d1)
+    carried = discount * forward            # spot * exp(-dividend_yield * years)
+    root = np.sqrt(years)
+    call_delta = carried / spot * norm_cdf(d1)
+    delta = np.where(is_call, call_delta, call_delta - carried / spot)
+    gamma = carried * density / (spot * spot * volatility * root)
+    decay = -carried * density * volatility / (2 * root)
+    call_theta = decay - rate * strike * discount * norm_cdf(d2) + dividend_yield * carried * norm_cdf(d1)
+    put_theta = decay + rate * strike * discount * norm_cdf(-d2) - dividend_yield * carried * norm_cdf(-d1)
+    theta = np.where(is_call, call_theta, put_theta) / 365
+    vega = carried * density * root / 100
+    return delta, gamma, theta, vega
+
+
+def expiry_timestamp(expiry):
+    """Unix time of the 15:30 IST settlement on an expiry date"""
+    day = np.datetime64(expiry, "D").astype(datetime)
+    return datetime.combine(day, EXPIRY_TIME, tzinfo=IST).timestamp()
+
+
+class OptionChain(object):
+    """
+        Every strike of one underlying and expiry as NumPy arrays indexed [CALL/PUT, strike],
+        kept current from ticks (`update` / `update_batch`) of the options and, optionally, the
+        underlying. Live columns stay in paise as sent by the feed. `recompute()` solves implied
+        volatility and Greeks for the whole chain at once from the bid/ask mid (LTP when
+        either side is empty); it runs on updates at most once per `min_interval` seconds,
+        and `start()` picks up updates that arrived inside the interval.
+
+        Without an `underlying` token the forward comes from put-call parity at the strike
+        where call and put prices are closest.
+    """
+    RATE = 0.065
+    MIN_INTERVAL = 0.25
+
+    def __init__(self, master, name, expiry, exchange="NFO", underlying=None, rate=RATE, dividend_yield=0.0,
+                 min_interval=MIN_INTERVAL, on_update=None, price_divisor=100):
+        options = master.options(name, expiry, exchange)
+        if not len(options):
+            raise ValueError(f"No {exchange} options for {name} expiring {expiry}")
+        self.name = name
+        self.expiry = np.datetime64(expiry, "D")
+        self.expires_at = expiry_timestamp(self.expiry)
+        self.exchange_type = _EXCHANGE_TYPES[exchange]
+        self.strikes = np.unique(options["strike"])
+        shape = (2, len(self.strikes))
+        self.tokens = np.zeros(shape, dtype=options.dtype["token"])
+        self.lotsize = int(options["lotsize"][0])
+
+        sides = np.where(options["option_type"] == OPTION_TYPES[PUT], PUT, CALL)
+        columns = np.searchsorted(self.strikes, options["strike"])
+        self.tokens[sides, columns] = options["token"]
+        self.slots = {
+            (self.exchange_type, token.decode()): (side, column)
+            for token, side, column in zip(options["token"].tolist(), sides.tolist(), columns.tolist())
+        }
+        self.underlying = (underlying[0], str(underlying[1])) if underlying else None
+        self.underlying_ltp = 0
+
+        self.ltp = np.zeros(shape, dtype=np.int64)
+        self.bid = np.zeros(shape, dtype=np.int64)
+        self.ask = np.zeros(shape, dtype=np.int64)
+        self.bid_quantity = np.zeros(shape, dtype=np.int64)
+        self.ask_quantity = np.zeros(shape, dtype=np.int64)
+        self.volume = np.zeros(shape, dtype=np.int64)
+        self.open_interest = np.zeros(shape, dtype=np.int64)
+
+        self.price = np.full(shape, np.nan)
+        self.iv = np.full(shape, np.nan)
+        self.delta = np.full(shape, np.nan)
+        self.gamma = np.full(shape, np.nan)
+        self.theta = np.full(shape, np.nan)
+        self.vega = np.full(shape, np.nan)
+        self.spot = np.nan
+        self.forward = np.nan
+
+        self.rate = rate
+        self.dividend_yield = dividend_yield
+        self.min_interval = min_interval
+        self.on_update = on_update
+        self.price_divisor = price_divisor
+        self.dirty = False
+        self.computed_at = 0.0
+        self.recomputes = 0
+        self.task = None
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def tokens_to_subscribe(self):
+        """(exchange_type, token) of every option in the chain, and the underlying when set"""
+        tokens = list(self.slots)
+        if self.underlying:
+            tokens.append(self.underlying)
+        return tokens
+
+    def update(self, tick):
+        """Applies one decoded tick. Returns False when the token is not part of this chain"""
+        key = (tick.exchange_type, tick.token)
+        if key == self.underlying:
+            if tick.subscription_mode == decoder.DEPTH:
+                return True
+            self.underlying_ltp = tick.last_traded_price
+            self._changed()
+            return True
+        slot = self.slots.get(key)
+        if slot is None:
+            return False
+
+        mode = tick.subscription_mode
+        if mode == decoder.DEPTH:
+            bids, asks = tick.depth_20_buy_data, tick.depth_20_sell_data
+        else:
+            self.ltp[slot] = tick.last_traded_price
+            if mode == decoder.LTP:
+                self._changed()
+                return True
+            self.volume[slot] = tick.volume_trade_for_the_day
+            if mode == decoder.QUOTE:
+                self._changed()
+                return True
+            self.open_interest[slot] = tick.open_interest
+            bids, asks = tick.best_5_buy_data, tick.best_5_sell_data
+        self.bid_quantity[slot], self.bid[slot] = (bids[0].quantity, bids[0].price) if bids else (0, 0)
+        self.ask_quantity[slot], self.ask[slot] = (asks[0].quantity, asks[0].price) if asks else (0, 0)
+        self._changed()
+        return True
+
+    def update_batch(self, mode, ticks):
+        """Applies a batch_decoder structured array and returns the number of option rows applied"""
+        rows, sides, columns = [], [], []
+        changed = False
+        for row, key in enumerate(zip(ticks["exchange_type"].tolist(), ticks["token"].tolist())):
+            key = (key[0], key[1].decode())
+            slot = self.slots.get(key)
+            if slot is not None:
+                rows.append(row)
+                sides.append(slot[0])
+                columns.append(slot[1])
+            elif key == self.underlying and mode != decoder.DEPTH:
+                self.underlying_ltp = int(ticks["last_traded_price"][row])
+                changed = True
+        if rows:
+            slot = (np.array(sides), np.array(columns))
+            ticks = ticks[rows]
+            if mode == decoder.DEPTH:
+                self._write_best(slot, ticks["depth_20_buy_data"][:, 0], ticks["depth_20_sell_data"][:, 0])
+            else:
+                self.ltp[slot] = ticks["last_traded_price"]
+                if mode != decoder.LTP:
+                    self.volume[slot] = ticks["volume_trade_for_the_day"]
+                if mode == decoder.SNAP_QUOTE:
+                    self.open_interest[slot] = ticks["open_interest"]
+                    # Buy levels carry a non-zero flag, as in the tick decoder; the first of each side is the best
+                    levels = ticks["best_5_data"]
+                    is_buy = levels["flag"] != 0
+                    first = np.arange(len(levels))
+                    bids = levels[first, is_buy.argmax(axis=1)]
+                    asks = levels[first, (~is_buy).argmax(axis=1)]
+                    bids[~is_buy.any(axis=1)] = 0
+                    asks[is_buy.all(axis=1)] = 0
+                    self._write_best(slot, bids, asks)
+            changed = True
+        if changed:
+            self._changed()
+        return len(rows)
+
+    def _write_best(self, slot, bids, asks):
+        self.bid[slot], self.bid_quantity[slot] = bids["price"], bids["quantity"]
+        self.ask[slot], self.ask_quantity[slot] = asks["price"], asks["quantity"]
+
+    def _changed(self):
+        self.dirty = True
+        if time.monotonic() - self.computed_at >= self.min_interval:
+            self.recompute()
+
+    def _forward(self, discount, carry):
+        if self.underlying_ltp > 0:
+            spot = self.underlying_ltp / self.price_divisor
+            return spot, spot * carry
+        # Put-call parity where the call and put are closest in price: F = K + (C - P) / D
+        difference = self.price[CALL] - self.price[PUT]
+        if not np.isfinite(difference).any():
+            return np.nan, np.nan
+        column = np.nanargmin(np.abs(difference))
+        forward = self.strikes[column] + difference[column] / discount
+        return forward / carry, forward
+
+    def recompute(self, now=None):
+        """Solves IV and Greeks for every strike in one vectorized pass"""
+        now = time.time() if now is None else now
+        self.dirty = False
+        self.computed_at = time.monotonic()
+        self.recomputes += 1
+        years = (self.expires_at - now) / YEAR_SECONDS
+
+        quoted = (self.bid > 0) & (self.ask >= self.bid)
+        price = np.where(quoted, (self.bid + self.ask) / 2, self.ltp) / self.price_divisor
+        self.price = np.where(price > 0, price, np.nan)
+        if years <= 0:
+            self.spot = self.forward = np.nan
+            for column in (self.iv, self.delta, self.gamma, self.theta, self.vega):
+                column.fill(np.nan)
+        else:
+            discount = np.exp(-self.rate * years)
+            carry = np.exp((self.rate - self.dividend_yield) * years)
+            self.spot, self.forward = self._forward(discount, carry)
+            self.iv = implied_volatility(self.price, self.forward, self.strikes, years, discount, _IS_CALL)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.delta, self.gamma, self.theta, self.vega = black_greeks(
+                    self.spot, self.forward, self.strikes, years, self.iv, discount,
+                    self.rate, self.dividend_yield, _IS_CALL
+                )
+        if self.on_update:
+            self.on_update(self)
+
+    def atm_index(self):
+        """Column of the strike nearest the forward, or None before it is known"""
+        if not np.isfinite(self.forward):
+            return None
+        return int(np.abs(self.strikes - self.forward).argmin())
+
+    def table(self):
+        """One row per strike with the call and put columns side by side, prices in rupees"""
+        fields = [("strike", "<f8")]
+        for prefix in ("ce", "pe"):
+            fields += [(f"{prefix}_token", self.tokens.dtype), (f"{prefix}_ltp", "<f8"), (f"{prefix}_bid", "<f8"),
+                       (f"{prefix}_ask", "<f8"), (f"{prefix}_oi", "<i8"), (f"{prefix}_volume", "<i8"),
+                       (f"{prefix}_iv", "<f8"), (f"{prefix}_delta", "<f8"), (f"{prefix}_gamma", "<f8"),
+                       (f"{prefix}_theta", "<f8"), (f"{prefix}_vega", "<f8")]
+        table = np.zeros(len(self.strikes), dtype=fields)
+        table["strike"] = self.strikes
+        for side, prefix in ((CALL, "ce"), (PUT, "pe")):
+            table[f"{prefix}_token"] = self.tokens[side]
+            table[f"{prefix}_ltp"] = self.ltp[side] / self.price_divisor
+            table[f"{prefix}_bid"] = self.bid[side] / self.price_divisor
+            table[f"{prefix}_ask"] = self.ask[side] / self.price_divisor
+            table[f"{prefix}_oi"] = self.open_interest[side]
+            table[f"{prefix}_volume"] = self.volume[side]
+            for name in ("iv", "delta", "gamma", "theta", "vega"):
+                table[f"{prefix}_{name}"] = getattr(self, name)[side]
+        return table
+
+    def start(self):
+        """Schedules a loop that recomputes updates throttled inside min_interval"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(self.min_interval, 0.01))
+            if self.dirty:
+                self.recompute()
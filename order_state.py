@@ -0,0 +1,245 @@
+import asyncio
+import time
+from endpoints import GET_ORDER_BOOK, GET_TRADE_BOOK
+
+# Order book `status` values for orders still working at the exchange
+OPEN_STATUSES = frozenset((
+    "open", "open pending", "trigger pending", "validation pending", "modify pending",
+    "modify validation pending", "cancel pending", "put order req received",
+    "after market order req received",
+))
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Position(object):
+    """Net position for one (exchange, tradingsymbol, producttype), built from fills"""
+    __slots__ = ("exchange", "tradingsymbol", "producttype", "buy_quantity", "sell_quantity", "buy_value", "sell_value")
+
+    def __init__(self, exchange, tradingsymbol, producttype):
+        self.exchange = exchange
+        self.tradingsymbol = tradingsymbol
+        self.producttype = producttype
+        self.buy_quantity = 0
+        self.sell_quantity = 0
+        self.buy_value = 0.0
+        self.sell_value = 0.0
+
+    @property
+    def net_quantity(self):
+        return self.buy_quantity - self.sell_quantity
+
+    @property
+    def buy_average(self):
+        return self.buy_value / self.buy_quantity if self.buy_quantity else 0.0
+
+    @property
+    def sell_average(self):
+        return self.sell_value / self.sell_quantity if self.sell_quantity else 0.0
+
+    @property
+    def realized_pnl(self):
+        closed = min(self.buy_quantity, self.sell_quantity)
+        return closed * (self.sell_average - self.buy_average)
+
+    def __repr__(self):
+        return (f"Position({self.exchange}:{self.tradingsymbol} {self.producttype} net={self.net_quantity} "
+                f"buy={self.buy_quantity}@{self.buy_average:.2f} sell={self.sell_quantity}@{self.sell_average:.2f})")
+
+
+class OrderState(object):
+    """
+        Local view of the day's orders indexed by orderid, (exchange, tradingsymbol) and status,
+        with net positions derived from the trade book. Order and trade book snapshots are
+        diffed against the current view and only changed orders and new fills are applied,
+        so every lookup is a dict access.
+    """
+
+    def __init__(self):
+        self.orders = {}            # orderid -> order book row
+        self.by_symbol = {}         # (exchange, tradingsymbol) -> {orderid}
+        self.by_status = {}         # status -> {orderid}
+        self.fills = set()          # (orderid, fillid) already applied
+        self.filled = {}            # orderid -> quantity of the fills applied
+        self.positions = {}         # (exchange, tradingsymbol, producttype) -> Position
+        self.fills_pending = True   # Some order filled more since the trade book was last applied
+
+    def _index(self, index, key, orderid, add):
+        ids = index.get(key)
+        if add:
+            if ids is None:
+                ids = index[key] = set()
+            ids.add(orderid)
+        elif ids is not None:
+            ids.discard(orderid)
+            if not ids:
+                del index[key]
+
+    def apply_order_book(self, rows):
+        """Applies a GET_ORDER_BOOK snapshot; returns [(row, previous_row_or_None)] for changed orders"""
+        changed = []
+        for row in rows or []:
+            orderid = row.get("orderid")
+            previous = self.orders.get(orderid)
+            if previous == row:
+                continue
+            if previous is not None:
+                self._index(self.by_status, previous.get("status"), orderid, False)
+                if _number(row.get("filledshares")) > _number(previous.get("filledshares")):
+                    self.fills_pending = True
+            else:
+                self._index(self.by_symbol, (row.get("exchange"), row.get("tradingsymbol")), orderid, True)
+                if _number(row.get("filledshares")):
+                    self.fills_pending = True
+            self._index(self.by_status, row.get("status"), orderid, True)
+            self.orders[orderid] = row
+            changed.append((row, previous))
+        return changed
+
+    def apply_trade_book(self, rows):
+        """Applies a GET_TRADE_BOOK snapshot; returns the fills not seen before"""
+        new_fills = []
+        for row in rows or []:
+            key = (row.get("orderid"), row.get("fillid"))
+            if key in self.fills:
+                continue
+            self.fills.add(key)
+            quantity = int(_number(row.get("fillsize")))
+            self.filled[key[0]] = self.filled.get(key[0], 0) + quantity
+            position_key = (row.get("exchange"), row.get("tradingsymbol"), row.get("producttype"))
+            position = self.positions.get(position_key)
+            if position is None:
+                position = self.positions[position_key] = Position(*position_key)
+            value = quantity * _number(row.get("fillprice"))
+            if row.get("transactiontype") == "BUY":
+                position.buy_quantity += quantity
+                position.buy_value += value
+            else:
+                position.sell_quantity += quantity
+                position.sell_value += value
+            new_fills.append(row)
+        # The trade book can lag the order book's filledshares; keep asking until it catches up
+        self.fills_pending = any(
+            _number(order.get("filledshares")) > self.filled.get(orderid, 0) for orderid, order in self.orders.items()
+        )
+        return new_fills
+
+    def get(self, orderid):
+        return self.orders.get(orderid)
+
+    def orders_for(self, exchange, tradingsymbol):
+        return [self.orders[orderid] for orderid in self.by_symbol.get((exchange, tradingsymbol), ())]
+
+    def with_status(self, status):
+        return [self.orders[orderid] for orderid in self.by_status.get(status, ())]
+
+    def open_orders(self):
+        return [self.orders[orderid] for status in OPEN_STATUSES for orderid in self.by_status.get(status, ())]
+
+    def has_open_orders(self):
+        return any(status in self.by_status for status in OPEN_STATUSES)
+
+    def position(self, exchange, tradingsymbol, producttype):
+        return self.positions.get((exchange, tradingsymbol, producttype))
+
+    def net_quantity(self, exchange, tradingsymbol, producttype=None):
+        """Net filled quantity for a symbol, for one product type or across all of them"""
+        if producttype is not None:
+            position = self.positions.get((exchange, tradingsymbol, producttype))
+            return position.net_quantity if position else 0
+        return sum(
+            position.net_quantity for position in self.positions.values()
+            if position.exchange == exchange and position.tradingsymbol == tradingsymbol
+        )
+
+
+class OrderStateSync(object):
+    """
+        Keeps an OrderState current by polling the order book, and the trade book only when
+        orders report new fills. Polls run at `min_interval` while orders are working or the
+        last poll changed something, backing off to `max_interval` when the books are quiet.
+        `poke()` (wired to OrderGateway acks by AngelAPIWrapper) forces an early poll.
+    """
+    MIN_INTERVAL = 1.0      # GET_ORDER_BOOK allows one request per second
+    MAX_INTERVAL = 10.0
+
+    def __init__(self, client, state=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 on_order=None, on_fill=None):
+        self.client = client
+        self.state = state or OrderState()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.on_order = on_order
+        self.on_fill = on_fill
+        self.last_poll = None
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def _fetch(self, url):
+        response = await self.client.get(url)
+        if not response or not response.get("status"):
+            print(f"Error fetching {url}: {response.get('message') if response else 'no response'}")
+            return None
+        return response.get("data") or []
+
+    async def poll(self):
+        """Syncs both books once; returns True if anything changed"""
+        rows = await self._fetch(GET_ORDER_BOOK)
+        if rows is None:
+            return False
+        changed = self.state.apply_order_book(rows)
+        new_fills = []
+        if self.state.fills_pending:
+            trades = await self._fetch(GET_TRADE_BOOK)
+            if trades is not None:
+                new_fills = self.state.apply_trade_book(trades)
+        self.last_poll = time.time()
+        if self.on_order:
+            for row, previous in changed:
+                self.on_order(row, previous)
+        if self.on_fill:
+            for fill in new_fills:
+                self.on_fill(fill)
+        return bool(changed or new_fills)
+
+    def poke(self, *_):
+        """Requests a poll as soon as the rate limit allows"""
+        self.interval = self.min_interval
+        self.wakeup.set()
+
+    def start(self):
+        """Schedules the polling loop on the running event loop"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def _poll_loop(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                changed = await self.poll()
+            except Exception as e:
+                print(f"Error syncing order state: {str(e)}")
+                changed = False
+            if changed or self.state.has_open_orders() or self.state.fills_pending:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * 2)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,129 @@
+from collections import namedtuple, deque
+import asyncio
+import time
+from endpoints import PLACE_ORDER, CANCEL_ORDER, GET_ORDER_BOOK, GET_TRADE_BOOK
+
+VARIETIES = ("NORMAL", "STOPLOSS", "AMO", "ROBO")
+TRANSACTION_TYPES = ("BUY", "SELL")
+ORDER_TYPES = ("MARKET", "LIMIT", "STOPLOSS_LIMIT", "STOPLOSS_MARKET")
+PRODUCT_TYPES = ("DELIVERY", "CARRYFORWARD", "MARGIN", "INTRADAY", "BO")
+DURATIONS = ("DAY", "IOC")
+LIMIT_ORDER_TYPES = ("LIMIT", "STOPLOSS_LIMIT")                 # need a price
+STOPLOSS_ORDER_TYPES = ("STOPLOSS_LIMIT", "STOPLOSS_MARKET")    # need a triggerprice
+
+_ORDER_FIELDS = (
+    "tradingsymbol", "symboltoken", "exchange", "transactiontype", "quantity",
+    "ordertype", "producttype", "variety", "duration", "price", "triggerprice",
+    "squareoff", "stoploss", "ordertag",
+)
+
+
+class Order(namedtuple("Order", _ORDER_FIELDS, defaults=("MARKET", "INTRADAY", "NORMAL", "DAY", 0, 0, 0, 0, None))):
+    """One order as accepted by PLACE_ORDER. Prices are in rupees"""
+    __slots__ = ()
+
+    def payload(self):
+        """Validated request body with every value as the string the API expects"""
+        for field, allowed in (("variety", VARIETIES), ("transactiontype", TRANSACTION_TYPES),
+                               ("ordertype", ORDER_TYPES), ("producttype", PRODUCT_TYPES),
+                               ("duration", DURATIONS)):
+            if getattr(self, field) not in allowed:
+                raise ValueError(f"Invalid {field} {getattr(self, field)!r}, expected one of {allowed}")
+        if int(self.quantity) <= 0:
+            raise ValueError(f"Invalid quantity {self.quantity!r}")
+        if self.ordertype in LIMIT_ORDER_TYPES and float(self.price) <= 0:
+            raise ValueError(f"{self.ordertype} order needs a price, got {self.price!r}")
+        if self.ordertype in STOPLOSS_ORDER_TYPES and float(self.triggerprice) <= 0:
+            raise ValueError(f"{self.ordertype} order needs a triggerprice, got {self.triggerprice!r}")
+        if self.variety == "STOPLOSS" and self.ordertype not in STOPLOSS_ORDER_TYPES:
+            raise ValueError(f"STOPLOSS variety needs ordertype in {STOPLOSS_ORDER_TYPES}, got {self.ordertype!r}")
+        return {field: str(value) for field, value in zip(_ORDER_FIELDS, self) if value is not None}
+
+
+# `latency` is seconds from submission, including any rate-limit queueing, to the broker's ack
+OrderResult = namedtuple("OrderResult", [
+    "request", "ok", "order_id", "unique_order_id", "message", "error_code", "latency", "response"
+])
+
+CancelRequest = namedtuple("CancelRequest", ["orderid", "variety"], defaults=("NORMAL",))
+
+
+class OrderGateway(object):
+    """
+        Places and cancels orders over the shared AngelClient. Baskets are submitted concurrently
+        and queue only on the client's order rate limit, which outranks every other request.
+        Results come back in input order with per-order submit-to-ack latency.
+    """
+    LATENCY_HISTORY = 10000
+
+    def __init__(self, client, on_ack=None):
+        self.client = client
+        self.latencies = deque(maxlen=self.LATENCY_HISTORY)
+        self.on_ack = on_ack      # Called with every OrderResult the broker acknowledged
+
+    async def _submit(self, url, request, payload):
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(url, payload)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            print(f"Error submitting {payload}: {str(e)}")
+            return OrderResult(request, False, None, None, str(e), None, latency, None)
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        data = (response or {}).get("data") or {}
+        result = OrderResult(
+            request,
+            bool(response and response.get("status")),
+            data.get("orderid"),
+            data.get("uniqueorderid"),
+            (response or {}).get("message"),
+            (response or {}).get("errorcode"),
+            latency,
+            response,
+        )
+        if self.on_ack and result.ok:
+            self.on_ack(result)
+        return result
+
+    async def place(self, order):
+        """Places one Order (or a raw payload dict) and returns its OrderResult"""
+        try:
+            payload = order.payload() if isinstance(order, Order) else order
+        except ValueError as e:
+            return OrderResult(order, False, None, None, str(e), None, 0.0, None)
+        return await self._submit(PLACE_ORDER, order, payload)
+
+    async def cancel(self, orderid, variety="NORMAL"):
+        request = CancelRequest(orderid, variety)
+        return await self._submit(CANCEL_ORDER, request, request._asdict())
+
+    async def place_basket(self, orders):
+        """Places every order concurrently; results are in the same order as `orders`"""
+        return await asyncio.gather(*[self.place(order) for order in orders])
+
+    async def cancel_basket(self, requests):
+        """Cancels order ids (or CancelRequest / (orderid, variety) pairs) concurrently, in input order"""
+        requests = [CancelRequest(*request) if isinstance(request, tuple) else CancelRequest(request)
+                    for request in requests]
+        return await asyncio.gather(*[self.cancel(*request) for request in requests])
+
+    async def get_order_book(self):
+        return await self.client.get(GET_ORDER_BOOK)
+
+    async def get_trade_book(self):
+        return await self.client.get(GET_TRADE_BOOK)
+
+    def latency_stats(self):
+        """Submit-to-ack latency percentiles in milliseconds over the recent orders"""
+        if not self.latencies:
+            return {}
+        ordered = sorted(self.latencies)
+        last = len(ordered) - 1
+        return {
+            "count": len(ordered),
+            "p50": ordered[last // 2] * 1000,
+            "p90": ordered[last * 9 // 10] * 1000,
+            "p99": ordered[last * 99 // 100] * 1000,
+            "max": ordered[last] * 1000,
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import time
+from endpoints import GET_MARKET_DATA
+
+# Quote modes of GET_MARKET_DATA, each a superset of the ones before it
+QUOTE_MODES = ("LTP", "OHLC", "FULL")
+
+
+def normalize_exchange_tokens(exchange_tokens):
+    """Accepts {exchange: [tokens]} as in the API payload or an iterable of (exchange, token) pairs"""
+    if isinstance(exchange_tokens, dict):
+        pairs = [(exchange, str(token)) for exchange, tokens in exchange_tokens.items() for token in tokens]
+    else:
+        pairs = [(exchange, str(token)) for exchange, token in exchange_tokens]
+    return list(dict.fromkeys(pairs))
+
+
+class QuoteService(object):
+    """
+        Quotes for any number of tokens over GET_MARKET_DATA. Tokens are packed into requests of at
+        most MAX_TOKENS_PER_REQUEST that go out concurrently under the client's rate limit. A token
+        already being fetched by another coroutine is awaited rather than requested again, and
+        quotes are served from a short-TTL cache, where a FULL quote also answers OHLC and LTP.
+        The cache holds at most `max_cache_size` quotes; expired ones are evicted first, then the oldest.
+    """
+    MAX_TOKENS_PER_REQUEST = 50
+    CACHE_TTL = 0.5
+    MAX_CACHE_SIZE = 10000
+
+    def __init__(self, client, ttl=CACHE_TTL, max_tokens_per_request=MAX_TOKENS_PER_REQUEST,
+                 max_cache_size=MAX_CACHE_SIZE):
+        self.client = client
+        self.ttl = ttl
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_cache_size = max_cache_size
+        self.cache = {}         # (mode, exchange, token) -> (expires_at, quote), oldest write first
+        self.in_flight = {}     # (mode, exchange, token) -> future
+        self.tasks = set()      # running _fetch tasks, cancelled on close
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    def _cached(self, mode, exchange, token, now):
+        for each_mode in QUOTE_MODES[QUOTE_MODES.index(mode):]:
+            entry = self.cache.get((each_mode, exchange, token))
+            if entry is not None:
+                if entry[0] > now:
+                    return entry[1]
+                del self.cache[(each_mode, exchange, token)]
+        return None
+
+    def _pending(self, mode, exchange, token):
+        for each_mode in QUOTE_MODES[QUOTE_MODES.index(mode):]:
+            future = self.in_flight.get((each_mode, exchange, token))
+            if future is not None:
+                return future
+        return None
+
+    async def get(self, exchange_tokens, mode="FULL"):
+        """Returns {(exchange, token): quote} for every token the API fetched"""
+        if mode not in QUOTE_MODES:
+            raise ValueError(f"Unknown quote mode {mode!r}, expected one of {QUOTE_MODES}")
+        now = time.monotonic()
+        quotes = {}
+        waiting = {}
+        missing = []
+        for exchange, token in normalize_exchange_tokens(exchange_tokens):
+            quote = self._cached(mode, exchange, token, now)
+            if quote is not None:
+                self.cache_hits += 1
+                quotes[(exchange, token)] = quote
+                continue
+            future = self._pending(mode, exchange, token)
+            if future is not None:
+                self.coalesced += 1
+                waiting[(exchange, token)] = future
+            else:
+                missing.append((exchange, token))
+
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(missing), self.max_tokens_per_request):
+            chunk = missing[i:i + self.max_tokens_per_request]
+            futures = {}
+            for key in chunk:
+                futures[key] = waiting[key] = self.in_flight[(mode,) + key] = loop.create_future()
+            # A task per request, so a cancelled caller never strands coroutines waiting on it
+            task = loop.create_task(self._fetch(mode, futures))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        if waiting:
+            results = await asyncio.gather(*[asyncio.shield(future) for future in waiting.values()])
+            for key, quote in zip(waiting, results):
+                if quote is not None:
+                    quotes[key] = quote
+        return quotes
+
+    async def _fetch(self, mode, futures):
+        exchange_tokens = {}
+        for exchange, token in futures:
+            exchange_tokens.setdefault(exchange, []).append(token)
+        fetched = {}
+        try:
+            self.requests += 1
+            data = await self.client.post(GET_MARKET_DATA, {"mode": mode, "exchangeTokens": exchange_tokens})
+            if data and data.get("status"):
+                expires_at = time.monotonic() + self.ttl
+                for quote in (data.get("data") or {}).get("fetched") or []:
+                    key = (quote.get("exchange"), str(quote.get("symbolToken")))
+                    fetched[key] = quote
+                    self.cache.pop((mode,) + key, None)
+                    self.cache[(mode,) + key] = (expires_at, quote)
+                self._evict()
+            else:
+                print(f"Error fetching quotes: {data.get('message') if data else 'no response'}")
+        except Exception as e:
+            print(f"Error fetching quotes: {str(e)}")
+        finally:
+            for key, future in futures.items():
+                if self.in_flight.get((mode,) + key) is future:
+                    del self.in_flight[(mode,) + key]
+                if not future.done():
+                    future.set_result(fetched.get(key))
+
+    def _evict(self):
+        if len(self.cache) <= self.max_cache_size:
+            return
+        now = time.monotonic()
+        self.cache = {key: entry for key, entry in self.cache.items() if entry[0] > now}
+        for key in list(itertools.islice(self.cache, len(self.cache) - self.max_cache_size)):
+            del self.cache[key]
+
+    async def ltp(self, exchange_tokens):
+        """{(exchange, token): last traded price}"""
+        quotes = await self.get(exchange_tokens, mode="LTP")
+        return {key: quote.get("ltp") for key, quote in quotes.items()}
+
+    def clear(self):
+        self.cache = {}
+
+    async def close(self):
+        """Cancels the requests still in flight; their callers get no quote for those tokens"""
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
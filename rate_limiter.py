@@ -0,0 +1,200 @@
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import time
+from endpoints import RATE_LIMITS, REQUEST_PRIORITIES, DEFAULT_PRIORITY
+
+
+class SchedulerClosed(Exception):
+    """Raised in requests still queued in a RequestScheduler when it is closed"""
+
+
+class TokenBucket(object):
+    """Classic token bucket refilled continuously at `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self):
+        """Seconds until the next token is available"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class PriorityWaiters(object):
+    """Futures waiting for a resource, woken lowest priority value first, FIFO within a priority"""
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.heap, (priority, next(self.counter), future))
+        return future
+
+    def pop(self):
+        """Returns the next live waiter, skipping cancelled ones, or None"""
+        while self.heap:
+            future = heapq.heappop(self.heap)[2]
+            if not future.done():
+                return future
+        return None
+
+    def fail(self, exception):
+        """Raises `exception` in every waiter still queued and empties the queue"""
+        for _priority, _count, future in self.heap:
+            if not future.done():
+                future.set_exception(exception)
+        self.heap = []
+
+
+class EndpointStats(object):
+    __slots__ = ("requests", "queued", "in_flight", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.requests = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class RequestScheduler(object):
+    """
+        Gates every AngelClient request through a per-endpoint token bucket and a shared
+        pool of in-flight slots. Both queues wake waiters by priority, so order placement
+        and cancellation overtake queued bulk data pulls for rate tokens and connections.
+    """
+
+    def __init__(self, rate_limits=RATE_LIMITS, priorities=REQUEST_PRIORITIES, max_in_flight=20):
+        self.rate_limits = rate_limits
+        self.priorities = priorities
+        self.max_in_flight = max_in_flight
+        self.buckets = {}
+        self.bucket_waiters = {}
+        self.drainers = {}
+        self.in_flight = 0
+        self.slot_waiters = PriorityWaiters()
+        self.stats = {}
+
+    @asynccontextmanager
+    async def slot(self, url, priority=None):
+        """Waits for a rate token and an in-flight slot for `url`, holding the slot for the block"""
+        if priority is None:
+            priority = self.priorities.get(url, DEFAULT_PRIORITY)
+        stats = self.stats.get(url)
+        if stats is None:
+            stats = self.stats[url] = EndpointStats()
+
+        start = time.monotonic()
+        stats.queued += 1
+        try:
+            await self._take_token(url, priority)
+            await self._take_slot(priority)
+        finally:
+            stats.queued -= 1
+        wait = time.monotonic() - start
+        stats.requests += 1
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+
+        stats.in_flight += 1
+        try:
+            yield wait
+        finally:
+            stats.in_flight -= 1
+            self._release_slot()
+
+    async def _take_token(self, url, priority):
+        limit = self.rate_limits.get(url)
+        if limit is None:
+            return
+        bucket = self.buckets.get(url)
+        if bucket is None:
+            bucket = self.buckets[url] = TokenBucket(*limit)
+            self.bucket_waiters[url] = PriorityWaiters()
+        waiters = self.bucket_waiters[url]
+        if not waiters and bucket.try_acquire():
+            return
+        future = waiters.push(priority)
+        drainer = self.drainers.get(url)
+        if drainer is None or drainer.done():
+            self.drainers[url] = asyncio.get_running_loop().create_task(self._drain_bucket(bucket, waiters))
+        await future
+
+    async def _drain_bucket(self, bucket, waiters):
+        # Hands out tokens to queued requests in priority order as the bucket refills
+        while waiters:
+            delay = bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            future = waiters.pop()
+            if future is not None:
+                bucket.try_acquire()
+                future.set_result(None)
+
+    async def _take_slot(self, priority):
+        if self.in_flight < self.max_in_flight and not self.slot_waiters:
+            self.in_flight += 1
+            return
+        future = self.slot_waiters.push(priority)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation landed
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        future = self.slot_waiters.pop()
+        if future is not None:
+            future.set_result(None)    # In-flight count is handed over unchanged
+        else:
+            self.in_flight -= 1
+
+    def queue_depth(self):
+        return sum(stats.queued for stats in self.stats.values())
+
+    def metrics(self):
+        """Per-endpoint queue depth, in-flight count and wait time in seconds"""
+        return {
+            url: {
+                "requests": stats.requests,
+                "queued": stats.queued,
+                "in_flight": stats.in_flight,
+                "avg_wait": stats.total_wait / stats.requests if stats.requests else 0.0,
+                "max_wait": stats.max_wait,
+            }
+            for url, stats in self.stats.items()
+        }
+
+    async def close(self):
+        """Stops the drainers and fails every request still waiting for a rate token or slot"""
+        drainers, self.drainers = list(self.drainers.values()), {}
+        for drainer in drainers:
+            drainer.cancel()
+        await asyncio.gather(*drainers, return_exceptions=True)
+        for waiters in list(self.bucket_waiters.values()) + [self.slot_waiters]:
+            waiters.fail(SchedulerClosed("Request scheduler closed"))
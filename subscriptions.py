@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+from tick_queue import TickQueue, BLOCK
+
+_correlation_ids = itertools.count(1)
+
+
+def next_correlation_id():
+    """Ten character correlationID, unique within the process"""
+    return f"sub{next(_correlation_ids) % 10 ** 7:07d}"
+
+
+def build_action_payloads(entries, action, correlation_id=None):
+    """
+        Merges (exchange_type, token) -> mode entries into the fewest action messages:
+        one per mode, with tokens grouped by exchange type
+    """
+    by_mode = {}
+    for (exchange_type, token), mode in entries.items():
+        by_mode.setdefault(mode, {}).setdefault(exchange_type, []).append(token)
+    return [
+        {
+            "correlationID": correlation_id or next_correlation_id(),
+            "action": action,
+            "params": {
+                "mode": mode,
+                "tokenList": [
+                    {"exchangeType": exchange_type, "tokens": tokens}
+                    for exchange_type, tokens in token_list.items()
+                ]
+            }
+        }
+        for mode, token_list in sorted(by_mode.items())
+    ]
+
+
+def normalize_tokens(tokens):
+    """Accepts {exchange_type: [tokens]} or an iterable of (exchange_type, token) pairs"""
+    if isinstance(tokens, dict):
+        return [(exchange_type, str(token)) for exchange_type, each in tokens.items() for token in each]
+    return [(exchange_type, str(token)) for exchange_type, token in tokens]
+
+
+class SubscriptionManager(object):
+    """
+        Runtime registry of subscribed tokens spread over as many SmartWebSockets connections
+        as the per-connection token limit requires. Each update is diffed against the live
+        state and sent as the fewest subscribe/unsubscribe messages per connection; new tokens
+        fill existing connections before another one is opened. Ticks from every connection
+        arrive on one queue: `async for tick in manager`.
+    """
+    MAX_TOKENS_PER_CONNECTION = 1000
+    MAX_CONNECTIONS = 3
+
+    def __init__(self, client=None, max_tokens_per_connection=MAX_TOKENS_PER_CONNECTION,
+                 max_connections=MAX_CONNECTIONS, queue_size=10000, overflow_policy=BLOCK, **feed_options):
+        if client is None:
+            from client import AngelClient
+            client = AngelClient()
+        self.client = client
+        self.max_tokens_per_connection = max_tokens_per_connection
+        self.max_connections = max_connections
+        self.queue = TickQueue(maxsize=queue_size, policy=overflow_policy)
+        self.feed_options = feed_options
+        self.shards = []
+        self.owner = {}         # (exchange_type, token) -> shard
+        self.lock = asyncio.Lock()
+
+    def __aiter__(self):
+        return self.queue.__aiter__()
+
+    @property
+    def subscriptions(self):
+        """(exchange_type, token) -> mode across every connection"""
+        merged = {}
+        for shard in self.shards:
+            merged.update(shard.subscriptions)
+        return merged
+
+    async def _open_shard(self):
+        from SmartWebSockets import SmartWebSockets
+        if len(self.shards) >= self.max_connections:
+            raise ValueError(
+                f"Subscription limit reached: {self.max_connections} connections x "
+                f"{self.max_tokens_per_connection} tokens"
+            )
+        shard = SmartWebSockets(client=self.client, subscription=None, queue=self.queue, **self.feed_options)
+        await shard.connect()
+        self.shards.append(shard)
+        return shard
+
+    async def subscribe(self, tokens, mode):
+        """Subscribes tokens in `mode`, moving any already subscribed in another mode"""
+        await self.update({key: mode for key in normalize_tokens(tokens)})
+
+    async def unsubscribe(self, tokens):
+        await self.update(remove=normalize_tokens(tokens))
+
+    async def set_subscriptions(self, desired):
+        """Replaces the whole subscription set with `desired`, (exchange_type, token) -> mode"""
+        desired = {(exchange_type, str(token)): mode for (exchange_type, token), mode in desired.items()}
+        current = self.subscriptions
+        await self.update(desired, remove=[key for key in current if key not in desired])
+
+    async def update(self, add=None, remove=None):
+        async with self.lock:
+            unsubscribes = {}
+            subscribes = {}
+            current = self.subscriptions
+
+            for key in remove or []:
+                shard = self.owner.get(key)
+                if shard is not None:
+                    unsubscribes.setdefault(shard, {})[key] = shard.subscriptions[key]
+
+            new_keys = {}
+            for key, mode in (add or {}).items():
+                shard = self.owner.get(key)
+                if shard is None:
+                    new_keys[key] = mode
+                elif current.get(key) != mode:
+                    # Mode change stays on the same connection: drop the old mode, add the new one
+                    unsubscribes.setdefault(shard, {})[key] = current[key]
+                    subscribes.setdefault(shard, {})[key] = mode
+
+            # Fill connections in order so each new batch needs as few messages as possible
+            pending = list(new_keys.items())
+            for shard in self.shards:
+                if not pending:
+                    break
+                removed = [key for key in unsubscribes.get(shard, {}) if key not in subscribes.get(shard, {})]
+                load = len(shard.subscriptions) - len(removed)
+                room = self.max_tokens_per_connection - load
+                if room > 0:
+                    subscribes.setdefault(shard, {}).update(pending[:room])
+                    pending = pending[room:]
+            while pending:
+                shard = await self._open_shard()
+                subscribes[shard] = dict(pending[:self.max_tokens_per_connection])
+                pending = pending[self.max_tokens_per_connection:]
+
+            try:
+                for shard, entries in unsubscribes.items():
+                    await shard.unsubscribe(build_action_payloads(entries, action=0))
+                for shard, entries in subscribes.items():
+                    for payload in build_action_payloads(entries, action=1):
+                        await shard.subscribe(payload)
+            finally:
+                # A connection only records the actions it managed to send, so ownership follows
+                # what each one actually holds, whichever sends failed
+                for shard in set(unsubscribes) | set(subscribes):
+                    for key in itertools.chain(unsubscribes.get(shard, ()), subscribes.get(shard, ())):
+                        if key in shard.subscriptions:
+                            self.owner[key] = shard
+                        elif self.owner.get(key) is shard:
+                            del self.owner[key]
+
+    async def disconnect(self):
+        for shard in self.shards:
+            await shard.disconnect()
+        self.shards = []
+        self.owner = {}
+        self.queue.close()
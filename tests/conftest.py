@@ -0,0 +1,24 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from mock_server import MockAngelServer, free_port
+
+# endpoints.py reads the hosts at import, so the mock's address is fixed for the session
+SERVER_PORT = free_port()
+os.environ.update(MockAngelServer(port=SERVER_PORT).env())
+for name, value in (("MFA_TOKEN", "JBSWY3DPEHPK3PXP"), ("API_KEY", "mock"), ("CLIENT_ID", "MOCK001")):
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def mock_server():
+    """A fresh MockAngelServer on the session's port; start it with `async with mock_server:`"""
+    return MockAngelServer(port=SERVER_PORT)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
@@ -0,0 +1,56 @@
+import time
+import decoder
+from batch_decoder import FrameBatcher, decode_batch
+from mock_server import ltp_frame, quote_frame
+
+
+def collect(**options):
+    batches = []
+    return FrameBatcher(lambda mode, batch: batches.append((mode, batch)), **options), batches
+
+
+def test_decode_batch_matches_the_tick_decoder():
+    frames = [quote_frame(str(token), sequence_number=token, ltp=100 * token) for token in (3045, 2885)]
+    batch = decode_batch(frames, decoder.QUOTE)
+    ticks = [decoder.TickDecoder().decode(frame) for frame in frames]
+    assert batch["token"].tolist() == [b"3045", b"2885"]
+    assert batch["last_traded_price"].tolist() == [tick.last_traded_price for tick in ticks]
+    assert batch["closed_price"].tolist() == [tick.closed_price for tick in ticks]
+
+
+def test_flushes_when_the_batch_is_full():
+    batcher, batches = collect(batch_size=3, flush_interval=60)
+    for number in range(7):
+        assert batcher.add(ltp_frame(sequence_number=number))
+    assert [(mode, batch["sequence_number"].tolist()) for mode, batch in batches] == [
+        (decoder.LTP, [0, 1, 2]), (decoder.LTP, [3, 4, 5]),
+    ]
+    batcher.flush()
+    assert batches[-1][1]["sequence_number"].tolist() == [6]
+
+
+def test_flushes_by_age_and_keeps_modes_apart():
+    batcher, batches = collect(batch_size=100, flush_interval=0.05)
+    batcher.add(ltp_frame(sequence_number=1))
+    batcher.add(quote_frame(sequence_number=2))
+    batcher.flush(expired_only=True)
+    assert batches == []
+    time.sleep(0.06)
+    batcher.flush(expired_only=True)
+    assert sorted(mode for mode, _ in batches) == [decoder.LTP, decoder.QUOTE]
+
+    # A frame arriving after the oldest buffered one expired sends the batch on add
+    batcher.add(ltp_frame(sequence_number=3))
+    time.sleep(0.06)
+    batcher.add(ltp_frame(sequence_number=4))
+    assert batches[-1][1]["sequence_number"].tolist() == [3, 4]
+
+
+def test_short_and_unknown_frames_are_dropped():
+    batcher, batches = collect(batch_size=2)
+    assert not batcher.add(ltp_frame()[:-1])
+    assert not batcher.add(b"\x09" + ltp_frame()[1:])
+    assert not batcher.add(b"")
+    assert batcher.dropped_frames == 3
+    batcher.flush()
+    assert batches == []
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import decoder
+from candles import CandleAggregator, CandleSeries, bucket_start
+from historical import CANDLE_DTYPE
+
+OPEN = 1717386300           # 2024-06-03 09:15 IST
+
+
+def tick(seconds, price, volume, token="3045"):
+    """QUOTE tick `seconds` after the session open; price in rupees, volume for the day"""
+    return decoder.QuoteTick(decoder.QUOTE, 1, token, 1, (OPEN + seconds) * 1000, int(price * 100),
+                             1, 0, volume, 0.0, 0.0, 0, 0, 0, 0)
+
+
+def candles(*rows):
+    return np.array([tuple(row) for row in rows], dtype=CANDLE_DTYPE)
+
+
+def test_bucket_start_follows_the_session_open():
+    assert bucket_start(OPEN + 3900, 3600) == OPEN + 3600           # 10:20 -> 10:15
+    assert bucket_start(OPEN - 60, 3600) == OPEN - 3600             # 09:14 -> 08:15
+    assert bucket_start(OPEN + 3900, 86400) == OPEN - 33300         # IST midnight
+    assert bucket_start(OPEN + 299, 300) == OPEN
+
+
+def test_bars_close_on_the_next_interval_with_traded_volume():
+    bars = []
+    aggregator = CandleAggregator(("ONE_MINUTE", "FIVE_MINUTE"), on_bar=lambda *bar: bars.append(bar))
+    for seconds, price, volume in ((5, 100, 1000), (30, 101, 1500), (50, 99, 1600), (70, 102, 2000)):
+        aggregator.update(tick(seconds, price, volume))
+    assert bars == [(1, "3045", "ONE_MINUTE", (OPEN, 100.0, 101.0, 99.0, 99.0, 600))]
+    forming = aggregator.bars(1, "3045", "FIVE_MINUTE", include_forming=True)
+    assert forming.tolist() == [(OPEN, 100.0, 102.0, 99.0, 102.0, 1000)]
+
+    aggregator.update(tick(10, 98, 2100))       # belongs to the bar already closed
+    assert aggregator.late_ticks == 1
+    assert aggregator.close_expired(now=OPEN + 300) == 2
+    assert [bar[2] for bar in bars[1:]] == ["ONE_MINUTE", "FIVE_MINUTE"]
+
+
+def test_vwap_resets_each_session():
+    aggregator = CandleAggregator()
+    for seconds, price, volume in ((0, 100, 1000), (10, 101, 1500), (20, 104, 2000)):
+        aggregator.update(tick(seconds, price, volume))
+    assert aggregator.indicators(1, "3045", "ONE_MINUTE")["vwap"] == pytest.approx((101 * 500 + 104 * 500) / 1000)
+
+    # Next day: the day volume restarts, so all 300 traded at 110, and the VWAP only covers the new session
+    aggregator.update(tick(86400, 110, 300))
+    aggregator.update(tick(86410, 112, 400))
+    assert aggregator.indicators(1, "3045", "ONE_MINUTE")["vwap"] == pytest.approx((110 * 300 + 112 * 100) / 400)
+
+
+def test_ema_and_wilder_atr():
+    series = CandleSeries(1, "3045", "ONE_MINUTE", ema_period=3, atr_period=2)
+    series.seed(candles((0, 10, 12, 9, 11, 1), (60, 11, 13, 10, 12, 1), (120, 12, 12, 8, 9, 1)), now=10 ** 10)
+    # EMA alpha 0.5: 11 -> 11.5 -> 10.25. True ranges 3, 3, 4: mean of the first two, then Wilder
+    assert series.ema == pytest.approx(10.25)
+    assert series.atr == pytest.approx(3 + (4 - 3) / 2)
+
+
+def test_seed_merges_history_in_front_of_live_bars():
+    aggregator = CandleAggregator()
+    aggregator.update(tick(130, 101, 5000))     # live data from 09:17:10 on
+    aggregator.update(tick(190, 102, 5100))     # closes the 09:17 bar
+    history = candles((OPEN, 99, 100, 98, 99.5, 700), (OPEN + 60, 99.5, 100.5, 99, 100, 800),
+                      (OPEN + 120, 100, 103, 97, 101.5, 900))
+    aggregator.seed(1, "3045", "ONE_MINUTE", history)
+    bars = aggregator.bars(1, "3045", "ONE_MINUTE")
+    assert bars["timestamp"].tolist() == [OPEN, OPEN + 60, OPEN + 120]
+    # The live 09:17 bar only saw part of the minute: open, range and volume come from history
+    assert bars[-1].tolist() == (OPEN + 120, 100.0, 103.0, 97.0, 101.0, 900)
+    assert aggregator.indicators(1, "3045", "ONE_MINUTE")["ema"] is not None
+
+
+def test_seed_without_ticks_makes_the_unfinished_bar_forming():
+    aggregator = CandleAggregator()
+    aggregator.seed(1, "3045", "ONE_MINUTE", candles((OPEN, 99, 100, 98, 99.5, 700), (OPEN + 60, 99.5, 101, 99, 100, 80)),
+                    now=OPEN + 90)
+    assert aggregator.bars(1, "3045", "ONE_MINUTE").tolist() == [(OPEN, 99.0, 100.0, 98.0, 99.5, 700)]
+    aggregator.update(tick(100, 102, 1000))
+    assert aggregator.bars(1, "3045", "ONE_MINUTE", include_forming=True)[-1].tolist() == (
+        OPEN + 60, 99.5, 102.0, 99.0, 102.0, 80)
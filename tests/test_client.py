@@ -0,0 +1,27 @@
+import pytest
+from conftest import run
+from client import AngelClient, AuthenticationError
+from endpoints import GET_PROFILE
+
+
+def test_rejected_login_raises_and_sends_nothing(mock_server):
+    async def scenario():
+        mock_server.reject_login = True
+        async with mock_server:
+            async with AngelClient() as client:
+                with pytest.raises(AuthenticationError, match="Invalid totp"):
+                    await client.get(GET_PROFILE)
+                assert client.headers is None
+
+    run(scenario())
+    assert mock_server.logins == 1
+    assert not any(path.endswith("getProfile") for path in mock_server.hits)
+
+
+def test_login_then_request(mock_server):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                return await client.get(GET_PROFILE)
+
+    assert run(scenario())["status"] is True
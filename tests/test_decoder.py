@@ -0,0 +1,19 @@
+import decoder
+from mock_server import ltp_frame, quote_frame
+
+
+def test_ltp_frame_decodes():
+    tick = decoder.TickDecoder().decode(ltp_frame(token="3045", ltp=125000))
+    assert isinstance(tick, decoder.LtpTick)
+    assert (tick.token, tick.last_traded_price) == ("3045", 125000)
+
+
+def test_unknown_mode_byte_is_rejected():
+    frame = bytearray(quote_frame())
+    for mode in (0, 5, 255):
+        frame[0] = mode
+        assert decoder.TickDecoder().decode(bytes(frame)) is None
+
+
+def test_truncated_frame_is_rejected():
+    assert decoder.TickDecoder().decode(quote_frame()[:decoder.LTP_PACKET_SIZE + 10]) is None
@@ -0,0 +1,76 @@
+import os
+import decoder
+from feed_hub import FeedHub, FeedReader
+
+CAPACITY = 8
+
+
+def tick(number):
+    return decoder.LtpTick(decoder.LTP, 1, str(number), number, 1717386300000 + number, 100 * number)
+
+
+class LappingHeader(object):
+    """Hub header whose cursor read lets the hub publish `laps` more records before it answers"""
+
+    def __init__(self, hub, laps):
+        self.hub = hub
+        self.laps = laps
+
+    def __getitem__(self, field):
+        value = int(self.hub.header[field])
+        for _ in range(self.laps):
+            self.hub.publish(tick(self.hub.cursor + 1))
+        self.laps = 0
+        return value
+
+
+def open_hub():
+    name = f"angel-feed-test-{os.getpid()}"
+    hub = FeedHub(name, capacity=CAPACITY, depth_levels=1)
+    return hub, FeedReader(name)
+
+
+def test_writer_lapping_a_slow_reader_drops_overwritten_records():
+    hub, reader = open_hub()
+    try:
+        for number in range(1, 6):
+            hub.publish(tick(number))
+        held = reader.read()
+        # The hub overwrites every record between the reader loading the cursor and copying them
+        for number in range(6, 11):
+            hub.publish(tick(number))
+        reader.header = LappingHeader(hub, CAPACITY)
+        lapped = reader.read()
+        reader.header = hub.header
+        after = reader.read()
+    finally:
+        reader.close()
+        hub.close()
+
+    assert list(held["seq"]) == [1, 2, 3, 4, 5]
+    assert list(held["token"]) == [b"1", b"2", b"3", b"4", b"5"]      # a copy, not rewritten by the lap
+    assert len(lapped) == 0
+    assert reader.lost == 3 + 2      # 6-8 overwritten mid-read, 9-10 before the next read
+    assert list(after["seq"]) == list(range(11, 17))
+    assert list(after["token"]) == [str(number).encode() for number in range(11, 17)]
+
+
+def test_read_view_is_live_and_validate_flags_overwritten_rows():
+    hub, reader = open_hub()
+    try:
+        for number in range(1, 6):
+            hub.publish(tick(number))
+        view, first = reader.read_view()
+        assert first == 1 and view["token"].tolist() == [b"1", b"2", b"3", b"4", b"5"]
+        assert reader.validate(view, first).all()
+        for number in range(6, 11):
+            hub.publish(tick(number))       # rewrites ring slots 0 and 1
+        assert view["token"].tolist()[:2] == [b"9", b"10"]
+        assert reader.validate(view, first).tolist() == [False, False, True, True, True]
+        assert reader.lost == 2
+        view, first = reader.read_view()
+        assert first == 6 and view["seq"].tolist() == [6, 7, 8]
+        del view
+    finally:
+        reader.close()
+        hub.close()
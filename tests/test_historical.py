@@ -0,0 +1,73 @@
+from datetime import datetime
+import numpy as np
+from conftest import run
+from client import AngelClient
+from historical import (CANDLE_DTYPE, CandleStore, HistoricalDownloader, merge_ranges, missing_ranges,
+                        parse_candles, parse_timestamps, split_range)
+
+
+def candles(*rows):
+    return np.array([tuple(row) for row in rows], dtype=CANDLE_DTYPE)
+
+
+def test_missing_ranges():
+    coverage = [(100, 200), (300, 400)]
+    assert missing_ranges(coverage, 50, 450) == [(50, 100), (200, 300), (400, 450)]
+    assert missing_ranges(coverage, 120, 180) == []
+    assert missing_ranges(coverage, 150, 350) == [(200, 300)]
+    assert missing_ranges([], 0, 10) == [(0, 10)]
+
+
+def test_merge_ranges():
+    assert merge_ranges([(300, 400), (100, 200), (150, 250), (250, 260), (500, 600)]) == [
+        [100, 260], [300, 400], [500, 600],
+    ]
+
+
+def test_split_range():
+    day = 86400
+    assert split_range(0, 75 * day, "ONE_MINUTE") == [(0, 30 * day), (30 * day, 60 * day), (60 * day, 75 * day)]
+
+
+def test_parse_candles():
+    rows = [["2024-06-03T09:15:00+05:30", 830.5, 832, 829.1, 831.25, 15000],
+            ["2024-06-03T03:46:00+00:00", "831.25", "833", "830", "832", "9000"]]
+    parsed = parse_candles(rows)
+    assert parsed["timestamp"].tolist() == [int(datetime.fromisoformat(row[0]).timestamp()) for row in rows]
+    assert parsed["close"].tolist() == [831.25, 832.0]
+    assert parsed["volume"].tolist() == [15000, 9000]
+    assert len(parse_candles([])) == 0
+
+
+def test_parse_timestamps_falls_back_for_other_formats():
+    stamps = ["2024-06-03T09:15:00.500+05:30", "2024-06-03T03:45:00Z"]
+    assert parse_timestamps(stamps).tolist() == [int(datetime.fromisoformat(stamp).timestamp()) for stamp in stamps]
+
+
+def test_store_merges_newest_fetch_wins(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.save("NSE", "3045", "ONE_MINUTE", candles((60, 1, 1, 1, 1, 10), (120, 2, 2, 2, 2, 20)), [(60, 120)])
+    store.save("NSE", "3045", "ONE_MINUTE", candles((180, 3, 3, 3, 3, 30), (120, 9, 9, 9, 9, 90)), [(120, 180)])
+    loaded = store.load("NSE", "3045", "ONE_MINUTE")
+    assert loaded["timestamp"].tolist() == [60, 120, 180]
+    assert loaded["close"].tolist() == [1, 9, 3]
+    assert store.coverage("NSE", "3045", "ONE_MINUTE") == [(60, 180)]
+    assert store.load("NSE", "3045", "ONE_MINUTE", 100, 150)["timestamp"].tolist() == [120]
+
+
+def test_downloader_fetches_only_the_gaps(mock_server, tmp_path):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                downloader = HistoricalDownloader(client, CandleStore(str(tmp_path)))
+                first = await downloader.fetch("NSE", "3045", "ONE_HOUR", "2024-06-03 09:15", "2024-06-03 12:15")
+                requests = mock_server.requests
+                both = await downloader.fetch_many([("NSE", "3045"), ("NSE", "2885")], "ONE_HOUR",
+                                                   "2024-06-03 09:15", "2024-06-03 12:15")
+                return first, both, mock_server.requests - requests
+
+    first, both, requests = run(scenario())
+    assert len(first) == 4
+    assert requests == 1        # only 2885 was missing
+    assert np.array_equal(both[("NSE", "3045")], first)
+    assert len(both[("NSE", "2885")]) == 4
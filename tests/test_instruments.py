@@ -0,0 +1,68 @@
+import io
+import json
+import numpy as np
+from conftest import run
+from client import AngelClient
+from instruments import InstrumentLoader, InstrumentMaster, build_instruments, iter_json_array
+
+
+def item(token, symbol, name, exch_seg="NFO", expiry="", strike="-1", instrumenttype="", lotsize="1"):
+    return {"token": token, "symbol": symbol, "name": name, "expiry": expiry, "strike": strike,
+            "lotsize": lotsize, "instrumenttype": instrumenttype, "exch_seg": exch_seg, "tick_size": "5.000000"}
+
+
+ITEMS = [
+    item("3045", "SBIN-EQ", "SBIN", "NSE"),
+    item("43651", "NIFTY27JUN2424000PE", "NIFTY", expiry="27JUN2024", strike="2400000.000000",
+         instrumenttype="OPTIDX", lotsize="25"),
+    item("43650", "NIFTY27JUN2424000CE", "NIFTY", expiry="27JUN2024", strike="2400000.000000",
+         instrumenttype="OPTIDX", lotsize="25"),
+    item("43640", "NIFTY27JUN2423900CE", "NIFTY", expiry="27JUN2024", strike="2390000.000000",
+         instrumenttype="OPTIDX", lotsize="25"),
+    item("43700", "NIFTY04JUL2424000CE", "NIFTY", expiry="04JUL2024", strike="2400000.000000",
+         instrumenttype="OPTIDX", lotsize="25"),
+    item("43600", "NIFTY27JUN24FUT", "NIFTY", expiry="27JUN2024", instrumenttype="FUTIDX", lotsize="25"),
+]
+
+
+def test_iter_json_array_across_chunk_boundaries():
+    items = ITEMS + [{"name": "brackets ] and , inside \"quotes\"", "nested": [1, {"a": []}]}]
+    document = " \n[ " + ",\n  ".join(json.dumps(each) for each in items) + " ]\n"
+    for chunk_size in (1, 3, 7, 64, 1 << 20):
+        assert list(iter_json_array(io.StringIO(document), chunk_size=chunk_size)) == items
+    assert list(iter_json_array(io.StringIO("[]"), chunk_size=1)) == []
+
+
+def test_build_keeps_names_outside_ascii():
+    instruments = build_instruments([item("1", "SÜDZUCKER-EQ", "Südzucker", "NSE"), item("2", "X" * 60, "é" * 40, "NSE")])
+    master = InstrumentMaster(instruments)
+    assert master.find("NSE", "SÜDZUCKER-EQ")["name"].decode() == "Südzucker"
+    assert master.get("2")["name"].decode() == "é" * 16      # cut to 32 bytes on a character boundary
+
+
+def test_lookups_and_chain_indexes():
+    master = InstrumentMaster(build_instruments(ITEMS))
+    assert master.get("3045")["symbol"] == b"SBIN-EQ"
+    assert master.get("43650", exchange="NFO")["strike"] == 24000.0
+    assert master.find("NFO", "NIFTY27JUN2424000PE")["option_type"] == b"PE"
+    assert master.get("999") is None
+    assert master.expiries("NIFTY") == [np.datetime64("2024-06-27"), np.datetime64("2024-07-04")]
+    chain = master.options("NIFTY", "2024-06-27")
+    assert chain["symbol"].tolist() == [b"NIFTY27JUN2423900CE", b"NIFTY27JUN2424000CE", b"NIFTY27JUN2424000PE"]
+    assert master.options("NIFTY", "2024-06-27", option_type="PE")["token"].tolist() == [b"43651"]
+    assert len(master.options("NIFTY", "2024-07-11")) == 0
+
+
+def test_loader_downloads_once_and_caches(mock_server, tmp_path):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                loader = InstrumentLoader(str(tmp_path))
+                master = await loader.load(await client.get_session())
+                cached = await loader.load(await client.get_session())
+                return master, cached, mock_server.hits
+
+    master, cached, hits = run(scenario())
+    assert master.find("NSE", "SBIN-EQ")["token"] == b"3045"
+    assert len(cached) == len(master)
+    assert sum(count for path, count in hits.items() if "Scrip" in path or "instrument" in path.lower()) == 1
@@ -0,0 +1,75 @@
+import decoder
+from batch_decoder import decode_batch
+from market_state import MarketState, last_per_slot
+from mock_server import depth_frame, ltp_frame, quote_frame, snap_quote_frame
+import numpy as np
+
+
+def test_last_per_slot():
+    assert last_per_slot(np.array([3, 1, 3, 2, 1, 3])).tolist() == [4, 3, 5]
+
+
+def test_duplicate_token_in_one_batch_keeps_the_newest_tick():
+    state = MarketState(capacity=4)
+    frames = [ltp_frame("3045", sequence_number=1, ltp=80000), ltp_frame("2885", sequence_number=7, ltp=290000),
+              ltp_frame("3045", sequence_number=2, ltp=80150)]
+    state.update_batch(decoder.LTP, decode_batch(frames, decoder.LTP))
+    assert state.ltp(1, "3045") == 80150
+    assert state.get(1, "3045").sequence_number == 2
+    assert state.ltp(1, "2885") == 290000
+    assert state.versions[state.slots[(1, "3045")]] == 2      # one write, not one per duplicate
+
+
+def test_duplicate_token_book_comes_from_the_newest_tick():
+    state = MarketState(capacity=4, depth_levels=5)
+    frames = [snap_quote_frame("3045", sequence_number=1, ltp=80000), snap_quote_frame("3045", sequence_number=2, ltp=81000)]
+    state.update_batch(decoder.SNAP_QUOTE, decode_batch(frames, decoder.SNAP_QUOTE))
+    bids, asks = state.depth(1, "3045")
+    assert bids[0].tolist() == [100, 80995, 3]
+    assert asks[0].tolist() == [105, 81005, 3]
+
+
+def decode(frame):
+    return decoder.TickDecoder().decode(frame)
+
+
+def test_update_keeps_the_latest_quote_per_token():
+    state = MarketState(capacity=1)
+    state.update(decode(quote_frame("3045", sequence_number=1, ltp=80000)))
+    state.update(decode(ltp_frame("3045", sequence_number=2, ltp=80100)))
+    state.update(decode(ltp_frame("2885", sequence_number=9, ltp=290000)))     # grows past capacity
+    quote = state.get(1, "3045")
+    assert (quote.sequence_number, quote.last_traded_price, quote.subscription_mode) == (2, 80100, decoder.LTP)
+    assert quote.closed_price == 124500         # QUOTE fields survive an LTP tick
+    assert state.ltp(1, "2885") == 290000
+    assert len(state) == 2 and (1, "2885") in state
+    assert state.get(2, "3045") is None and state.ltp(1, "1594") is None
+    assert all(version % 2 == 0 for version in state.versions)
+
+
+def test_depth_from_snap_quote_and_depth_ticks():
+    state = MarketState(depth_levels=20)
+    state.update(decode(snap_quote_frame("3045", ltp=80000)))
+    bids, asks = state.depth(1, "3045")
+    assert bids[:, 1].tolist() == [79995, 79990, 79985, 79980, 79975]
+    assert asks[:, 1].tolist() == [80005, 80010, 80015, 80020, 80025]
+
+    state.update(decode(depth_frame("3045", ltp=80000)))
+    bids, asks = state.depth(1, "3045")
+    assert len(bids) == len(asks) == 20
+    assert bids[0].tolist() == [100, 79995, 2] and asks[0].tolist() == [120, 80005, 2]
+    assert state.get(1, "3045").subscription_mode == decoder.DEPTH
+    assert state.depth(1, "1594") is None
+
+
+def test_update_batch_matches_update():
+    frames = [snap_quote_frame(str(token), sequence_number=token, ltp=100 * token) for token in (3045, 2885, 1594)]
+    one_by_one = MarketState(depth_levels=5)
+    for frame in frames:
+        one_by_one.update(decode(frame))
+    batched = MarketState(depth_levels=5)
+    batched.update_batch(decoder.SNAP_QUOTE, decode_batch(frames, decoder.SNAP_QUOTE))
+    for token in ("3045", "2885", "1594"):
+        assert batched.get(1, token) == one_by_one.get(1, token)
+        for ours, theirs in zip(batched.depth(1, token), one_by_one.depth(1, token)):
+            assert ours.tolist() == theirs.tolist()
@@ -0,0 +1,61 @@
+import random
+from metrics import Histogram, Metrics, bucket_index, bucket_upper_bound, endpoint_label
+
+
+def test_buckets_are_contiguous_and_tight():
+    previous = -1
+    for index in range(400):
+        upper = bucket_upper_bound(index)
+        assert upper > previous
+        assert bucket_index(previous + 1) == index and bucket_index(upper) == index
+        lower = previous + 1
+        assert upper - lower <= max(1, lower // 16)       # ~6% wide at most
+        previous = upper
+
+
+def test_quantiles_within_bucket_width():
+    rng = random.Random(7)
+    values = [int(rng.lognormvariate(12, 1.5)) for _ in range(20000)]
+    histogram = Histogram("latency")
+    for value in values:
+        histogram.record(value)
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = ordered[max(1, int(q * len(values) + 0.5)) - 1]
+        assert exact <= histogram.quantile(q) <= exact * 1.07
+    assert histogram.quantile(1.0) == histogram.max == max(values)
+    assert histogram.count == len(values) and histogram.total == sum(values)
+
+
+def test_small_values_are_exact_and_negative_clamped():
+    histogram = Histogram("h")
+    for value in (1, 2, 3, 4, -5):
+        histogram.record(value)
+    assert [histogram.quantile(q) for q in (0.2, 0.4, 0.6, 1.0)] == [0, 1, 2, 4]
+    histogram.reset()
+    assert histogram.count == 0 and histogram.quantile(0.5) == 0
+
+
+def test_prometheus_output():
+    metrics = Metrics(enabled=True)
+    histogram = metrics.histogram("angel_request_seconds", "REST round trip", endpoint="placeOrder")
+    assert metrics.histogram("angel_request_seconds", endpoint="placeOrder") is histogram
+    for value in (1000000, 2000000, 3000000):
+        histogram.record(value)
+    metrics.counter("angel_reconnects_total", "Reconnects").inc(2)
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ["# HELP angel_request_seconds REST round trip", "# TYPE angel_request_seconds summary"]
+    median = [line for line in lines if line.startswith('angel_request_seconds{endpoint="placeOrder",quantile="0.5"} ')]
+    assert len(median) == 1 and 0.002 <= float(median[0].split()[1]) <= 0.002 * 1.07
+    assert 'angel_request_seconds_sum{endpoint="placeOrder"} 0.006000000' in lines
+    assert 'angel_request_seconds_count{endpoint="placeOrder"} 3' in lines
+    assert lines[-3:] == ["# HELP angel_reconnects_total Reconnects", "# TYPE angel_reconnects_total counter",
+                          "angel_reconnects_total 2"]
+    snapshot = metrics.snapshot()
+    assert snapshot['angel_request_seconds{endpoint="placeOrder"}']["count"] == 3
+    assert snapshot["angel_reconnects_total"] == 2
+
+
+def test_endpoint_label():
+    assert endpoint_label("https://apiconnect.angelone.in/rest/secure/angelbroking/order/v1/placeOrder") == "placeOrder"
+    assert endpoint_label("http://127.0.0.1:8080/rest/x/getLtpData/?mode=FULL") == "getLtpData"
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from option_chain import black_greeks, black_price, implied_volatility, norm_cdf
+
+# Hull's textbook case: S = K = 100, r = 5%, no dividends, one year, 20% volatility
+SPOT, STRIKE, RATE, YEARS, VOL = 100.0, 100.0, 0.05, 1.0, 0.2
+DISCOUNT = np.exp(-RATE * YEARS)
+FORWARD = SPOT / DISCOUNT
+
+
+def test_norm_cdf_matches_known_values():
+    x = np.array([-3.0, -1.0, 0.0, 0.5, 1.96])
+    expected = [0.0013499, 0.1586553, 0.5, 0.6914625, 0.9750021]
+    assert norm_cdf(x) == pytest.approx(expected, abs=1e-7)
+
+
+def test_black_price_matches_black_scholes_and_parity():
+    call, put = black_price(FORWARD, STRIKE, YEARS, VOL, DISCOUNT, np.array([True, False]))
+    assert call == pytest.approx(10.4506, abs=1e-4)
+    assert put == pytest.approx(5.5735, abs=1e-4)
+    assert call - put == pytest.approx(SPOT - STRIKE * DISCOUNT, abs=1e-9)
+
+
+def test_greeks_match_known_values():
+    delta, gamma, theta, vega = black_greeks(SPOT, FORWARD, STRIKE, YEARS, VOL, DISCOUNT, RATE, 0.0,
+                                             np.array([True, False]))
+    assert delta == pytest.approx([0.6368, -0.3632], abs=1e-4)
+    assert gamma == pytest.approx(0.018762, abs=1e-6)
+    assert vega == pytest.approx(0.37524, abs=1e-5)                         # per volatility point
+    assert theta == pytest.approx([-6.4140 / 365, -1.6579 / 365], abs=1e-5)  # per calendar day
+
+
+def test_greeks_agree_with_finite_differences():
+    is_call = np.array([True, False])
+    step = 0.01         # norm_cdf is accurate to 7.5e-8, which bounds how closely differences agree
+
+    def price(spot=SPOT, vol=VOL):
+        return black_price(spot / DISCOUNT, STRIKE, YEARS, vol, DISCOUNT, is_call)
+
+    delta, gamma, _, vega = black_greeks(SPOT, FORWARD, STRIKE, YEARS, VOL, DISCOUNT, RATE, 0.0, is_call)
+    assert delta == pytest.approx((price(SPOT + step) - price(SPOT - step)) / (2 * step), abs=1e-5)
+    assert gamma == pytest.approx((price(SPOT + step) - 2 * price() + price(SPOT - step)) / step ** 2, abs=1e-4)
+    assert vega == pytest.approx((price(vol=VOL + 1e-4) - price(vol=VOL - 1e-4)) / 2e-4 / 100, abs=1e-5)
+
+
+def test_implied_volatility_round_trip():
+    strikes = np.linspace(70, 130, 13)
+    vols = np.linspace(0.08, 0.9, 13)
+    is_call = np.array([[True], [False]])
+    for years in (7 / 365, 0.25, 2.0):
+        discount = np.exp(-RATE * years)
+        forward = SPOT / discount
+        prices = black_price(forward, strikes, years, vols, discount, is_call)
+        solved = implied_volatility(prices, forward, strikes, years, discount, is_call)
+        intrinsic = discount * np.maximum(np.where(is_call, forward - strikes, strikes - forward), 0)
+        priced = prices - intrinsic > 1e-4          # no time value left to solve for below the tolerance
+        assert np.isfinite(solved[priced]).all() and priced.sum() >= priced.size // 2
+        repriced = black_price(forward, strikes, years, solved, discount, is_call)
+        assert repriced[priced] == pytest.approx(prices[priced], abs=1e-4)
+        # Far from the money the premium barely moves with volatility, so only compare where vega is material
+        vega = black_greeks(SPOT, forward, strikes, years, vols, discount, RATE, 0.0, is_call)[3]
+        sensitive = np.broadcast_to(vega > 0.01, prices.shape)
+        assert solved[sensitive] == pytest.approx(np.broadcast_to(vols, prices.shape)[sensitive], abs=1e-3)
+
+
+def test_implied_volatility_rejects_prices_outside_arbitrage_bounds():
+    call = np.array([True, True, True, False, True])
+    prices = np.array([np.nan, 1.0, FORWARD * DISCOUNT, 0.0, 10.4506])
+    strikes = np.array([STRIKE, 50.0, STRIKE, STRIKE, STRIKE])          # 1.0 is below the 50 call's intrinsic
+    solved = implied_volatility(prices, FORWARD, strikes, YEARS, DISCOUNT, call)
+    assert np.isnan(solved[:4]).all()
+    assert solved[4] == pytest.approx(VOL, abs=1e-4)
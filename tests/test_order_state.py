@@ -0,0 +1,92 @@
+from order_state import OrderState
+
+
+def order(orderid, status="open", filledshares="0", **fields):
+    row = {"orderid": orderid, "exchange": "NSE", "tradingsymbol": "SBIN-EQ", "producttype": "INTRADAY",
+           "transactiontype": "BUY", "quantity": "10", "status": status, "filledshares": filledshares}
+    row.update(fields)
+    return row
+
+
+def fill(orderid, fillid, fillsize, fillprice, transactiontype="BUY"):
+    return {"orderid": orderid, "fillid": fillid, "exchange": "NSE", "tradingsymbol": "SBIN-EQ",
+            "producttype": "INTRADAY", "transactiontype": transactiontype,
+            "fillsize": str(fillsize), "fillprice": str(fillprice)}
+
+
+def test_fills_stay_pending_while_the_trade_book_lags():
+    state = OrderState()
+    state.apply_order_book([order("1", "complete", "10")])
+    assert state.fills_pending
+
+    # Order book already says 10 filled, the trade book only lists 4 of them
+    assert len(state.apply_trade_book([fill("1", "F1", 4, 800)])) == 1
+    assert state.fills_pending
+    assert state.net_quantity("NSE", "SBIN-EQ") == 4
+
+    # No order book change, the next trade book still gets applied
+    state.apply_order_book([order("1", "complete", "10")])
+    new_fills = state.apply_trade_book([fill("1", "F1", 4, 800), fill("1", "F2", 6, 801)])
+    assert [row["fillid"] for row in new_fills] == ["F2"]
+    assert not state.fills_pending
+    assert state.net_quantity("NSE", "SBIN-EQ") == 10
+
+
+def test_order_book_is_diffed_and_indexed():
+    state = OrderState()
+    first = [order("1"), order("2", tradingsymbol="INFY-EQ"), order("3", "rejected")]
+    assert [row["orderid"] for row, previous in state.apply_order_book(first)] == ["1", "2", "3"]
+    assert state.apply_order_book(first) == []
+
+    changed = state.apply_order_book([order("1", "complete", "10"), first[1], first[2]])
+    assert [(row["status"], previous["status"]) for row, previous in changed] == [("complete", "open")]
+    assert [row["orderid"] for row in state.open_orders()] == ["2"]
+    assert state.has_open_orders()
+    assert {row["orderid"] for row in state.orders_for("NSE", "SBIN-EQ")} == {"1", "3"}
+    assert [row["orderid"] for row in state.with_status("complete")] == ["1"]
+    assert "open" in state.by_status and state.with_status("open")[0]["orderid"] == "2"
+
+    state.apply_order_book([order("2", "cancelled", tradingsymbol="INFY-EQ")])
+    assert not state.has_open_orders()
+    assert state.get("2")["status"] == "cancelled"
+
+
+def test_positions_from_fills():
+    state = OrderState()
+    state.apply_order_book([order("1", "complete", "10"), order("2", "complete", "4", transactiontype="SELL"),
+                            order("3", "complete", "5", producttype="DELIVERY")])
+    fills = [fill("1", "F1", 6, 800), fill("1", "F2", 4, 805), fill("2", "F3", 4, 810, "SELL"),
+             {**fill("3", "F4", 5, 790), "producttype": "DELIVERY"}]
+    assert len(state.apply_trade_book(fills)) == 4
+    assert state.apply_trade_book(fills) == []
+
+    intraday = state.position("NSE", "SBIN-EQ", "INTRADAY")
+    assert (intraday.buy_quantity, intraday.sell_quantity, intraday.net_quantity) == (10, 4, 6)
+    assert intraday.buy_average == 802.0 and intraday.sell_average == 810.0
+    assert intraday.realized_pnl == 4 * (810 - 802)
+    assert state.net_quantity("NSE", "SBIN-EQ", "DELIVERY") == 5
+    assert state.net_quantity("NSE", "SBIN-EQ") == 11
+    assert state.net_quantity("NSE", "INFY-EQ") == 0
+    assert not state.fills_pending
+
+
+def test_sync_polls_the_books(mock_server):
+    from conftest import run
+    from client import AngelClient
+    from order_state import OrderStateSync
+    from orders import Order, OrderGateway
+
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                fills = []
+                sync = OrderStateSync(client, on_fill=fills.append)
+                result = await OrderGateway(client).place(Order("SBIN-EQ", "3045", "NSE", "BUY", 3))
+                changed = await sync.poll()
+                return result, changed, await sync.poll(), sync.state, fills
+
+    result, changed, changed_again, state, fills = run(scenario())
+    assert changed and not changed_again
+    assert state.get(result.order_id) is not None
+    assert [row["orderid"] for row in fills] == [result.order_id]
+    assert state.net_quantity("NSE", "SBIN-EQ") == 3
@@ -0,0 +1,65 @@
+import pytest
+from conftest import run
+from orders import CancelRequest, Order, OrderGateway
+
+
+class RecordingClient(object):
+    def __init__(self):
+        self.payloads = []
+
+    async def post(self, url, payload):
+        self.payloads.append(payload)
+        return {"status": True, "data": {"orderid": payload["orderid"]}}
+
+
+def test_cancel_basket_accepts_ids_of_any_type_and_pairs():
+    client = RecordingClient()
+    gateway = OrderGateway(client)
+    results = run(gateway.cancel_basket([
+        "250101000000001", 250101000000002, ("250101000000003", "STOPLOSS"), CancelRequest(250101000000004, "AMO"),
+    ]))
+    assert [result.ok for result in results] == [True] * 4
+    assert client.payloads == [
+        {"orderid": "250101000000001", "variety": "NORMAL"},
+        {"orderid": 250101000000002, "variety": "NORMAL"},
+        {"orderid": "250101000000003", "variety": "STOPLOSS"},
+        {"orderid": 250101000000004, "variety": "AMO"},
+    ]
+
+
+@pytest.mark.parametrize("fields, error", [
+    ({"ordertype": "LIMIT"}, "needs a price"),
+    ({"ordertype": "STOPLOSS_LIMIT", "variety": "STOPLOSS", "price": 800}, "needs a triggerprice"),
+    ({"ordertype": "STOPLOSS_MARKET", "variety": "STOPLOSS"}, "needs a triggerprice"),
+    ({"ordertype": "LIMIT", "variety": "STOPLOSS", "price": 800}, "STOPLOSS variety"),
+    ({"quantity": 0}, "Invalid quantity"),
+])
+def test_invalid_orders_are_rejected_before_sending(fields, error):
+    client = RecordingClient()
+    values = dict({"quantity": 1}, **fields)
+    order = Order("SBIN-EQ", "3045", "NSE", "BUY", **values)
+    result = run(OrderGateway(client).place(order))
+    assert not result.ok and error in result.message
+    assert client.payloads == []
+
+
+def test_stoploss_limit_order_payload():
+    order = Order("SBIN-EQ", "3045", "NSE", "SELL", 5, ordertype="STOPLOSS_LIMIT", variety="STOPLOSS",
+                  price=795, triggerprice=796.5)
+    payload = order.payload()
+    assert payload["price"] == "795" and payload["triggerprice"] == "796.5"
+
+
+def test_place_order_returns_the_broker_response(mock_server):
+    from SmartAPI import AngelAPIWrapper
+
+    async def scenario():
+        async with mock_server:
+            async with AngelAPIWrapper() as api:
+                response = await api.place_order(Order("SBIN-EQ", "3045", "NSE", "BUY", 1))
+                result = await api.submit_order(Order("SBIN-EQ", "3045", "NSE", "BUY", 1))
+                return response, result
+
+    response, result = run(scenario())
+    assert response["status"] is True and response["data"]["orderid"]
+    assert result.ok and result.order_id == result.response["data"]["orderid"]
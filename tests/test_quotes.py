@@ -0,0 +1,38 @@
+import asyncio
+from conftest import run
+from client import AngelClient
+from quotes import QuoteService
+
+TOKENS = [("NSE", str(token)) for token in range(3045, 3050)]
+
+
+def test_cache_is_capped(mock_server):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                quotes = QuoteService(client, ttl=60, max_cache_size=3)
+                fetched = await quotes.get(TOKENS)
+                return fetched, quotes.cache
+
+    fetched, cache = run(scenario())
+    assert len(fetched) == len(TOKENS)
+    assert [key[1:] for key in cache] == TOKENS[-3:]
+
+
+def test_close_cancels_requests_in_flight(mock_server):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                await client.authenticate()
+                mock_server.latency = 1
+                quotes = QuoteService(client)
+                caller = asyncio.ensure_future(quotes.get(TOKENS))
+                await asyncio.sleep(0.05)
+                running = len(quotes.tasks)
+                await quotes.close()
+                return running, await asyncio.wait_for(caller, 0.5), quotes.tasks, quotes.in_flight
+
+    running, fetched, tasks, in_flight = run(scenario())
+    assert running == 1
+    assert fetched == {}
+    assert not tasks and not in_flight
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from conftest import run
+from rate_limiter import RequestScheduler, SchedulerClosed
+
+URL = "https://example.invalid/limited"
+
+
+def test_close_fails_queued_requests():
+    async def scenario():
+        scheduler = RequestScheduler(rate_limits={URL: (0.1, 1)}, max_in_flight=1)
+
+        async def request():
+            async with scheduler.slot(URL):
+                await asyncio.sleep(10)
+
+        holder = asyncio.ensure_future(request())            # takes the only token and slot
+        queued = [asyncio.ensure_future(request()) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+        results = await asyncio.wait_for(asyncio.gather(*queued, return_exceptions=True), 1)
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+        return results, scheduler.queue_depth()
+
+    results, depth = run(scenario())
+    assert all(isinstance(result, SchedulerClosed) for result in results)
+    assert depth == 0
+
+
+def test_close_fails_requests_waiting_for_a_slot():
+    async def scenario():
+        scheduler = RequestScheduler(rate_limits={}, max_in_flight=1)
+        async with scheduler.slot(URL):
+            waiting = asyncio.ensure_future(scheduler.slot(URL).__aenter__())
+            await asyncio.sleep(0.01)
+            await scheduler.close()
+            with pytest.raises(SchedulerClosed):
+                await asyncio.wait_for(waiting, 1)
+
+    run(scenario())
@@ -0,0 +1,36 @@
+import json
+import pytest
+from conftest import run
+from client import AngelClient
+from subscriptions import SubscriptionManager
+
+NSE_CM = 1
+
+
+def test_failed_subscribe_leaves_owner_matching_connections(mock_server):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                manager = SubscriptionManager(client=client)
+                await manager.subscribe([(NSE_CM, "3045")], mode=1)
+                shard = manager.shards[0]
+                send_str = shard.ws.send_str
+
+                async def refuse_subscribes(message):
+                    if json.loads(message)["action"] == 1:
+                        raise ConnectionResetError("Cannot write to closing transport")
+                    await send_str(message)
+                shard.ws.send_str = refuse_subscribes
+
+                # Mode change: the unsubscribe goes out, the new subscribe does not
+                with pytest.raises(ConnectionResetError):
+                    await manager.update({(NSE_CM, "3045"): 2, (NSE_CM, "2885"): 1})
+                state = dict(manager.owner), manager.subscriptions
+                await manager.unsubscribe([(NSE_CM, "3045"), (NSE_CM, "2885")])
+                shard.ws.send_str = send_str
+                await manager.disconnect()
+                return state
+
+    owner, subscriptions = run(scenario())
+    assert owner == {}
+    assert subscriptions == {}
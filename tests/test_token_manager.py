@@ -0,0 +1,29 @@
+import asyncio
+import time
+from conftest import run
+from client import AngelClient
+
+
+def test_short_lived_token_is_not_refreshed_back_to_back(mock_server):
+    async def scenario():
+        # Every token the mock issues expires in 100 s, inside the 300 s refresh margin
+        mock_server.TOKEN_TTL = 100
+        async with mock_server:
+            async with AngelClient() as client:
+                await client.authenticate()
+                await asyncio.sleep(0.5)
+                return client.token_manager.next_refresh_delay()
+
+    delay = run(scenario())
+    assert mock_server.refreshes == 1
+    assert delay >= 30
+
+
+def test_next_refresh_delay_keeps_the_margin_for_long_tokens():
+    manager = AngelClient().token_manager
+    manager.jwt_expiry = manager.feed_expiry = time.time() + 3600
+    assert abs(manager.next_refresh_delay() - (3600 - manager.refresh_margin)) < 1
+    manager.jwt_expiry = manager.feed_expiry = time.time() + 100
+    assert 45 < manager.next_refresh_delay() <= 50
+    manager.jwt_expiry = manager.feed_expiry = time.time() - 10
+    assert manager.next_refresh_delay() == manager.RETRY_INTERVAL
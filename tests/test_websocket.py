@@ -0,0 +1,146 @@
+import asyncio
+from conftest import run
+from client import AngelClient
+from SmartWebSockets import SmartWebSockets
+
+
+def heartbeats():
+    return [task for task in asyncio.all_tasks()
+            if not task.done() and task.get_coro().__name__ == "_heartbeat_loop"]
+
+
+async def drop_connection(server, ws, reconnects):
+    for socket in list(server.sockets):
+        await socket.close()
+    for _ in range(200):
+        if ws.reconnects == reconnects and ws.ready.is_set():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("websocket did not reconnect")
+
+
+def test_reconnects_keep_one_heartbeat(mock_server):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                ws = SmartWebSockets(client=client, subscription=None)
+                ws.RECONNECT_BASE_DELAY = 0.02
+                await ws.connect()
+                await drop_connection(mock_server, ws, 1)
+                await drop_connection(mock_server, ws, 2)
+                alive = heartbeats()
+                await ws.disconnect()
+                return alive, heartbeats()
+
+    alive, after_disconnect = run(scenario())
+    assert len(alive) == 1
+    assert after_disconnect == []
+
+
+def test_failed_open_closes_the_socket(mock_server):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                ws = SmartWebSockets(client=client, subscription=None, reconnect=False)
+
+                async def failing_open():
+                    raise RuntimeError("subscribe failed")
+                ws._on_open = failing_open
+                try:
+                    await ws.connect()
+                except RuntimeError:
+                    pass
+                return ws.ws.closed, ws.is_connected, heartbeats()
+
+    closed, connected, alive = run(scenario())
+    assert closed and not connected
+    assert alive == []
+
+
+def record(mock_server, recorder):
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                ws = SmartWebSockets(client=client, on_tick=lambda tick: None, recorder=recorder,
+                                     subscription={"action": 1, "params": {"mode": 1, "tokenList": [
+                                         {"exchangeType": 1, "tokens": ["3045"]}]}})
+                await ws.connect()
+                for _ in range(200):
+                    if ws.recorder.records:
+                        break
+                    await asyncio.sleep(0.01)
+                await ws.disconnect()
+                return ws.recorder
+
+    return run(scenario())
+
+
+def test_disconnect_closes_a_recorder_it_opened(mock_server, tmp_path):
+    recorder = record(mock_server, str(tmp_path))
+    assert recorder.records > 0 and recorder.buffer is None
+    assert (tmp_path / "journal-000000.json").exists()
+
+
+def test_disconnect_leaves_a_shared_recorder_open(mock_server, tmp_path):
+    from journal import JournalWriter
+    recorder = JournalWriter(str(tmp_path))
+    assert record(mock_server, recorder) is recorder
+    assert recorder.records > 0 and recorder.buffer is not None
+    recorder.close()
+
+
+def test_batch_mode_detects_sequence_gaps():
+    from mock_server import ltp_frame
+    gaps = []
+    batches = []
+
+    async def scenario():
+        ws = SmartWebSockets(client=AngelClient(), subscription=None, batch_size=100,
+                             on_batch=lambda mode, batch: batches.append(batch),
+                             on_gap=lambda *gap: gaps.append(gap))
+        for token, number in (("3045", 1), ("2885", 10), ("3045", 2), ("3045", 5), ("2885", 11)):
+            ws.batcher.add(ltp_frame(token, sequence_number=number))
+        ws.batcher.flush()
+        for token, number in (("2885", 14), ("3045", 6)):
+            ws.batcher.add(ltp_frame(token, sequence_number=number))
+        ws.batcher.flush()
+        await ws.client.close()
+        return ws
+
+    ws = run(scenario())
+    assert sorted(gaps) == [(1, "2885", 12, 14), (1, "3045", 3, 5)]
+    assert ws.gaps == 2
+    assert ws.last_sequence == {(1, "3045"): 6, (1, "2885"): 14}
+    assert sum(len(batch) for batch in batches) == 7
+
+
+def test_failed_subscription_replay_is_retried(mock_server, monkeypatch):
+    from aiohttp import ClientWebSocketResponse
+    send_str = ClientWebSocketResponse.send_str
+    attempts = []
+
+    async def fail_first_replay(socket, message, *args, **kwargs):
+        if '"action": 1' in message:
+            attempts.append(message)
+            if len(attempts) == 1:      # the first replay after the drop
+                raise ConnectionResetError("Cannot write to closing transport")
+        await send_str(socket, message, *args, **kwargs)
+
+    async def scenario():
+        async with mock_server:
+            async with AngelClient() as client:
+                ws = SmartWebSockets(client=client, on_tick=lambda tick: None,
+                                     subscription={"action": 1, "params": {"mode": 1, "tokenList": [
+                                         {"exchangeType": 1, "tokens": ["3045"]}]}})
+                ws.RECONNECT_BASE_DELAY = 0.02
+                await ws.connect()
+                monkeypatch.setattr(ClientWebSocketResponse, "send_str", fail_first_replay)
+                await drop_connection(mock_server, ws, 1)
+                subscribed = len(mock_server.sockets), dict(ws.subscriptions)
+                await ws.disconnect()
+                return subscribed
+
+    sockets, subscriptions = run(scenario())
+    assert len(attempts) == 2       # patched after connect: the failed replay and its retry
+    assert sockets == 1
+    assert subscriptions == {(1, "3045"): 1}
@@ -0,0 +1,100 @@
+from collections import OrderedDict, deque
+import asyncio
+from metrics import METRICS
+
+# Overflow policies for TickQueue
+BLOCK = "block"              # Producer waits for space: backpressure all the way to the socket
+DROP_OLDEST = "drop_oldest"  # Evict the oldest queued tick
+DROP_NEWEST = "drop_newest"  # Discard the incoming tick
+CONFLATE = "conflate"        # Keep only the latest tick per (exchange_type, token)
+
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, CONFLATE)
+
+DROPPED_TICKS = METRICS.counter("angel_feed_dropped_ticks_total", "Ticks discarded by TickQueue overflow policies")
+
+
+class TickQueue(object):
+    """
+        Bounded single-loop queue between the websocket reader and tick consumers, with an
+        explicit overflow policy. Iterate it with `async for tick in queue`.
+    """
+
+    def __init__(self, maxsize=10000, policy=BLOCK):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = OrderedDict() if policy == CONFLATE else deque()
+        self.dropped = 0
+        self.closed = False
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        tick = await self.get()
+        if tick is None:
+            raise StopAsyncIteration
+        return tick
+
+    async def put(self, tick):
+        if self.policy == BLOCK:
+            while len(self.items) >= self.maxsize and not self.closed:
+                self._not_full.clear()
+                await self._not_full.wait()
+            self.items.append(tick)
+        else:
+            self.put_nowait(tick)
+        self._not_empty.set()
+
+    def put_nowait(self, tick):
+        if self.policy == CONFLATE:
+            key = (tick.exchange_type, tick.token)
+            if key in self.items:
+                self._drop()
+                self.items[key] = tick
+            elif len(self.items) >= self.maxsize:
+                self._drop()
+                self.items.popitem(last=False)
+                self.items[key] = tick
+            else:
+                self.items[key] = tick
+        elif len(self.items) >= self.maxsize:
+            self._drop()
+            if self.policy == DROP_NEWEST:
+                return
+            self.items.popleft()
+            self.items.append(tick)
+        else:
+            self.items.append(tick)
+        self._not_empty.set()
+
+    def _drop(self):
+        self.dropped += 1
+        if METRICS.enabled:
+            DROPPED_TICKS.inc()
+
+    async def get(self):
+        """Next tick, or None once the queue is closed and drained"""
+        while not self.items:
+            if self.closed:
+                return None
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        if self.policy == CONFLATE:
+            tick = self.items.popitem(last=False)[1]
+        else:
+            tick = self.items.popleft()
+        self._not_full.set()
+        return tick
+
+    def close(self):
+        self.closed = True
+        self._not_empty.set()
+        self._not_full.set()
@@ -0,0 +1,94 @@
+import asyncio
+import base64
+import json
+import time
+
+
+def token_expiry(token):
+    """Returns the `exp` claim of a JWT as a unix timestamp, or None if it cannot be read"""
+    try:
+        if token.startswith("Bearer "):
+            token = token[len("Bearer "):]
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+class TokenManager(object):
+    """
+        Tracks jwtToken and feedToken expiry for an AngelClient and refreshes them in the
+        background through the GENERATE_TOKEN endpoint ahead of expiry. A fresh TOTP login
+        is used only when the refresh fails. New tokens are swapped in atomically, so
+        requests already in flight keep their headers and never wait on re-authentication.
+    """
+    REFRESH_MARGIN = 300            # Refresh this many seconds before the earliest expiry
+    DEFAULT_TOKEN_TTL = 6 * 3600    # Assumed lifetime when a token carries no exp claim
+    RETRY_INTERVAL = 30
+
+    def __init__(self, client, refresh_margin=REFRESH_MARGIN):
+        self.client = client
+        self.refresh_margin = refresh_margin
+        self.jwt_expiry = None
+        self.feed_expiry = None
+        self.task = None
+
+    def update(self, jwt_token, feed_token):
+        """Records expiry of a newly issued token pair"""
+        issued_at = time.time()
+        self.jwt_expiry = token_expiry(jwt_token) or issued_at + self.DEFAULT_TOKEN_TTL
+        self.feed_expiry = (token_expiry(feed_token) if feed_token else None) or self.jwt_expiry
+
+    def expires_at(self):
+        if self.jwt_expiry is None:
+            return None
+        return min(self.jwt_expiry, self.feed_expiry)
+
+    def seconds_until_refresh(self):
+        expires_at = self.expires_at()
+        if expires_at is None:
+            return 0
+        return max(0.0, expires_at - self.refresh_margin - time.time())
+
+    def next_refresh_delay(self):
+        """
+            Delay before the refresh after a successful one. A token that is already inside the
+            refresh margin (short-lived, clock skew, or the same exp handed back) is renewed at
+            half its remaining life, never sooner than RETRY_INTERVAL
+        """
+        delay = self.seconds_until_refresh()
+        if delay >= self.RETRY_INTERVAL:
+            return delay
+        expires_at = self.expires_at()
+        remaining = expires_at - time.time() if expires_at else 0
+        return max(self.RETRY_INTERVAL, remaining / 2)
+
+    def start(self):
+        """Schedules the refresh loop on the running event loop"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def _refresh_loop(self):
+        delay = self.seconds_until_refresh()
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.RETRY_INTERVAL
+            try:
+                if await self.client.refresh():
+                    delay = self.next_refresh_delay()
+                    continue
+                print("Token refresh failed, logging in again")
+                if await self.client.authenticate(force=True):
+                    delay = self.next_refresh_delay()
+            except Exception as e:
+                print(f"Error refreshing tokens: {str(e)}")